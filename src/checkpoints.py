@@ -0,0 +1,110 @@
+import logging
+import os
+import pickle
+import sqlite3
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    from langgraph.checkpoint.sqlite import SqliteSaver
+except ImportError: # langgraph-checkpoint-sqlite is optional
+    SqliteSaver = None
+
+try:
+    from .node_utils import get_setting
+except ImportError: # Fallback for direct script execution
+    from node_utils import get_setting
+
+logger = logging.getLogger("turjuman.checkpoints")
+
+CHECKPOINT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "checkpoints.db")
+# LangGraph stops a run after this many steps; batched nodes (CHECKPOINT_BATCH_CHUNKS)
+# take one step per batch, so the default limit of 25 is too low for them.
+RECURSION_LIMIT = 10000
+
+
+class PickleSerializer:
+    """
+    Checkpoint serializer for the graph state. The state holds objects the default
+    JSON serializer does not know (ChunkTable, SourceBuffer), and the checkpoint
+    database is local to the server, so it is stored pickled.
+    """
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        return "pickle", self.dumps(obj)
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        return self.loads(data[1])
+
+
+if SqliteSaver is not None:
+    class LatestCheckpointSaver(SqliteSaver):
+        """
+        SqliteSaver that keeps only the latest checkpoint of each thread, with its
+        pending writes. Every checkpoint holds the whole job state (including its
+        growing logs), and resuming a job only needs the latest one.
+        """
+
+        def put(self, config, checkpoint, metadata, new_versions):
+            saved = super().put(config, checkpoint, metadata, new_versions)
+            configurable = saved["configurable"]
+            with self.cursor() as cursor:
+                for table in ("checkpoints", "writes"):
+                    cursor.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (str(configurable["thread_id"]), configurable["checkpoint_ns"], configurable["checkpoint_id"]))
+            return saved
+
+
+def build_checkpointer():
+    """
+    SQLite checkpointer for the workflow (GRAPH_CHECKPOINTS, default on), writing
+    to GRAPH_CHECKPOINT_DB and keeping the latest checkpoint of each job. Returns None, so the graph runs without persistence,
+    when checkpoints are disabled or langgraph-checkpoint-sqlite is not installed.
+    """
+    if not get_setting({}, "GRAPH_CHECKPOINTS", None, True, bool):
+        return None
+    if SqliteSaver is None:
+        logger.warning("langgraph-checkpoint-sqlite is not installed; jobs cannot resume after a restart.")
+        return None
+    path = get_setting({}, "GRAPH_CHECKPOINT_DB", None, CHECKPOINT_DB_PATH)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    return LatestCheckpointSaver(connection, serde=PickleSerializer())
+
+
+def run_config(thread_id: str, callbacks: Optional[list] = None) -> Dict[str, Any]:
+    """Graph invoke config of a job: its checkpoints are kept under thread_id = job_id."""
+    config: Dict[str, Any] = {"configurable": {"thread_id": thread_id}, "recursion_limit": RECURSION_LIMIT}
+    if callbacks:
+        config["callbacks"] = callbacks
+    return config
+
+
+def has_checkpoint(checkpointer, thread_id: str) -> bool:
+    """Whether a job has a checkpoint to resume from."""
+    if checkpointer is None:
+        return False
+    return checkpointer.get_tuple(run_config(thread_id)) is not None
+
+
+def delete_checkpoints(checkpointer, thread_id: str):
+    """Removes the checkpoints of a job (once it completed or failed, or before it is run from the start)."""
+    if checkpointer is None:
+        return
+    if hasattr(checkpointer, "delete_thread"):
+        checkpointer.delete_thread(thread_id)
+        return
+    # Older SqliteSaver versions have no delete_thread
+    with checkpointer.lock:
+        for table in ("checkpoints", "writes"):
+            try:
+                checkpointer.conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+            except sqlite3.OperationalError:
+                pass # Table not created yet
+        checkpointer.conn.commit()
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from .smartchunk import SmartChunker, CHUNKER_VERSION
+except ImportError: # Fallback for direct script execution
+    from smartchunk import SmartChunker, CHUNKER_VERSION
+
+
+class ChunkCache:
+    """
+    Thread-safe LRU cache of SmartChunker results, shared by the nodes of a job
+    (terminology_unification and chunk_document chunk the same content) and by
+    resubmitted jobs with identical content.
+
+    Entries are keyed by (content sha256, mode, min/max size, separators,
+    keep_separators, regex engine, merge strategy, CHUNKER_VERSION) and hold the (chunks_with_metadata, report) pair that
+    `chunk()` returns. Callers get fresh copies of the chunk dicts, so they may
+    modify them.
+    """
+
+    def __init__(self, max_entries: int = 8):
+        self.max_entries = max(0, max_entries)
+        self._entries: "OrderedDict[Tuple, Tuple[List[Dict[str, Any]], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(chunker: SmartChunker, text: str) -> Tuple:
+        digest = hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+        return (digest, chunker.mode, chunker.min_chunk_size, chunker.max_chunk_size,
+                tuple(chunker.separators), chunker.keep_separators, chunker.regex_engine, chunker.merge_strategy,
+                CHUNKER_VERSION)
+
+    def chunk(self, chunker: SmartChunker, text: str, workers: int = 1) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Returns `chunker.chunk(text)` (or `chunk_parallel` for workers > 1), from the cache when possible."""
+        key = self.key(chunker, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is None:
+            # Chunk outside the lock; two threads may both chunk the same content once
+            entry = chunker.chunk_parallel(text, workers=workers) if workers > 1 else chunker.chunk(text)
+            if self.max_entries:
+                with self._lock:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        chunks, report = entry
+        return [dict(chunk) for chunk in chunks], dict(report)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_default_cache: Optional[ChunkCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_chunk_cache() -> ChunkCache:
+    """Process-wide cache; its size is read once from CHUNK_CACHE_SIZE (entries, default 8, 0 disables it)."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                max_entries = int(os.environ.get("CHUNK_CACHE_SIZE", 8))
+            except ValueError:
+                max_entries = 8
+            _default_cache = ChunkCache(max_entries)
+        return _default_cache
@@ -0,0 +1,188 @@
+import copy
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    from .source_buffer import ChunkSpan, SourceBuffer
+except ImportError: # Fallback for direct script execution
+    from source_buffer import ChunkSpan, SourceBuffer
+
+# Per-stage output columns (one value per translatable chunk)
+TRANSLATION = "translation"
+CRITIQUE = "critique"
+FINAL = "final"
+ERROR = "error"
+
+_ATOMIC = (str, int, float, bool, type(None))
+
+
+class ChunkTable:
+    """
+    Columnar store of a job's chunks, kept in `state["chunk_table"]`.
+
+    One row per chunk, in document order. The structural columns (type code,
+    translate flag, and either the chunk texts or (start, end) offsets into a
+    shared SourceBuffer) are written once by chunk_document and never modified,
+    so copies of the table share them. `translatable` lists the row of every
+    translatable chunk; position k in it is the "chunk index" used by the
+    translation, critique and refinement nodes.
+
+    Stage columns (TRANSLATION, CRITIQUE, FINAL, ERROR) hold one value per
+    translatable chunk. deepcopy (done on every graph callback) copies only the
+    stage columns, and deep-copies only those holding mutable values (critique
+    dicts).
+    """
+
+    __slots__ = ("source", "_texts", "_starts", "_ends", "_type_codes", "_type_names",
+                 "_translate", "translatable", "_stages")
+
+    def __init__(self, types: Iterable[str], translate: Iterable[bool], texts: Optional[Sequence[str]] = None,
+                 source: Optional[SourceBuffer] = None, starts: Optional[Sequence[int]] = None,
+                 ends: Optional[Sequence[int]] = None):
+        if (texts is None) == (source is None):
+            raise ValueError("A ChunkTable needs either chunk texts or a source buffer with offsets.")
+        names: Dict[str, int] = {}
+        self._type_codes = array("B", (names.setdefault(t, len(names)) for t in types))
+        if len(names) > 255:
+            raise ValueError("Too many distinct chunk types.")
+        self._type_names = tuple(names)
+        self._translate = bytes(bool(flag) for flag in translate)
+        self.source = source
+        self._texts = tuple(texts) if texts is not None else None
+        self._starts = array("q", starts) if source is not None else None
+        self._ends = array("q", ends) if source is not None else None
+        rows = len(self._texts) if self._texts is not None else len(self._starts)
+        if not (len(self._type_codes) == len(self._translate) == rows) or (source is not None and len(self._ends) != rows):
+            raise ValueError("ChunkTable columns must have the same length.")
+        self.translatable = array("l", (i for i, flag in enumerate(self._translate) if flag))
+        self._stages: Dict[str, List[Any]] = {}
+
+    @classmethod
+    def from_chunks(cls, chunks: List[Dict[str, Any]]) -> "ChunkTable":
+        """Builds a table from SmartChunker.chunk() output (ordered by 'index')."""
+        return cls(types=[c["chunkType"] for c in chunks], translate=[c["toTranslate"] for c in chunks],
+                   texts=[c["chunkText"] for c in chunks])
+
+    @classmethod
+    def from_spans(cls, source: SourceBuffer, spans: List[ChunkSpan]) -> "ChunkTable":
+        """Builds a table over `source` from SmartChunker.chunk_spans() output."""
+        return cls(types=[s.type for s in spans], translate=[s.translate for s in spans],
+                   source=source, starts=[s.start for s in spans], ends=[s.end for s in spans])
+
+    # --- Rows (all chunks) ---
+
+    def __len__(self) -> int:
+        return len(self._translate)
+
+    def text(self, row: int) -> str:
+        if self._texts is not None:
+            return self._texts[row]
+        return self.source[self._starts[row]:self._ends[row]]
+
+    def chunk_type(self, row: int) -> str:
+        return self._type_names[self._type_codes[row]]
+
+    def is_translatable(self, row: int) -> bool:
+        return bool(self._translate[row])
+
+    def span(self, row: int) -> Optional[ChunkSpan]:
+        """(start, end, type, translate) of a row, for tables built from spans."""
+        if self._starts is None:
+            return None
+        return ChunkSpan(self._starts[row], self._ends[row], self.chunk_type(row), self.is_translatable(row))
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        """The row as a SmartChunker chunk dict."""
+        return {'chunkText': self.text(row), 'toTranslate': self.is_translatable(row),
+                'chunkType': self.chunk_type(row), 'index': row}
+
+    def iter_metadata(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self.metadata(row)
+
+    def type_counts(self, translatable: Optional[bool] = None) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for row, code in enumerate(self._type_codes):
+            if translatable is None or bool(self._translate[row]) == translatable:
+                name = self._type_names[code]
+                counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    # --- Translatable chunks ---
+
+    @property
+    def translatable_count(self) -> int:
+        return len(self.translatable)
+
+    def source_text(self, k: int) -> str:
+        """Source text of translatable chunk k."""
+        return self.text(self.translatable[k])
+
+    def source_texts(self) -> List[str]:
+        return [self.text(row) for row in self.translatable]
+
+    def stage(self, name: str) -> List[Any]:
+        """The (mutable) output column of a stage, created filled with None."""
+        values = self._stages.get(name)
+        if values is None:
+            values = self._stages[name] = [None] * len(self.translatable)
+        return values
+
+    def stage_values(self, name: str) -> List[Any]:
+        """Read-only access to a stage column; all None if the stage has not run."""
+        values = self._stages.get(name)
+        return values if values is not None else [None] * len(self.translatable)
+
+    def has_stage(self, name: str) -> bool:
+        return name in self._stages
+
+    def set_stage(self, name: str, values: List[Any]):
+        if len(values) != len(self.translatable):
+            raise ValueError(f"Stage '{name}' needs {len(self.translatable)} values, got {len(values)}.")
+        self._stages[name] = list(values)
+
+    def clear_stage(self, name: str):
+        self._stages.pop(name, None)
+
+    def output(self, k: int) -> Optional[str]:
+        """Best available translation of translatable chunk k (refined, else initial)."""
+        for name in (FINAL, TRANSLATION):
+            values = self._stages.get(name)
+            if values is not None and values[k] is not None:
+                return values[k]
+        return None
+
+    def legacy_lists(self) -> Dict[str, Any]:
+        """
+        The table as the per-stage lists TranslationState used to carry, for JSON
+        output (e.g. the state stream).
+        """
+        return {
+            "chunks": self.source_texts(),
+            "chunks_with_metadata": list(self.iter_metadata()),
+            "translated_chunks": self.stage_values(TRANSLATION),
+            "critiques": self.stage_values(CRITIQUE),
+            "final_chunks": self.stage_values(FINAL) if self.has_stage(FINAL) else None,
+        }
+
+    # --- Copying ---
+
+    def __copy__(self) -> "ChunkTable":
+        clone = object.__new__(ChunkTable)
+        for slot in self.__slots__:
+            setattr(clone, slot, getattr(self, slot))
+        clone._stages = dict(self._stages)
+        return clone
+
+    def __deepcopy__(self, memo) -> "ChunkTable":
+        clone = self.__copy__()
+        clone._stages = {
+            name: list(values) if all(isinstance(v, _ATOMIC) for v in values) else copy.deepcopy(values, memo)
+            for name, values in self._stages.items()
+        }
+        memo[id(self)] = clone
+        return clone
+
+    def __repr__(self) -> str:
+        return (f"ChunkTable({len(self)} chunks, {len(self.translatable)} translatable, "
+                f"stages={sorted(self._stages)})")
@@ -7,6 +7,26 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "translations.db")
+SOURCE_DIR = os.path.join(os.path.dirname(DB_PATH), "sources") # Source documents of running jobs
+
+def source_file_path(job_id: str) -> str:
+    """Path of the UTF-8 copy of a job's source document the worker memory-maps."""
+    return os.path.join(SOURCE_DIR, f"{job_id}.txt")
+
+def write_source_file(job_id: str, content: str) -> str:
+    """Write a job's source document to SOURCE_DIR; returns its path."""
+    os.makedirs(SOURCE_DIR, exist_ok=True)
+    path = source_file_path(job_id)
+    with open(path, "w", encoding="utf-8", newline="") as handle:
+        handle.write(content)
+    return path
+
+def delete_source_file(job_id: str):
+    """Delete the source document copy of a job, if any."""
+    try:
+        os.remove(source_file_path(job_id))
+    except FileNotFoundError:
+        pass
 
 # Helper function to check column existence using PRAGMA
 async def _column_exists(db, table_name, column_name):
@@ -217,6 +237,26 @@ async def init_db():
         WHERE is_default = 1;
         """)
 
+        # Create LLM call latency table (chunk size auto-tuning)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS llm_call_stats (
+            call_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            provider TEXT,
+            model TEXT,
+            stage TEXT,
+            chunk_chars INTEGER,
+            output_chars INTEGER,
+            latency_seconds REAL,
+            created_at TIMESTAMP,
+            FOREIGN KEY (job_id) REFERENCES jobs (job_id)
+        )
+        """)
+        await db.execute("""
+        CREATE INDEX IF NOT EXISTS idx_llm_call_stats_model
+        ON llm_call_stats (provider, model, stage)
+        """)
+
         await db.commit()
 
     # Run migrations if needed
@@ -406,6 +446,18 @@ async def get_next_pending_job() -> Optional[Dict[str, Any]]:
             return dict(row)
         return None
 
+async def get_jobs_by_status(status: str) -> List[Dict[str, Any]]:
+    """Get all jobs with the given status, oldest first."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+        SELECT * FROM jobs
+        WHERE status = ?
+        ORDER BY created_at ASC
+        """, (status,))
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
 async def list_jobs(limit: int = 100, offset: int = 0) -> List[Dict[str, Any]]:
     """List jobs with pagination."""
     async with aiosqlite.connect(DB_PATH) as db:
@@ -465,6 +517,16 @@ async def update_chunk(chunk_id: str, updates: Dict[str, Any]) -> bool:
     
     return True
 
+async def delete_chunks_from(job_id: str, first_index: int) -> int:
+    """Delete the chunks of a job from chunk_index first_index on; returns the number deleted."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        cursor = await db.execute("""
+        DELETE FROM job_chunks
+        WHERE job_id = ? AND chunk_index >= ?
+        """, (job_id, first_index))
+        await db.commit()
+        return cursor.rowcount
+
 async def get_chunks(job_id: str) -> List[Dict[str, Any]]:
     """Get all chunks for a job."""
     async with aiosqlite.connect(DB_PATH) as db:
@@ -491,12 +553,15 @@ async def delete_job(job_id: str) -> bool:
             await db.execute("DELETE FROM job_glossary WHERE job_id = ?", (job_id,))
             await db.execute("DELETE FROM job_critiques WHERE job_id = ?", (job_id,))
             await db.execute("DELETE FROM job_metrics WHERE job_id = ?", (job_id,))
+            # Latency history outlives the job (it describes the provider/model)
+            await db.execute("UPDATE llm_call_stats SET job_id = NULL WHERE job_id = ?", (job_id,))
             
             # Delete the job itself
             await db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
             
             # Commit the transaction
             await db.commit()
+            delete_source_file(job_id)
             return True
         except Exception as e:
             # Rollback in case of error
@@ -639,6 +704,36 @@ async def get_critiques(job_id: str) -> List[Dict[str, Any]]:
         rows = await cursor.fetchall()
         return [dict(row) for row in rows]
 
+# LLM call latency operations
+async def add_llm_calls(job_id: str, provider: str, model: str, calls: List[tuple]) -> int:
+    """Store (stage, chunk_chars, output_chars, seconds) records of a job's LLM calls."""
+    if not calls:
+        return 0
+    now = datetime.now().isoformat()
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.executemany("""
+        INSERT INTO llm_call_stats (
+            job_id, provider, model, stage, chunk_chars, output_chars, latency_seconds, created_at
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(job_id, provider, model, stage, chunk_chars, output_chars, seconds, now)
+              for stage, chunk_chars, output_chars, seconds in calls])
+        await db.commit()
+    return len(calls)
+
+async def get_llm_call_history(provider: str, model: str, limit: int = 2000) -> List[Dict[str, Any]]:
+    """The most recent LLM calls of a provider/model (all stages), newest first."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        db.row_factory = aiosqlite.Row
+        cursor = await db.execute("""
+        SELECT stage, chunk_chars, output_chars, latency_seconds FROM llm_call_stats
+        WHERE provider = ? AND model = ?
+        ORDER BY call_id DESC
+        LIMIT ?
+        """, (provider, model, limit))
+
+        rows = await cursor.fetchall()
+        return [dict(row) for row in rows]
+
 # Metrics operations
 async def add_metrics(job_id: str, metrics: Dict[str, Any]) -> str:
     """Add metrics for a job."""
@@ -9,7 +9,9 @@ try:
         terminology_unification,
         chunk_document
     )
-    from .nodes_translation import run_parallel_translation
+    from .nodes_translation import run_parallel_translation, pipelined_terminology_translation, streaming_deep_translation
+    from .node_utils import get_setting, has_pending_batch
+    from .checkpoints import build_checkpointer
     from .nodes_postprocessing import (
         critique_node,
         final_translation_node,
@@ -24,7 +26,9 @@ except ImportError: # Fallback if run directly? Less ideal.
          terminology_unification,
          chunk_document
      )
-     from .nodes_translation import run_parallel_translation
+     from .nodes_translation import run_parallel_translation, pipelined_terminology_translation, streaming_deep_translation
+     from .node_utils import get_setting, has_pending_batch
+     from .checkpoints import build_checkpointer
      from .nodes_postprocessing import (
          critique_node,
          final_translation_node,
@@ -32,9 +36,9 @@ except ImportError: # Fallback if run directly? Less ideal.
      )
 
 
-# Use simple in-memory checkpointer for now
-memory = None
-print("Using in-memory checkpointer (no persistence)")
+# Durable SQLite checkpoints (GRAPH_CHECKPOINTS), so interrupted jobs resume where they stopped
+memory = build_checkpointer()
+print("Using SQLite checkpointer" if memory is not None else "Using no checkpointer (no persistence)")
 
 
 # Define the workflow
@@ -46,6 +50,8 @@ workflow.add_node("init_translation", init_translation)
 workflow.add_node("terminology_unification", terminology_unification)
 workflow.add_node("chunk_document", chunk_document)
 workflow.add_node("initial_translation", run_parallel_translation)
+workflow.add_node("pipelined_translation", pipelined_terminology_translation)
+workflow.add_node("streaming_translation", streaming_deep_translation)
 workflow.add_node("critique_stage", critique_node)
 workflow.add_node("final_translation", final_translation_node)
 workflow.add_node("assemble_document", assemble_document)
@@ -68,7 +74,10 @@ def decide_next_step_after_init(state: TranslationState) -> str:
         # Skip terminology extraction if user provided a glossary
         return "chunk_document"
     
-    # Deep mode with no glossary: Do terminology extraction
+    # Deep mode with no glossary: Do terminology extraction, either as a separate
+    # stage or overlapped with translation (PIPELINED_TERMINOLOGY)
+    if get_setting(state.get("config", {}), "PIPELINED_TERMINOLOGY", "pipelined_terminology", False, bool):
+        return "pipelined_translation"
     return "terminology_unification"
 
 # Add conditional edges after init_translation node
@@ -77,16 +86,45 @@ workflow.add_conditional_edges(
     decide_next_step_after_init,
     {
         "terminology_unification": "terminology_unification",
+        "pipelined_translation": "pipelined_translation",
         "chunk_document": "chunk_document"
     }
 )
 
 workflow.add_edge("terminology_unification", "chunk_document")
-workflow.add_edge("chunk_document", "initial_translation")
+# Deep mode with STREAMING_DEEP_PIPELINE runs translation, critique and refinement
+# per chunk on one worker pool instead of as three separate stages
+def decide_after_chunking(state: TranslationState) -> str:
+    """Determines the translation path after chunking."""
+    config = state.get("config", {})
+    if (config.get("translation_mode", "deep_mode") != "quick_mode"
+            and get_setting(config, "STREAMING_DEEP_PIPELINE", "streaming_deep_pipeline", False, bool)
+            # Critique sampling picks chunks wave by wave, which needs the critique stage
+            and not get_setting(config, "CRITIQUE_SAMPLING", "critique_sampling", False, bool)):
+        return "streaming_translation"
+    return "initial_translation"
+
+workflow.add_conditional_edges(
+    "chunk_document",
+    decide_after_chunking,
+    {
+        "initial_translation": "initial_translation",
+        "streaming_translation": "streaming_translation"
+    }
+)
 
 # Define conditional edge function to decide path after initial translation
 def decide_after_initial_translation(state: TranslationState) -> str:
     """Determines next step after initial translation based on translation mode."""
+    if has_pending_batch(state, "run_parallel_translation"):
+        return "initial_translation" # Next batch (CHECKPOINT_BATCH_CHUNKS)
+    return decide_after_pipelined_translation(state)
+
+def decide_after_pipelined_translation(state: TranslationState) -> str:
+    """
+    Next step once every chunk is translated. The pipelined node translates all
+    chunks in one run (it has no batches), so it never loops back.
+    """
     translation_mode = state.get("config", {}).get("translation_mode", "deep_mode")
     if translation_mode == "quick_mode":
         # Quick mode: Skip critique and final translation, go directly to assembly
@@ -98,6 +136,17 @@ def decide_after_initial_translation(state: TranslationState) -> str:
 workflow.add_conditional_edges(
     "initial_translation",
     decide_after_initial_translation,
+    {
+        "initial_translation": "initial_translation",
+        "critique_stage": "critique_stage",
+        "assemble_document": "assemble_document"
+    }
+)
+
+# The pipelined node covers chunking and initial translation, so it joins the same path
+workflow.add_conditional_edges(
+    "pipelined_translation",
+    decide_after_pipelined_translation,
     {
         "critique_stage": "critique_stage",
         "assemble_document": "assemble_document"
@@ -111,6 +160,8 @@ def decide_after_critique(state: TranslationState) -> str:
         print(f"-> Critical error detected ('{state['error_info']}'), ending.")
         return END
 
+    if has_pending_batch(state, "critique_node"):
+        return "critique_stage" # Next batch (CHECKPOINT_BATCH_CHUNKS)
     return "final_translation"
 
 # Add Conditional Edges after critique_stage node
@@ -118,17 +169,32 @@ workflow.add_conditional_edges(
     "critique_stage", # Updated source node
     decide_after_critique,
     {
+        "critique_stage": "critique_stage",
         "final_translation": "final_translation",
         END: END
     }
 )
 
 # --- Final Translation Path ---
-workflow.add_edge("final_translation", "assemble_document") # Route to assembly
+def decide_after_final_translation(state: TranslationState) -> str:
+    """Runs the refinement node again while it has batches left."""
+    if has_pending_batch(state, "final_translation_node"):
+        return "final_translation" # Next batch (CHECKPOINT_BATCH_CHUNKS)
+    return "assemble_document"
+
+workflow.add_conditional_edges(
+    "final_translation",
+    decide_after_final_translation,
+    {
+        "final_translation": "final_translation",
+        "assemble_document": "assemble_document" # Route to assembly
+    }
+)
+workflow.add_edge("streaming_translation", "assemble_document")
 workflow.add_edge("assemble_document", END) # End after assembly
 
-# Compile the basic workflow
-compiled_graph = workflow.compile()
+# Compile the workflow; with a checkpointer every node run is checkpointed under the job's thread_id
+compiled_graph = workflow.compile(checkpointer=memory)
 print("Graph compiled successfully")
 
 
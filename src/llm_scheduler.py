@@ -0,0 +1,283 @@
+import concurrent.futures
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+try:
+    from .providers import resolve_provider_model
+except ImportError: # Fallback for direct script execution, or without the LLM client packages
+    try:
+        from providers import resolve_provider_model
+    except ImportError:
+        resolve_provider_model = None
+
+logger = logging.getLogger("turjuman.llm_scheduler")
+
+TERMINOLOGY = "terminology"
+# get_llm_client() role of the workers of each stage (their provider can differ per role)
+STAGE_ROLES = {"translation": "default", "critique": "critique", "review": "critique", "final": "refine", TERMINOLOGY: "default"}
+
+
+def parse_limits(value: Optional[str]) -> Dict[str, int]:
+    """Parses "translation=8,critique=4" style sub-limits; invalid or non-positive entries are ignored."""
+    limits = {}
+    for item in (value or "").split(","):
+        name, _, limit = item.partition("=")
+        try:
+            limit = int(limit)
+        except ValueError:
+            continue
+        if name.strip() and limit > 0:
+            limits[name.strip().lower()] = limit
+    return limits
+
+
+class _Task:
+    __slots__ = ("seq", "fn", "args", "future", "stage", "provider", "group", "enqueued")
+
+    def __init__(self, seq, fn, args, stage, provider, group):
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.future = concurrent.futures.Future()
+        self.stage = stage
+        self.provider = provider
+        self.group = group
+        self.enqueued = time.perf_counter()
+
+
+class LLMScheduler:
+    """
+    Process-wide bound on concurrent LLM calls, shared by every stage of every job.
+
+    At most `max_concurrency` calls run at once. A call also waits while its stage
+    (stage_limits, e.g. {"critique": 4}), its provider (provider_limits, e.g.
+    {"ollama": 1}) or its pool (the MAX_PARALLEL_WORKERS of the job's fan-out) is at
+    its limit. Among the calls that may start, the one queued first goes first, so
+    a blocked stage or provider does not hold up the others. `stats()` reports the
+    queue depth, the active calls and the time calls waited in the queue.
+    """
+
+    def __init__(self, max_concurrency: int = 16, stage_limits: Optional[Dict[str, int]] = None,
+                 provider_limits: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.stage_limits = dict(stage_limits or {})
+        self.provider_limits = dict(provider_limits or {})
+        # Threads are only started for calls the limits let through, so the
+        # executor never queues and never holds more than max_concurrency threads
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._queues: Dict[Tuple[str, str, int], Deque[_Task]] = {}
+        self._active_stage: Dict[str, int] = {}
+        self._active_provider: Dict[str, int] = {}
+        self._active_group: Dict[int, int] = {}
+        self._group_limits: Dict[int, int] = {}
+        self.active = 0
+        self.queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.max_queued = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def new_group(self, limit: int) -> int:
+        """Registers a fan-out whose calls may use at most `limit` slots; returns its id."""
+        with self._lock:
+            group = next(self._seq)
+            self._group_limits[group] = max(1, limit)
+            return group
+
+    def close_group(self, group: int):
+        with self._lock:
+            self._group_limits.pop(group, None)
+
+    def submit(self, fn: Callable, *args: Any, stage: str, provider: str = "default", group: Optional[int] = None) -> concurrent.futures.Future:
+        """Queues fn(*args) and returns its Future (with `queued_seconds` set once it starts)."""
+        with self._lock:
+            task = _Task(next(self._seq), fn, args, stage, provider, group)
+            self._queues.setdefault((stage, provider, group), deque()).append(task)
+            self.queued += 1
+            self.submitted += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            self._dispatch()
+        return task.future
+
+    def _can_start(self, stage: str, provider: str, group: Optional[int]) -> bool:
+        if self._active_stage.get(stage, 0) >= self.stage_limits.get(stage, self.max_concurrency):
+            return False
+        if self._active_provider.get(provider, 0) >= self.provider_limits.get(provider, self.max_concurrency):
+            return False
+        return group is None or self._active_group.get(group, 0) < self._group_limits.get(group, self.max_concurrency)
+
+    def _dispatch(self):
+        """Starts queued calls while slots are free (called with the lock held)."""
+        while self.active < self.max_concurrency and self.queued:
+            startable = [queue for key, queue in self._queues.items() if queue and self._can_start(*key)]
+            if not startable:
+                return
+            task = min(startable, key=lambda queue: queue[0].seq).popleft()
+            if not self._queues[(task.stage, task.provider, task.group)]:
+                del self._queues[(task.stage, task.provider, task.group)]
+            if not task.future.set_running_or_notify_cancel():
+                self.queued -= 1
+                continue
+            waited = time.perf_counter() - task.enqueued
+            task.future.queued_seconds = waited
+            self.queued -= 1
+            self.active += 1
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self._active_stage[task.stage] = self._active_stage.get(task.stage, 0) + 1
+            self._active_provider[task.provider] = self._active_provider.get(task.provider, 0) + 1
+            if task.group is not None:
+                self._active_group[task.group] = self._active_group.get(task.group, 0) + 1
+            self._executor.submit(self._run, task)
+
+    def _run(self, task: _Task):
+        try:
+            result = task.fn(*task.args)
+        except BaseException as e:
+            task.future.set_exception(e)
+        else:
+            task.future.set_result(result)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+                self._active_stage[task.stage] -= 1
+                self._active_provider[task.provider] -= 1
+                if task.group is not None:
+                    self._active_group[task.group] -= 1
+                    if not self._active_group[task.group]:
+                        del self._active_group[task.group]
+                self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Snapshot of the queue depth, active calls (total, by stage and provider) and queue waits."""
+        with self._lock:
+            queued_stage: Dict[str, int] = {}
+            queued_provider: Dict[str, int] = {}
+            for (stage, provider, _), queue in self._queues.items():
+                queued_stage[stage] = queued_stage.get(stage, 0) + len(queue)
+                queued_provider[provider] = queued_provider.get(provider, 0) + len(queue)
+            started = self.submitted - self.queued
+            return {
+                "max_concurrency": self.max_concurrency,
+                "active": self.active,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "mean_wait_seconds": round(self.wait_seconds / started, 3) if started else 0.0,
+                "max_wait_seconds": round(self.max_wait_seconds, 3),
+                "stages": {name: {"active": self._active_stage.get(name, 0), "queued": queued_stage.get(name, 0),
+                                  "limit": self.stage_limits.get(name)}
+                           for name in sorted(set(self._active_stage) | set(queued_stage) | set(self.stage_limits))},
+                "providers": {name: {"active": self._active_provider.get(name, 0), "queued": queued_provider.get(name, 0),
+                                     "limit": self.provider_limits.get(name)}
+                              for name in sorted(set(self._active_provider) | set(queued_provider) | set(self.provider_limits))},
+            }
+
+
+class LLMPool:
+    """
+    One fan-out of a node on the shared scheduler, used like a ThreadPoolExecutor:
+    at most `max_workers` of its calls run at once, and leaving the `with` block
+    waits for them. Keeps the queue waits of its calls per stage (`waits`).
+    """
+
+    def __init__(self, scheduler: LLMScheduler, config: Dict[str, Any], max_workers: int):
+        self.scheduler = scheduler
+        self.config = config or {}
+        self.group = scheduler.new_group(max_workers)
+        self._futures = [] # (stage, future)
+
+    def submit(self, stage: str, fn: Callable, *args: Any) -> concurrent.futures.Future:
+        future = self.scheduler.submit(fn, *args, stage=stage, provider=stage_provider(self.config, stage), group=self.group)
+        self._futures.append((stage, future))
+        return future
+
+    @property
+    def waits(self) -> Dict[str, Dict[str, Any]]:
+        """Calls, total and longest queue wait (seconds) of the started calls, per stage."""
+        waits: Dict[str, Dict[str, Any]] = {}
+        for stage, future in self._futures:
+            waited = getattr(future, "queued_seconds", None)
+            if waited is None: # Not started (yet), or cancelled
+                continue
+            wait = waits.setdefault(stage, {"calls": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+            wait["calls"] += 1
+            wait["wait_seconds"] = round(wait["wait_seconds"] + waited, 3)
+            wait["max_wait_seconds"] = round(max(wait["max_wait_seconds"], waited), 3)
+        return waits
+
+    def __enter__(self) -> "LLMPool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None: # Drop the calls that did not start
+            for _, future in self._futures:
+                future.cancel()
+        concurrent.futures.wait([future for _, future in self._futures])
+        self.scheduler.close_group(self.group)
+        return False
+
+
+def stage_provider(config: Dict[str, Any], stage: str) -> str:
+    """Provider the workers of `stage` call for this job config (for the provider sub-limits)."""
+    if resolve_provider_model is None:
+        return str((config or {}).get("provider", "openai")).lower()
+    return resolve_provider_model(config or {}, STAGE_ROLES.get(stage, "default"))[0]
+
+
+_default_scheduler: Optional[LLMScheduler] = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Process-wide scheduler; its limits are read once from LLM_MAX_CONCURRENCY
+    (default 16), LLM_STAGE_LIMITS and LLM_PROVIDER_LIMITS.
+    """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            try:
+                max_concurrency = int(os.environ.get("LLM_MAX_CONCURRENCY", 16))
+            except ValueError:
+                max_concurrency = 16
+            _default_scheduler = LLMScheduler(max_concurrency,
+                                              parse_limits(os.environ.get("LLM_STAGE_LIMITS")),
+                                              parse_limits(os.environ.get("LLM_PROVIDER_LIMITS")))
+            logger.info(f"LLM scheduler: {_default_scheduler.max_concurrency} concurrent calls, "
+                        f"stage limits {_default_scheduler.stage_limits}, provider limits {_default_scheduler.provider_limits}")
+        return _default_scheduler
+
+
+def llm_pool(config: Dict[str, Any], max_workers: int) -> LLMPool:
+    """A fan-out of at most `max_workers` concurrent calls on the process-wide scheduler."""
+    return LLMPool(get_llm_scheduler(), config, max_workers)
+
+
+def record_llm_waits(state: Dict[str, Any], pool: LLMPool):
+    """
+    Adds the queue waits of a pool's calls to metrics["llm_scheduler"]["waits"][stage]
+    (calls, total and longest wait in seconds) and keeps the scheduler's peak queue depth.
+    """
+    metrics = state.get("metrics")
+    if not isinstance(metrics, dict):
+        return
+    report = metrics.setdefault("llm_scheduler", {"waits": {}})
+    for stage, wait in pool.waits.items():
+        total = report["waits"].setdefault(stage, {"calls": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+        total["calls"] += wait["calls"]
+        total["wait_seconds"] = round(total["wait_seconds"] + wait["wait_seconds"], 3)
+        total["max_wait_seconds"] = max(total["max_wait_seconds"], wait["max_wait_seconds"])
+    stats = pool.scheduler.stats()
+    report["max_concurrency"] = stats["max_concurrency"]
+    report["max_queued"] = stats["max_queued"]
@@ -1,15 +1,21 @@
+import heapq
 import json
+import math
+import os
+import random
 import re
-from typing import Any, Optional, List, Dict
+from typing import Any, Optional, List, Dict, Tuple
 
 # Ensure correct import paths if running as part of package 'src'
 try:
     from .state import TranslationState
     from .utils import log_to_state
+    from .chunk_table import TRANSLATION, CRITIQUE, FINAL
 except ImportError: # Fallback for potential direct script execution (less ideal)
     # This might be problematic if state/utils rely on other relative imports
     from state import TranslationState
     from utils import log_to_state
+    from chunk_table import TRANSLATION, CRITIQUE, FINAL
 
 
 def safe_json_parse(json_string: str, state: TranslationState, node_name: str) -> Optional[Any]:
@@ -175,4 +181,480 @@ def filter_and_prioritize_terminology(
             key=lambda item: (-item["count"], item["entry"].get("sourceTerm", "").lower())
         )
         # Return only the entries from the top max_terms
-        return [item["entry"] for item in sorted_terms[:max_terms]]
\ No newline at end of file
+        return [item["entry"] for item in sorted_terms[:max_terms]]
+
+# --- Settings ---
+
+def get_setting(config: Dict[str, Any], env_name: str, config_key: Optional[str] = None,
+                default: Any = None, cast: Any = str) -> Any:
+    """
+    Reads a tunable setting using the same priority as MAX_PARALLEL_WORKERS:
+    environment variable > job config > default.
+    Values that cannot be converted with `cast` fall through to the next source.
+    """
+    candidates = [os.environ.get(env_name)]
+    if config_key and isinstance(config, dict):
+        candidates.append(config.get(config_key))
+    for value in candidates:
+        if value is None or value == "":
+            continue
+        try:
+            if cast is bool and isinstance(value, str):
+                return value.strip().lower() in ("1", "true", "yes", "on")
+            return cast(value)
+        except (TypeError, ValueError):
+            continue
+    return default
+
+
+def stratified_order(count: int) -> List[int]:
+    """
+    Orders region indices so that every prefix of the order is spread evenly across
+    the document (0, n/2, n/4, 3n/4, ...), using a base-2 van der Corput sequence.
+    Processing regions in this order lets a partial run sample the whole book.
+    """
+    if count <= 0:
+        return []
+    bits = max(1, (count - 1).bit_length())
+    size = 1 << bits
+    order = []
+    seen = set()
+    for i in range(size):
+        # Reverse the bits of i to get the radical inverse i / size in base 2
+        reversed_i = int(format(i, f"0{bits}b")[::-1], 2)
+        index = reversed_i * count // size
+        if index not in seen:
+            seen.add(index)
+            order.append(index)
+    return order
+
+
+def build_terminology_regions(chunks: List[str], max_size: int) -> List[Dict[str, Any]]:
+    """
+    Groups consecutive translatable chunks into terminology extraction regions of at
+    most `max_size` characters (a single oversized chunk forms its own region).
+    Each region records the chunk indices it covers, so a chunk can be released to
+    translation as soon as its region has been processed.
+    """
+    regions = []
+    current: List[int] = []
+    current_size = 0
+    for i, text in enumerate(chunks):
+        added = len(text) + (2 if current else 0)
+        if current and current_size + added > max_size:
+            regions.append(current)
+            current, current_size, added = [], 0, len(text)
+        current.append(i)
+        current_size += added
+    if current:
+        regions.append(current)
+    return [{"text": "\n\n".join(chunks[i] for i in idxs), "chunk_indices": idxs} for idxs in regions]
+
+
+def terminology_sampling(config: Dict[str, Any], extraction_mode: str, regions: int, workers: int) -> Optional[Dict[str, Any]]:
+    """
+    Adaptive terminology sampling (TERMINOLOGY_ADAPTIVE_SAMPLING, llm extraction mode
+    only): settings and progress of a run over `regions` regions, or None when it is
+    disabled. Regions are visited in stratified_order and extraction stops once
+    new-term discovery per region flattens out (see sampling_should_stop).
+    """
+    if (extraction_mode != "llm"
+            or not get_setting(config, "TERMINOLOGY_ADAPTIVE_SAMPLING", "terminology_adaptive_sampling", False, bool)
+            or regions < max(2, get_setting(config, "TERMINOLOGY_SAMPLING_MIN_REGIONS", "terminology_sampling_min_regions", 20, int))):
+        return None
+    return {
+        "regions_total": regions,
+        "wave_size": max(1, get_setting(config, "TERMINOLOGY_SAMPLING_WAVE_SIZE", "terminology_sampling_wave_size", workers, int)),
+        "threshold": get_setting(config, "TERMINOLOGY_SAMPLING_THRESHOLD", "terminology_sampling_threshold", 1.0, float),
+        "min_fraction": min(1.0, max(0.0, get_setting(config, "TERMINOLOGY_SAMPLING_MIN_FRACTION", "terminology_sampling_min_fraction", 0.25, float))),
+        "patience": max(1, get_setting(config, "TERMINOLOGY_SAMPLING_PATIENCE", "terminology_sampling_patience", 2, int)),
+        "processed": 0,
+        "discovered": set(),
+        "curve": [],  # New unique terms per region, one entry per wave_size finished regions
+        "wave_regions": 0,
+        "wave_new": 0,
+        "stopped_early": False,
+    }
+
+
+def record_sampled_region(sampling: Dict[str, Any], terms: List[Dict[str, Any]], last: bool) -> Optional[float]:
+    """
+    Counts one finished region and the terms extracted from it. Returns the discovery
+    rate (new unique terms per region) when the region closes a wave, or is the
+    `last` one to finish, otherwise None.
+    """
+    sampling["processed"] += 1
+    sampling["wave_regions"] += 1
+    for entry in terms:
+        key = str(entry.get("sourceTerm", "")).strip().lower()
+        if key and key not in sampling["discovered"]:
+            sampling["discovered"].add(key)
+            sampling["wave_new"] += 1
+    if sampling["wave_regions"] < sampling["wave_size"] and not last:
+        return None
+    rate = sampling["wave_new"] / sampling["wave_regions"]
+    sampling["curve"].append(round(rate, 3))
+    sampling["wave_regions"] = sampling["wave_new"] = 0
+    return rate
+
+
+def sampling_should_stop(sampling: Dict[str, Any]) -> bool:
+    """True once enough regions are processed and the last `patience` waves stayed below the threshold."""
+    recent = sampling["curve"][-sampling["patience"]:]
+    return (sampling["processed"] >= sampling["min_fraction"] * sampling["regions_total"]
+            and len(recent) == sampling["patience"]
+            and all(rate < sampling["threshold"] for rate in recent))
+
+
+def terminology_sampling_report(sampling: Dict[str, Any]) -> Dict[str, Any]:
+    """The metrics["terminology_sampling"] entry of a sampled run."""
+    return {
+        "regions_total": sampling["regions_total"],
+        "regions_processed": sampling["processed"],
+        "stopped_early": sampling["stopped_early"],
+        "threshold": sampling["threshold"],
+        "discovery_curve": sampling["curve"],
+        "unique_terms": len(sampling["discovered"])
+    }
+
+
+# --- Chunk size auto-tuning ---
+
+def fit_latency_model(samples: List[Tuple[float, float]], min_samples: int = 20) -> Optional[Tuple[float, float]]:
+    """
+    Least-squares fit of per-call latency = intercept + per_char * chunk_chars from
+    (chunk_chars, latency_seconds) samples. Both coefficients are kept non-negative:
+    a negative slope is replaced by the mean latency, a negative intercept by a fit
+    through the origin. Returns None with fewer than `min_samples` samples or when
+    all samples have the same size (the slope cannot be estimated).
+    """
+    if len(samples) < max(2, min_samples):
+        return None
+    n = len(samples)
+    mean_x = sum(x for x, _ in samples) / n
+    mean_y = sum(y for _, y in samples) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in samples)
+    if var_x <= 0:
+        return None
+    slope = sum((x - mean_x) * (y - mean_y) for x, y in samples) / var_x
+    intercept = mean_y - slope * mean_x
+    if slope < 0:
+        return (max(0.0, mean_y), 0.0)
+    if intercept < 0:
+        return (0.0, sum(x * y for x, y in samples) / sum(x * x for x, _ in samples))
+    return (intercept, slope)
+
+
+def predict_makespan(total_chars: int, chunk_size: int, concurrency: int,
+                     models: List[Tuple[float, float]]) -> float:
+    """
+    Predicted wall time of the LLM stages of a job whose `total_chars` are split into
+    ceil(total_chars / chunk_size) chunks of even size. Each stage (one latency
+    model per stage) runs its calls in waves of `concurrency` and the next stage
+    starts when the last call of the previous one returns.
+    """
+    count = max(1, math.ceil(total_chars / max(1, chunk_size)))
+    waves = math.ceil(count / max(1, concurrency))
+    per_chunk = total_chars / count
+    return sum(waves * (intercept + per_char * per_chunk) for intercept, per_char in models)
+
+
+def choose_chunk_size(total_chars: int, concurrency: int, models: List[Tuple[float, float]],
+                      lower: int, upper: int) -> Tuple[int, float]:
+    """
+    Max chunk size in [lower, upper] minimizing predict_makespan(). For w waves the
+    best split is w * concurrency chunks (the smallest chunks that still fit in w
+    waves), so those sizes are the only candidates besides the bounds. Ties go to the
+    larger size (fewer calls). Returns (chunk_size, predicted_seconds).
+    """
+    lower, upper = max(1, min(lower, upper)), max(1, upper)
+    concurrency = max(1, concurrency)
+    candidates = {lower, upper}
+    max_waves = math.ceil(math.ceil(total_chars / lower) / concurrency)
+    for waves in range(1, max_waves + 1):
+        size = math.ceil(total_chars / (waves * concurrency))
+        if lower <= size <= upper:
+            candidates.add(size)
+    best_size, best_time = upper, predict_makespan(total_chars, upper, concurrency, models)
+    for size in sorted(candidates, reverse=True):
+        predicted = predict_makespan(total_chars, size, concurrency, models)
+        if predicted < best_time:
+            best_size, best_time = size, predicted
+    return best_size, best_time
+
+
+def chunk_size_stats(sizes: List[int], workers: int) -> Dict[str, Any]:
+    """
+    Size spread of the translatable chunks and the makespan of one parallel stage
+    over them, in characters: chunks are handed in order to the first free of
+    `workers` workers and take time proportional to their size.
+    """
+    if not sizes:
+        return {"chunks": 0, "mean": 0.0, "variance": 0.0, "min": 0, "max": 0, "makespan": 0}
+    mean = sum(sizes) / len(sizes)
+    loads = [0] * max(1, min(workers, len(sizes)))
+    for size in sizes:
+        heapq.heapreplace(loads, loads[0] + size)
+    return {"chunks": len(sizes), "mean": round(mean, 1),
+            "variance": round(sum((size - mean) ** 2 for size in sizes) / len(sizes), 1),
+            "min": min(sizes), "max": max(sizes), "makespan": max(loads)}
+
+
+# Review modes of deep mode: critique and refinement as two LLM calls, or one fused call
+REVIEW_MODES = ["two_call", "fused_review"]
+# llm_calls stage of a fused critique + refinement call
+REVIEW = "review"
+
+
+def review_mode(config: Dict[str, Any]) -> str:
+    """REVIEW_MODE setting; unknown values fall back to "two_call"."""
+    mode = get_setting(config, "REVIEW_MODE", "review_mode", "two_call")
+    return mode if mode in REVIEW_MODES else "two_call"
+
+
+def record_llm_call(state: TranslationState, stage: str, chunk_chars: int, result: Dict[str, Any]):
+    """
+    Appends the latency of a worker's LLM call (result["llm_seconds"]) to
+    state["llm_calls"] as (stage, chunk_chars, output_chars, seconds). The worker
+    stores these per provider/model for chunk size auto-tuning.
+    """
+    seconds = result.get("llm_seconds")
+    if seconds is None:
+        return
+    calls = state.get("llm_calls")
+    if calls is None:
+        calls = state["llm_calls"] = []
+    calls.append((stage, chunk_chars, result.get("output_chars", 0), round(seconds, 3)))
+
+
+# --- Refinement gate ---
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """Rough token count of a text (about 4 characters per token)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _count_items(value: Any) -> int:
+    """Number of entries in a critique list field; a non-empty string counts as one."""
+    if isinstance(value, (list, tuple)):
+        return len([item for item in value if item])
+    return 1 if value else 0
+
+
+def critique_passes(critique: Any, min_accuracy: float, min_accent: float,
+                    max_glossary_issues: int, max_suggestions: int) -> bool:
+    """
+    True if a critique is good enough that its chunk does not need refinement:
+    accuracyScore and accentAdherence at least the minimums, and no more glossary
+    issues (glossaryAdherence) and suggestedImprovements than allowed. Error
+    critiques and missing or non-numeric scores never pass.
+    """
+    if not isinstance(critique, dict) or "error" in critique:
+        return False
+    try:
+        accuracy = float(critique["accuracyScore"])
+        accent = float(critique["accentAdherence"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (accuracy >= min_accuracy and accent >= min_accent
+            and _count_items(critique.get("glossaryAdherence")) <= max_glossary_issues
+            and _count_items(critique.get("suggestedImprovements")) <= max_suggestions)
+
+
+
+# --- Critique sampling ---
+
+def wilson_bounds(failures: int, n: int, z: float = 1.96) -> Tuple[float, float]:
+    """Wilson score interval of a failure rate observed as `failures` out of `n` (0, 1 for n = 0)."""
+    if n <= 0:
+        return 0.0, 1.0
+    p = failures / n
+    center = p + z * z / (2 * n)
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+    denominator = 1 + z * z / n
+    return max(0.0, (center - margin) / denominator), min(1.0, (center + margin) / denominator)
+
+
+def sampling_strata(indices: List[int], strata: int) -> List[List[int]]:
+    """Splits `indices` (in document order) into up to `strata` contiguous strata of near-equal size."""
+    strata = max(1, min(strata, len(indices)))
+    bounds = [len(indices) * h // strata for h in range(strata + 1)]
+    return [indices[bounds[h]:bounds[h + 1]] for h in range(strata) if bounds[h] < bounds[h + 1]]
+
+
+def next_critique_sample(valid: List[int], outcomes: Dict[int, Optional[bool]], sample: Dict[str, Any]) -> List[int]:
+    """
+    Next wave of chunks to critique in sampling mode, [] once the sample is complete.
+
+    `valid` are the critiqueable chunk indices in document order and `outcomes` the
+    chunks critiqued so far (True: failed, False: passed, None: critique error).
+    `sample` holds the sampling settings (see critique_sampling in
+    nodes_postprocessing). Each stratum first gets a random sample of
+    `fraction` of its chunks (at least `min_per_stratum`). Then, wave by wave:
+    a stratum whose observed failure rate exceeds `max_failure_rate` is
+    critiqued completely; one whose Wilson upper bound still exceeds it doubles
+    its sample; the others stop. The `neighbors` chunks on each side of a failed
+    chunk are always added, so clusters of failures are followed across strata.
+    The random order of each stratum is derived from `seed`, so a wave can be
+    recomputed from the outcomes alone (e.g. after resuming from a checkpoint).
+    """
+    wave = set()
+    for h, stratum in enumerate(sampling_strata(valid, sample["strata"])):
+        order = list(stratum)
+        random.Random(f"{sample['seed']}:{h}").shuffle(order)
+        todo = [i for i in order if i not in outcomes]
+        if not todo:
+            continue
+        judged = [outcomes[i] for i in stratum if outcomes.get(i) is not None]
+        n, failures = len(judged), sum(judged)
+        quota = max(sample["min_per_stratum"], math.ceil(sample["fraction"] * len(stratum)))
+        attempted = len(stratum) - len(todo)
+        if attempted < quota:
+            take = quota - attempted
+        elif n and failures / n > sample["max_failure_rate"]:
+            take = len(todo) # Failures cluster in this stratum: critique all of it
+        elif wilson_bounds(failures, n, sample["z"])[1] > sample["max_failure_rate"]:
+            take = max(1, n) # Not confident enough yet: double the sample
+        else:
+            take = 0
+        wave.update(todo[:take])
+
+    valid_set = set(valid)
+    for i, failed in outcomes.items():
+        if failed:
+            for d in range(1, sample["neighbors"] + 1):
+                wave.update(j for j in (i - d, i + d) if j in valid_set and j not in outcomes)
+    return sorted(wave)
+
+
+def critique_sample_report(valid: List[int], outcomes: Dict[int, Optional[bool]], sample: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Coverage and estimated failure rate of a sampled critique. Each stratum's
+    uncritiqued chunks are assumed to fail at the stratum's observed rate (and at
+    its Wilson upper bound for `failure_rate_upper`). Chunks added as neighbours
+    of failures make the estimate conservative.
+    """
+    failures_estimate = failures_upper = 0.0
+    strata = []
+    for stratum in sampling_strata(valid, sample["strata"]):
+        judged = [outcomes[i] for i in stratum if outcomes.get(i) is not None]
+        n, failures = len(judged), sum(judged)
+        unseen = sum(1 for i in stratum if i not in outcomes)
+        upper = wilson_bounds(failures, n, sample["z"])[1]
+        failures_estimate += failures + (failures / n if n else 0.0) * unseen
+        failures_upper += failures + upper * unseen
+        strata.append({"chunks": len(stratum), "critiqued": len(stratum) - unseen, "failures": failures,
+                       "failure_rate_upper": round(upper, 4)})
+    critiqued = sum(1 for i in valid if i in outcomes)
+    total = max(1, len(valid))
+    return {
+        "chunks": len(valid),
+        "critiqued": critiqued,
+        "coverage": round(critiqued / total, 4),
+        "failures": sum(1 for i in valid if outcomes.get(i)),
+        "estimated_failure_rate": round(failures_estimate / total, 4),
+        "failure_rate_upper": round(min(1.0, failures_upper / total), 4),
+        "fully_critiqued_strata": sum(1 for s in strata if s["critiqued"] == s["chunks"]),
+        "strata": strata,
+    }
+
+
+# --- Checkpoint batches ---
+
+def next_batch(state: TranslationState, node_name: str, work: Optional[List[int]]) -> Tuple[List[int], int]:
+    """
+    Chunk indices a batched node processes in this run. With CHECKPOINT_BATCH_CHUNKS
+    set, the translation, critique and refinement nodes handle that many chunks per
+    run and the graph loops back to them, so a checkpoint is written after every
+    batch. `work` is the node's full list, used on its first run (when
+    `has_pending_batch` is False); the rest is kept in
+    state["pending_chunks"][node_name] until it is empty.
+    Returns (batch, number of chunks left for later runs).
+    """
+    pending = dict(state.get("pending_chunks") or {})
+    todo = pending.get(node_name) or work or []
+    size = get_setting(state.get("config", {}), "CHECKPOINT_BATCH_CHUNKS", "checkpoint_batch_chunks", 0, int)
+    batch, rest = (list(todo[:size]), list(todo[size:])) if size > 0 else (list(todo), [])
+    if rest:
+        pending[node_name] = rest
+    else:
+        pending.pop(node_name, None)
+    state["pending_chunks"] = pending
+    return batch, len(rest)
+
+
+def has_pending_batch(state: TranslationState, node_name: str) -> bool:
+    """Whether a batched node has chunks left for another run."""
+    return bool((state.get("pending_chunks") or {}).get(node_name))
+
+
+# --- Stored chunk outputs ---
+
+def seed_stored_chunks(table, records: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Copies chunk outputs stored by earlier runs of a job (records with "index",
+    "source", "translation", "critique" and "final") into the TRANSLATION,
+    CRITIQUE and FINAL columns of a new chunk table, so the stages only process
+    the missing chunks. A record is used for a translatable chunk with the same
+    source text, preferably the one at the same index (chunking may have shifted
+    indices). A critique is only used with its translation and a refined chunk
+    only with its critique. Returns the number of values seeded per stage.
+    """
+    by_text: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        if record.get("translation") and record.get("source") is not None:
+            by_text.setdefault(record["source"], []).append(record)
+    counts = {TRANSLATION: 0, CRITIQUE: 0, FINAL: 0}
+    if not by_text:
+        return counts
+
+    translations, critiques, finals = table.stage(TRANSLATION), table.stage(CRITIQUE), table.stage(FINAL)
+    for k in range(table.translatable_count):
+        candidates = by_text.get(table.source_text(k))
+        if not candidates:
+            continue
+        record = next((r for r in candidates if r.get("index") == k), candidates[0])
+        candidates.remove(record)
+        translations[k] = record["translation"]
+        counts[TRANSLATION] += 1
+        critique = record.get("critique")
+        if isinstance(critique, dict) and "error" not in critique:
+            critiques[k] = critique
+            counts[CRITIQUE] += 1
+            if record.get("final"):
+                finals[k] = record["final"]
+                counts[FINAL] += 1
+    for name in counts:
+        if not counts[name]:
+            table.clear_stage(name) # Keep "stage has not run" for the nodes
+    return counts
+
+
+def unseed_changed_neighbors(table, records: List[Dict[str, Any]], neighbors: int, kept_sources=()) -> Dict[str, int]:
+    """
+    Incremental runs: after seed_stored_chunks copied a base job's outputs, finds the
+    changed chunks (translatable chunks whose source text is in no base record) and
+    clears the seeded outputs of the unchanged chunks within `neighbors` chunks of
+    one, so they are translated again with the edited text as context. Chunks whose
+    source text is in `kept_sources` (rows an earlier run of the job itself stored,
+    after doing the same) are left alone. Returns the number of changed chunks and
+    of cleared neighbours.
+    """
+    sources = {record["source"] for record in records if record.get("source") is not None}
+    changed = [k for k in range(table.translatable_count) if table.source_text(k) not in sources]
+    report = {"changed": len(changed), "neighbors": 0}
+    if not changed or neighbors <= 0 or not table.has_stage(TRANSLATION):
+        return report
+
+    changed_set = set(changed)
+    columns = [table.stage(name) for name in (TRANSLATION, CRITIQUE, FINAL) if table.has_stage(name)]
+    for k in sorted({j for k in changed for j in range(k - neighbors, k + neighbors + 1)}):
+        if (0 <= k < table.translatable_count and k not in changed_set and columns[0][k] is not None
+                and table.source_text(k) not in kept_sources):
+            for column in columns:
+                column[k] = None
+            report["neighbors"] += 1
+    for name in (TRANSLATION, CRITIQUE, FINAL):
+        if table.has_stage(name) and all(value is None for value in table.stage_values(name)):
+            table.clear_stage(name)
+    return report
@@ -110,7 +110,9 @@ def translate_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
         translation_chain = translation_prompt_template | llm | StrOutputParser()
         
 
+        call_start = time.perf_counter()
         translation_response = translation_chain.invoke({})
+        llm_seconds = time.perf_counter() - call_start
         translated_text = translation_response
         translation_metadata = getattr(translation_response, 'response_metadata', {})
 
@@ -149,7 +151,9 @@ def translate_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
             # "hallucination_warning": None, # Removed
             "chunk_size": len(chunk_text), # Add original chunk size
             "filtered_term_count": len(filtered_terminology), # Add filtered term count
-            "prompt_char_count": len(translation_system_prompt) # Add prompt character count
+            "prompt_char_count": len(translation_system_prompt), # Add prompt character count
+            "llm_seconds": llm_seconds, # Latency of the LLM call (chunk size auto-tuning)
+            "output_chars": len(translated_text)
         }
 
     except FileNotFoundError:
@@ -223,7 +227,9 @@ def _critique_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
             "target_accent_guidance": target_accent_guidance # Pass the accent guidance
         }
 
+        call_start = time.perf_counter()
         response = chain.invoke(critique_context)
+        llm_seconds = time.perf_counter() - call_start
 
         # Log the formatted prompt AFTER invoking
         try:
@@ -259,7 +265,10 @@ def _critique_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
             "original_index": original_index,
             "critique": critique_data, # Parsed critique
             "node_name": NODE_NAME,
-            "logs": temp_state_for_logging["logs"] # Include logs from safe_json_parse
+            "logs": temp_state_for_logging["logs"], # Include logs from safe_json_parse
+            "prompt_char_count": len(formatted_critique_prompt) if 'formatted_critique_prompt' in locals() else 0,
+            "llm_seconds": llm_seconds,
+            "output_chars": len(response)
         }
 
     except FileNotFoundError:
@@ -274,6 +283,106 @@ def _critique_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
         return {"index": index, "error": error_msg, "node_name": NODE_NAME}
 
 
+NO_CHANGE = "NO_CHANGE"
+
+
+def _fused_review_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Critiques and revises a translated chunk in one LLM call (REVIEW_MODE=fused_review).
+    Takes the same input as `_critique_chunk_worker` and returns both the critique
+    and the refined text (the translation itself when the model answers NO_CHANGE).
+    """
+    NODE_NAME = "fused_review_chunk_worker"
+    state_essentials = worker_input.get("state", {})
+    original_chunk = worker_input.get("original_chunk", "")
+    translated_chunk = worker_input.get("translated_chunk", "")
+    index = worker_input.get("index", -1)
+    original_index = worker_input.get("original_index", -1)
+    total_chunks = worker_input.get("total_chunks", 0)
+
+    if not original_chunk or not translated_chunk or index == -1 or not isinstance(state_essentials.get('config'), dict):
+        missing = [f for f, v in {"original_chunk": original_chunk, "translated_chunk": translated_chunk, "index": index, "state['config']": state_essentials.get('config')}.items() if not v or (f == "index" and v == -1) or (f == "state['config']" and not isinstance(v, dict))]
+        return {"index": index, "error": f"Fused review worker input missing: {', '.join(missing)}", "node_name": NODE_NAME}
+
+    config = state_essentials.get("config", {})
+    full_glossary = state_essentials.get("contextualized_glossary", [])
+    worker_log_prefix = f"Review Chunk {index + 1}/{total_chunks}"
+
+    try:
+        llm = get_llm_client(config, role="critique")
+
+        prompts_path = Path(__file__).parent.parent / "prompts.yaml"
+        with open(prompts_path) as f:
+            prompts = yaml.safe_load(f)
+
+        prompt_template = ChatPromptTemplate.from_messages([("user", prompts["prompts"]["fused_review"]["user"])])
+        chain = prompt_template | llm | StrOutputParser() # Expecting JSON string
+
+        filtered_glossary = filter_and_prioritize_terminology(original_chunk, full_glossary)
+        review_term_list = []
+        for t in filtered_glossary:
+            translation = t.get('proposedTranslations', {}).get('default')
+            if t.get('sourceTerm') and translation:
+                review_term_list.append(f"- '{t['sourceTerm']}' -> '{translation}'")
+        review_term_guidance = "\n".join(review_term_list) if review_term_list else "No specific terminology provided for this chunk."
+
+        effective_accent = config.get('effective_accent', 'professional')
+        review_context = {
+            "target_language": config.get("target_language", "arabic"),
+            "filtered_glossary_guidance": review_term_guidance,
+            "original_text": original_chunk,
+            "translated_text": translated_chunk,
+            "target_accent_guidance": f"using the {effective_accent} accent/dialect"
+        }
+
+        call_start = time.perf_counter()
+        response = chain.invoke(review_context)
+        llm_seconds = time.perf_counter() - call_start
+
+        try:
+            formatted_review_prompt = prompts["prompts"]["fused_review"]["user"].format(**review_context)
+            log_to_state(state_essentials, f"{worker_log_prefix}: Review prompt sent (using filtered glossary):\n---\n{formatted_review_prompt}\n---", "DEBUG", node=NODE_NAME, log_type="LOG_LLM_PROMPTS")
+        except Exception as log_err:
+            log_to_state(state_essentials, f"{worker_log_prefix}: Error formatting review prompt for logging: {log_err}", "WARNING", node=NODE_NAME)
+
+        temp_state_for_logging = {"logs": [], "job_id": state_essentials.get("job_id", "unknown")}
+        review_data = safe_json_parse(response, temp_state_for_logging, NODE_NAME)
+        if review_data is None:
+            return {"index": index, "error": f"{worker_log_prefix}: Failed to parse review JSON.", "node_name": NODE_NAME, "logs": temp_state_for_logging["logs"]}
+
+        required_keys = ["accuracyScore", "glossaryAdherence", "suggestedImprovements", "overallAssessment", "revisedText"]
+        if not isinstance(review_data, dict) or not all(key in review_data for key in required_keys):
+            log_to_state(temp_state_for_logging, f"Received review data: {review_data}", "DEBUG", node=NODE_NAME, log_type="LOG_API_RESPONSES")
+            return {"index": index, "error": f"{worker_log_prefix}: Invalid review structure received. Missing keys or not a dict.", "critique_raw": response, "node_name": NODE_NAME, "logs": temp_state_for_logging["logs"]}
+
+        revised_text = review_data.pop("revisedText")
+        unchanged = not isinstance(revised_text, str) or revised_text.strip() in ("", NO_CHANGE)
+        if not unchanged and not translated_chunk.startswith("```") and revised_text.startswith("```") and revised_text.endswith("```"):
+            revised_text = revised_text[3:-3].strip() # Same clean-up as translate_chunk_worker
+
+        return {
+            "index": index,
+            "original_index": original_index,
+            "critique": review_data, # Parsed critique (without revisedText)
+            "refined_text": translated_chunk if unchanged else revised_text,
+            "unchanged": unchanged,
+            "node_name": NODE_NAME,
+            "logs": temp_state_for_logging["logs"],
+            "prompt_char_count": len(formatted_review_prompt) if 'formatted_review_prompt' in locals() else 0,
+            "filtered_term_count": len(filtered_glossary),
+            "llm_seconds": llm_seconds,
+            "output_chars": len(response)
+        }
+
+    except FileNotFoundError:
+        return {"index": index, "error": f"{worker_log_prefix}: Prompts file not found.", "node_name": NODE_NAME}
+    except KeyError as e:
+        return {"index": index, "error": f"{worker_log_prefix}: Missing key in prompts file: {e}", "node_name": NODE_NAME}
+    except Exception as e:
+        error_msg = f"{worker_log_prefix}: Unexpected error during fused review: {type(e).__name__}: {e}"
+        return {"index": index, "error": error_msg, "node_name": NODE_NAME}
+
+
 def _finalize_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
     """Applies critique feedback to refine a translated chunk."""
     NODE_NAME = "finalize_chunk_worker"
@@ -336,7 +445,9 @@ def _finalize_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
             "target_accent_guidance": target_accent_guidance # Pass the accent guidance
         }
 
+        call_start = time.perf_counter()
         response = chain.invoke(finalize_context)
+        llm_seconds = time.perf_counter() - call_start
 
         # Log the formatted prompt AFTER invoking
         try:
@@ -362,7 +473,9 @@ def _finalize_chunk_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
             "refined_text": refined_text,
             "node_name": NODE_NAME,
             "prompt_char_count": len(formatted_finalize_prompt) if 'formatted_finalize_prompt' in locals() else 0, # Add prompt char count
-            "filtered_term_count": len(filtered_glossary) # Add filtered term count
+            "filtered_term_count": len(filtered_glossary), # Add filtered term count
+            "llm_seconds": llm_seconds,
+            "output_chars": len(refined_text)
         }
 
     except FileNotFoundError:
@@ -1,22 +1,30 @@
 import re
+import math
 import concurrent.futures
 import time
 import json # Needed for apply_review_feedback
-from typing import Dict, Any, List
+from statistics import NormalDist
+from typing import Dict, Any, List, Optional
 
 # Ensure correct import paths if running as part of package 'src'
 try:
     from .state import TranslationState
     from .utils import log_to_state, update_progress
-    from .node_workers import _critique_chunk_worker, _finalize_chunk_worker
+    from .node_workers import _critique_chunk_worker, _finalize_chunk_worker, _fused_review_chunk_worker
+    from .chunk_table import TRANSLATION, CRITIQUE, FINAL, ERROR
+    from .node_utils import (record_llm_call, get_setting, critique_passes, estimate_tokens, review_mode, REVIEW,
+                             next_batch, has_pending_batch, next_critique_sample, critique_sample_report)
+    from .llm_scheduler import llm_pool, record_llm_waits
     # from .exceptions import ... # Import if specific exceptions need handling here
-    # from .node_utils import ... # Import if needed
 except ImportError: # Fallback for potential direct script execution (less ideal)
     from .state import TranslationState
     from utils import log_to_state, update_progress
-    from node_workers import _critique_chunk_worker, _finalize_chunk_worker
+    from node_workers import _critique_chunk_worker, _finalize_chunk_worker, _fused_review_chunk_worker
+    from chunk_table import TRANSLATION, CRITIQUE, FINAL, ERROR
+    from node_utils import (record_llm_call, get_setting, critique_passes, estimate_tokens, review_mode, REVIEW,
+                            next_batch, has_pending_batch, next_critique_sample, critique_sample_report)
+    from llm_scheduler import llm_pool, record_llm_waits
     # from exceptions import ...
-    # from node_utils import ...
 
 
 # --- Postprocessing, Review, and Finalization Node Implementations ---
@@ -27,223 +35,442 @@ def critique_node(state: TranslationState) -> TranslationState:
 
     Orchestrates the parallel execution of `_critique_chunk_worker`.
     Collects critique results, logs errors, and updates the state.
+    With REVIEW_MODE=fused_review it runs `_fused_review_chunk_worker` instead,
+    which also writes the revised chunks, and final_translation_node passes them on.
+    With CHECKPOINT_BATCH_CHUNKS it critiques one batch per run (see `next_batch`).
+    With CRITIQUE_SAMPLING it critiques a stratified sample in waves, one wave per
+    run (see `next_critique_sample`); chunks left out keep their translation.
     """
     NODE_NAME = "critique_node"
     update_progress(state, NODE_NAME, 65.0) # Example progress
 
     # Get translatable chunks and their translations
-    original_chunks = state.get("chunks")
-    translated_chunks = state.get("translated_chunks")
-    
-    # Get chunks with metadata for reference
-    chunks_with_metadata = state.get("chunks_with_metadata", [])
+    table = state.get("chunk_table")
 
-    if not original_chunks or not translated_chunks or len(original_chunks) != len(translated_chunks):
+    if not table or not table.translatable_count or not table.has_stage(TRANSLATION):
         log_to_state(state, "Mismatch or missing chunks/translations for critique.", "ERROR", node=NODE_NAME)
         # Ensure error_info is treated as a string
         current_error = state.get("error_info") or ""
         state["error_info"] = current_error + (" | " if current_error else "") + "Cannot critique: Chunk data inconsistent."
-        state["critiques"] = [] # Ensure critiques list is empty/reset
+        if table:
+            table.clear_stage(CRITIQUE) # Ensure critiques are empty/reset
         return state
 
+    translated_chunks = table.stage_values(TRANSLATION)
+    total_chunks = table.translatable_count
+
     # Filter out chunks that failed translation (are None)
     valid_indices = [i for i, t in enumerate(translated_chunks) if t is not None]
-    if len(valid_indices) < len(original_chunks):
-        log_to_state(state, f"Skipping critique for {len(original_chunks) - len(valid_indices)} chunks that failed translation.", "WARNING", node=NODE_NAME)
+    config = state.get("config", {})
+    fused = review_mode(config) == "fused_review"
+    sample = critique_sampling(config, state.get("job_id"))
+    first_run = not has_pending_batch(state, NODE_NAME)
 
-    if not valid_indices:
-        log_to_state(state, "No valid translated chunks to critique.", "WARNING", node=NODE_NAME)
-        # Initialize critiques with error dicts for skipped chunks
-        state["critiques"] = [{"error": "Critique skipped due to failed translation"}] * len(original_chunks)
-        return state
+    if first_run: # First run (later runs continue with the next batch)
+        if len(valid_indices) < total_chunks:
+            log_to_state(state, f"Skipping critique for {total_chunks - len(valid_indices)} chunks that failed translation.", "WARNING", node=NODE_NAME)
 
-    config = state.get("config", {})
+        # Put an error dict for failed chunks, None for valid ones to be processed
+        # (critiques seeded from an earlier run of the job are kept)
+        seeded = table.stage_values(CRITIQUE)
+        table.set_stage(CRITIQUE, [{"error": "Critique skipped due to failed translation"} if t is None else seeded[i] for i, t in enumerate(translated_chunks)])
+
+        if not valid_indices:
+            log_to_state(state, "No valid translated chunks to critique.", "WARNING", node=NODE_NAME)
+            return state
+
+        if fused:
+            table.stage(FINAL) # Revised chunks land here as reviews complete
+
+    critiques = table.stage(CRITIQUE)
+    finals = table.stage_values(FINAL)
     total_valid_chunks = len(valid_indices)
-    # Initialize critiques list: put error dict for failed chunks, None for valid ones to be processed
-    state["critiques"] = [
-        {"error": "Critique skipped due to failed translation"} if i not in valid_indices else None
-        for i in range(len(original_chunks))
-    ]
-    state["parallel_worker_results"] = [] # Reset results list
-
-    # Prepare inputs only for valid chunks
-    worker_inputs = []
-    for i in valid_indices:
-        state_essentials = {
-            "config": config,
-            "job_id": state.get("job_id"),
-            "contextualized_glossary": state.get("contextualized_glossary", []) # Add glossary here
-        }
-        # Get the original index from chunks_with_metadata if available
-        original_index = -1
-        if chunks_with_metadata:
-            for chunk_meta in chunks_with_metadata:
-                if chunk_meta["toTranslate"] and chunk_meta["chunkText"] == original_chunks[i]:
-                    original_index = chunk_meta["index"]
-                    break
-        
-        worker_inputs.append({
-            "state": state_essentials,
-            "original_chunk": original_chunks[i],
-            "translated_chunk": translated_chunks[i],
-            "index": i, # Use worker index
-            "original_index": original_index, # Store original index from metadata
-            "total_chunks": len(original_chunks) # Report total original chunks
-        })
-
-    max_workers = config.get("max_parallel_workers", 5)
-    log_to_state(state, f"Starting parallel critique for {total_valid_chunks} translated chunks.", "INFO", node=NODE_NAME)
+    errors = table.stage(ERROR)
+    # Chunks reviewed by an earlier run of the job are not sent again
+    work = [i for i in valid_indices if critiques[i] is None or (fused and finals[i] is None)]
+    if sample is not None and first_run:
+        work = next_critique_sample(valid_indices, sampled_outcomes(critiques, valid_indices, sample), sample)
+    if not work and first_run:
+        if sample is not None:
+            record_critique_sampling(state, valid_indices, sample, NODE_NAME)
+        else:
+            log_to_state(state, "All translated chunks were critiqued by an earlier run.", "INFO", node=NODE_NAME)
+        update_progress(state, NODE_NAME, 80.0)
+        return state
+    batch, remaining = next_batch(state, NODE_NAME, work)
+    in_batch = set(batch)
+    done_before = sum(1 for i in valid_indices if critiques[i] is not None and i not in in_batch)
+    total_to_critique = done_before + len(batch) + remaining # All valid chunks, unless sampling
+
+    # Prepare inputs only for valid chunks (the fused review takes the same input)
+    state_essentials = _review_essentials(state)
+    worker_inputs = [critique_input(state_essentials, table, i) for i in batch]
+
+    max_workers = get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int)
+    later = f", {remaining} left for later batches" if remaining else ""
+    of_total = f" (of {total_valid_chunks}{later})" if len(batch) < total_valid_chunks else ""
+    if sample is not None:
+        of_total = f" (critique sampling: {done_before} of {total_valid_chunks} critiqued so far{later})"
+    if fused:
+        log_to_state(state, f"Starting parallel fused review (critique and revision in one call) for {len(batch)} translated chunks{of_total}.", "INFO", node=NODE_NAME)
+    else:
+        log_to_state(state, f"Starting parallel critique for {len(batch)} translated chunks{of_total}.", "INFO", node=NODE_NAME)
 
     completed_count = 0
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_index = {executor.submit(_critique_chunk_worker, inp): inp["index"] for inp in worker_inputs}
+    with llm_pool(config, max_workers) as pool:
+        worker = _fused_review_chunk_worker if fused else _critique_chunk_worker
+        future_to_index = {pool.submit(REVIEW if fused else CRITIQUE, worker, inp): inp["index"] for inp in worker_inputs}
 
         for future in concurrent.futures.as_completed(future_to_index):
             index = future_to_index[future]
             try:
                 result = future.result()
-                state["parallel_worker_results"].append(result) # Store raw result
-
-
-                # Log any logs returned from the worker (e.g., from safe_json_parse)
-                worker_logs = result.get("logs", [])
-                for log_entry in worker_logs:
-                    # Re-log under the main critique_node context if needed, or just store
-                    log_to_state(state, f"(Worker Log Chunk {index+1}): {log_entry.get('message', '')}", log_entry.get('level', 'DEBUG'), node=f"{NODE_NAME}/{result.get('node_name', 'critique_worker')}", log_type="LOG_CHUNK_PROCESSING")
-
-
-                if "error" in result:
-                    error_message = f"Critique worker error (Chunk {index + 1}): {result['error']}"
-                    log_to_state(state, error_message, "ERROR", node=NODE_NAME)
-                    state["critiques"][index] = {"error": error_message} # Store error dict instead of None
-                elif "critique" in result:
-                    state["critiques"][index] = result["critique"] # Store the parsed critique
-                    log_to_state(state, f"Successfully critiqued chunk {index + 1}.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+                if fused:
+                    apply_fused_review_result(state, table, index, result, NODE_NAME)
                 else:
-                    log_to_state(state, f"Critique worker for chunk {index + 1} returned unexpected result: {result}", "WARNING", node=NODE_NAME)
-                    state["critiques"][index] = {"error": "Unexpected critique worker result"} # Store error dict
+                    apply_critique_result(state, table, index, result, NODE_NAME)
 
             except Exception as e:
                 log_to_state(state, f"Exception processing critique result for chunk {index + 1}: {type(e).__name__}: {e}", "ERROR", node=NODE_NAME)
                 error_message = f"Future processing exception: {e}"
-                state["parallel_worker_results"].append({"index": index, "error": error_message, "node_name": "critique_node_executor"})
-                state["critiques"][index] = {"error": error_message} # Store error dict instead of None
+                critiques[index] = {"error": error_message} # Store error dict instead of None
+                errors[index] = error_message
 
             completed_count += 1
             # Update progress based on valid chunks processed
-            current_progress = 65.0 + (completed_count / total_valid_chunks) * 15.0 # Example: critique is 15%
+            current_progress = 65.0 + ((done_before + completed_count) / total_to_critique) * 15.0 # Example: critique is 15%
             update_progress(state, NODE_NAME, current_progress)
+    record_llm_waits(state, pool)
 
+    if remaining:
+        return state # The graph runs this node again for the next batch
 
+    if sample is not None:
+        wave = next_critique_sample(valid_indices, sampled_outcomes(critiques, valid_indices, sample), sample)
+        if wave:
+            # Queued like a remaining batch, so the graph runs this node again for it
+            state["pending_chunks"] = dict(state.get("pending_chunks") or {}, **{NODE_NAME: wave})
+            log_to_state(state, f"Critique sampling: next wave of {len(wave)} chunks.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+            return state
+        record_critique_sampling(state, valid_indices, sample, NODE_NAME)
 
     update_progress(state, NODE_NAME, 80.0) # Mark end of critique stage
     return state
 
+# --- Critique sampling ---
+
+def critique_sampling(config: Dict[str, Any], job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Settings of the critique sampling mode (CRITIQUE_SAMPLING), or None if every
+    translated chunk is critiqued. A sampled critique fails when its accuracy or
+    accent score is below CRITIQUE_SAMPLING_MIN_SCORE. The job id seeds the sample.
+    """
+    if not get_setting(config, "CRITIQUE_SAMPLING", "critique_sampling", False, bool):
+        return None
+    confidence = min(0.999, max(0.5, get_setting(config, "CRITIQUE_SAMPLING_CONFIDENCE", "critique_sampling_confidence", 0.95, float)))
+    return {
+        "strata": max(1, get_setting(config, "CRITIQUE_SAMPLING_STRATA", "critique_sampling_strata", 10, int)),
+        "fraction": min(1.0, max(0.0, get_setting(config, "CRITIQUE_SAMPLING_FRACTION", "critique_sampling_fraction", 0.05, float))),
+        "min_per_stratum": max(1, get_setting(config, "CRITIQUE_SAMPLING_MIN_PER_STRATUM", "critique_sampling_min_per_stratum", 5, int)),
+        "max_failure_rate": get_setting(config, "CRITIQUE_SAMPLING_MAX_FAILURE_RATE", "critique_sampling_max_failure_rate", 0.1, float),
+        "min_score": get_setting(config, "CRITIQUE_SAMPLING_MIN_SCORE", "critique_sampling_min_score", 4.0, float),
+        "neighbors": max(0, get_setting(config, "CRITIQUE_SAMPLING_NEIGHBORS", "critique_sampling_neighbors", 1, int)),
+        "confidence": confidence,
+        "z": NormalDist().inv_cdf((1 + confidence) / 2),
+        "seed": job_id or "turjuman",
+    }
+
+
+def sampled_outcomes(critiques: List[Any], valid_indices: List[int], sample: Dict[str, Any]) -> Dict[int, Optional[bool]]:
+    """Outcome of every critiqued chunk: True if it failed, False if it passed, None for critique errors."""
+    outcomes = {}
+    for i in valid_indices:
+        critique = critiques[i]
+        if critique is None:
+            continue
+        if not isinstance(critique, dict) or "error" in critique:
+            outcomes[i] = None
+        else:
+            outcomes[i] = not critique_passes(critique, sample["min_score"], sample["min_score"], math.inf, math.inf)
+    return outcomes
+
+
+def record_critique_sampling(state: TranslationState, valid_indices: List[int], sample: Dict[str, Any], node_name: str):
+    """Logs the coverage and estimated failure rate of a sampled critique and keeps them in metrics["critique_sampling"]."""
+    table = state["chunk_table"]
+    report = critique_sample_report(valid_indices, sampled_outcomes(table.stage_values(CRITIQUE), valid_indices, sample), sample)
+    report["confidence"] = sample["confidence"]
+    log_to_state(state, f"Critique sampling: critiqued {report['critiqued']} of {report['chunks']} chunks ({report['coverage']:.0%}), "
+                        f"{report['failures']} below score {sample['min_score']}; estimated failure rate {report['estimated_failure_rate']:.1%} "
+                        f"(upper bound {report['failure_rate_upper']:.1%} at {sample['confidence']:.0%}), "
+                        f"{report['fully_critiqued_strata']} of {len(report['strata'])} strata critiqued completely.", "INFO", node=node_name)
+    metrics = state.get("metrics")
+    if isinstance(metrics, dict):
+        metrics["critique_sampling"] = report
+
+
+# --- Per-chunk review helpers (shared with the streaming deep pipeline) ---
+
+def _review_essentials(state: TranslationState) -> Dict[str, Any]:
+    """The parts of the state the critique and refinement workers need."""
+    return {
+        "config": state.get("config", {}),
+        "job_id": state.get("job_id"),
+        "contextualized_glossary": state.get("contextualized_glossary", []) # Add glossary here
+    }
+
+
+def critique_input(state_essentials: Dict[str, Any], table, index: int) -> Dict[str, Any]:
+    """`_critique_chunk_worker` input for translatable chunk `index`."""
+    return {
+        "state": state_essentials,
+        "original_chunk": table.source_text(index),
+        "translated_chunk": table.stage_values(TRANSLATION)[index],
+        "index": index, # Use worker index
+        "original_index": table.translatable[index], # Row of the chunk among all chunks
+        "total_chunks": table.translatable_count # Report total original chunks
+    }
+
+
+def apply_critique_result(state: TranslationState, table, index: int, result: Dict[str, Any], node_name: str,
+                          llm_stage: str = CRITIQUE):
+    """Stores a critique worker result (or its error) in the CRITIQUE/ERROR columns."""
+    critiques = table.stage(CRITIQUE)
+    # Log any logs returned from the worker (e.g., from safe_json_parse)
+    for log_entry in result.get("logs", []):
+        log_to_state(state, f"(Worker Log Chunk {index+1}): {log_entry.get('message', '')}", log_entry.get('level', 'DEBUG'), node=f"{node_name}/{result.get('node_name', 'critique_worker')}", log_type="LOG_CHUNK_PROCESSING")
+
+    if "error" in result:
+        error_message = f"Critique worker error (Chunk {index + 1}): {result['error']}"
+        log_to_state(state, error_message, "ERROR", node=node_name)
+        critiques[index] = {"error": error_message} # Store error dict instead of None
+        table.stage(ERROR)[index] = error_message
+    elif "critique" in result:
+        critiques[index] = result["critique"] # Store the parsed critique
+        record_llm_call(state, llm_stage, len(table.source_text(index)), result)
+        record_review_cost(state, llm_stage, result)
+        log_to_state(state, f"Successfully critiqued chunk {index + 1}.", "DEBUG", node=node_name, log_type="LOG_CHUNK_PROCESSING")
+    else:
+        log_to_state(state, f"Critique worker for chunk {index + 1} returned unexpected result: {result}", "WARNING", node=node_name)
+        critiques[index] = {"error": "Unexpected critique worker result"} # Store error dict
+
+
+def refinement_input(state_essentials: Dict[str, Any], table, index: int) -> Dict[str, Any]:
+    """`_finalize_chunk_worker` input for translatable chunk `index`."""
+    return {
+        "state": state_essentials,
+        "original_chunk": table.source_text(index),
+        "translated_chunk": table.stage_values(TRANSLATION)[index],
+        "critique": table.stage_values(CRITIQUE)[index], # Pass the critique data
+        "index": index,
+        "original_index": table.translatable[index], # Row of the chunk among all chunks
+        "total_chunks": table.translatable_count
+    }
+
+
+def apply_refinement_result(state: TranslationState, table, index: int, result: Dict[str, Any], node_name: str):
+    """
+    Stores a refinement worker result in the FINAL column. On errors the value
+    stays None, so the chunk keeps its initial translation (see ChunkTable.output).
+    """
+    if "error" in result:
+        log_to_state(state, f"Refinement worker error (Chunk {index + 1}): {result['error']}", "ERROR", node=node_name)
+        table.stage(ERROR)[index] = result["error"]
+        # final_chunks[index] stays None: the chunk keeps its initial translation
+    elif "refined_text" in result:
+        table.stage(FINAL)[index] = result["refined_text"] # Update with refined text
+        record_llm_call(state, FINAL, len(table.source_text(index)), result)
+        record_review_cost(state, FINAL, result)
+        # Extract additional info from result for logging
+        prompt_chars = result.get("prompt_char_count", "N/A")
+        term_count = result.get("filtered_term_count", "N/A")
+        log_to_state(state, f"Successfully refined chunk {index + 1} (Terms: {term_count}, Prompt Chars: {prompt_chars}).", "DEBUG", node=node_name, log_type="LOG_CHUNK_PROCESSING")
+    else:
+        log_to_state(state, f"Refinement worker for chunk {index + 1} returned unexpected result: {result}", "WARNING", node=node_name)
+
+
+def apply_fused_review_result(state: TranslationState, table, index: int, result: Dict[str, Any], node_name: str):
+    """
+    Stores a fused review result: the critique like apply_critique_result and the
+    revised text in the FINAL column (errors keep the initial translation there).
+    """
+    apply_critique_result(state, table, index, result, node_name, llm_stage=REVIEW)
+    if "error" not in result and "critique" in result and result.get("refined_text"):
+        table.stage(FINAL)[index] = result["refined_text"]
+        if result.get("unchanged"):
+            log_to_state(state, f"Fused review kept chunk {index + 1} unchanged.", "DEBUG", node=node_name, log_type="LOG_CHUNK_PROCESSING")
+
+
+def record_review_cost(state: TranslationState, stage: str, result: Dict[str, Any]):
+    """
+    Adds a successful critique, refinement or fused review call to
+    metrics["review_cost"][stage] (calls, LLM seconds, estimated prompt and output
+    tokens, and for fused reviews the chunks kept unchanged), so the two review
+    modes can be compared across jobs.
+    """
+    metrics = state.get("metrics")
+    if not isinstance(metrics, dict):
+        return
+    cost = metrics.setdefault("review_cost", {}).setdefault(stage, {
+        "calls": 0, "llm_seconds": 0.0, "prompt_tokens_estimate": 0, "output_tokens_estimate": 0})
+    cost["calls"] += 1
+    cost["llm_seconds"] = round(cost["llm_seconds"] + result.get("llm_seconds", 0.0), 3)
+    # Same ~4 characters per token estimate as estimate_tokens
+    cost["prompt_tokens_estimate"] += math.ceil(result.get("prompt_char_count", 0) / 4)
+    cost["output_tokens_estimate"] += math.ceil(result.get("output_chars", 0) / 4)
+    if stage == REVIEW:
+        cost["unchanged"] = cost.get("unchanged", 0) + bool(result.get("unchanged"))
+
+
+def log_review_cost(state: TranslationState, node_name: str):
+    """Logs the totals of metrics["review_cost"] for the job's review mode."""
+    costs = (state.get("metrics") or {}).get("review_cost")
+    if not costs:
+        return
+    mode = review_mode(state.get("config", {}))
+    parts = [f"{stage} {c['calls']} calls, {c['llm_seconds']:.1f}s, ~{c['prompt_tokens_estimate'] + c['output_tokens_estimate']} tokens"
+             for stage, c in costs.items()]
+    log_to_state(state, f"Review LLM cost ({mode}): " + "; ".join(parts), "INFO", node=node_name)
+
+
+def refinement_gate(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Thresholds a critique has to meet for its chunk to skip refinement
+    (REFINE_SCORE_GATE), or None if every critiqued chunk is refined. With the
+    defaults only a perfect critique (scores of 5, no glossary issues, no
+    suggestions) skips refinement.
+    """
+    if not get_setting(config, "REFINE_SCORE_GATE", "refine_score_gate", True, bool):
+        return None
+    return {
+        "min_accuracy": get_setting(config, "REFINE_MIN_ACCURACY", "refine_min_accuracy", 5.0, float),
+        "min_accent": get_setting(config, "REFINE_MIN_ACCENT", "refine_min_accent", 5.0, float),
+        "max_glossary_issues": get_setting(config, "REFINE_MAX_GLOSSARY_ISSUES", "refine_max_glossary_issues", 0, int),
+        "max_suggestions": get_setting(config, "REFINE_MAX_SUGGESTIONS", "refine_max_suggestions", 0, int),
+    }
+
+
+def needs_refinement(critique: Any, gate: Optional[Dict[str, Any]]) -> bool:
+    """Whether a critiqued chunk goes to the refinement worker under `gate`."""
+    return gate is None or not critique_passes(critique, **gate)
+
+
+def skipped_refinement_tokens(table, index: int) -> int:
+    """
+    Estimated tokens a refinement call of chunk `index` would have used: the
+    source, translation and critique sent in the prompt plus a rewrite of the
+    translation (the prompt template itself is not counted).
+    """
+    translation = table.stage_values(TRANSLATION)[index]
+    critique = json.dumps(table.stage_values(CRITIQUE)[index], ensure_ascii=False)
+    return estimate_tokens(table.source_text(index)) + estimate_tokens(critique) + 2 * estimate_tokens(translation)
+
+
+def record_refinement_gate(state: TranslationState, refined: int, skipped: int, saved_tokens: int, node_name: str):
+    """Logs the refinement gate outcome and keeps it in metrics["refinement_gate"]."""
+    if skipped:
+        log_to_state(state, f"Refinement gate: {skipped} chunk(s) passed their critique and were kept as translated (~{saved_tokens} tokens saved), {refined} refined.", "INFO", node=node_name)
+    metrics = state.get("metrics")
+    if isinstance(metrics, dict):
+        metrics["refinement_gate"] = {"refined": refined, "skipped": skipped, "saved_tokens_estimate": saved_tokens}
+
+
 def final_translation_node(state: TranslationState) -> TranslationState:
     """
     Performs a final refinement pass on translated chunks, potentially using critiques.
-    This acts like `run_parallel_translation` but uses the `_finalize_chunk_worker`.
+    This acts like `run_parallel_translation` but uses the `_finalize_chunk_worker`,
+    including one batch per run with CHECKPOINT_BATCH_CHUNKS.
     """
     NODE_NAME = "final_translation_node"
     update_progress(state, NODE_NAME, 80.0) # Start after critique
 
-    # Get translatable chunks and their translations
-    original_chunks = state.get("chunks")
-    translated_chunks = state.get("translated_chunks")
-    critiques = state.get("critiques")
-    
-    # Get chunks with metadata for reference
-    chunks_with_metadata = state.get("chunks_with_metadata", [])
+    # Get translatable chunks, their translations and critiques
+    table = state.get("chunk_table")
 
     # Check if refinement is needed/possible
-    if not original_chunks or not translated_chunks or not critiques or \
-       len(original_chunks) != len(translated_chunks) or len(original_chunks) != len(critiques):
+    if not table or not table.translatable_count or not table.has_stage(TRANSLATION) or not table.has_stage(CRITIQUE):
         log_to_state(state, "Mismatch or missing data for final refinement.", "ERROR", node=NODE_NAME)
         # Ensure error_info is treated as a string, even if it's None initially
         current_error = state.get("error_info") or ""
         state["error_info"] = current_error + (" | " if current_error else "") + "Cannot refine: Data inconsistent."
-        state["final_chunks"] = translated_chunks # Pass through existing translations on error
+        if table and table.has_stage(TRANSLATION):
+            table.set_stage(FINAL, table.stage_values(TRANSLATION)) # Pass through existing translations on error
         return state
 
-    # Identify chunks to refine (e.g., those with critiques indicating issues or below a score threshold)
-    # Or refine all chunks that have a critique.
-    indices_to_refine = [i for i, c in enumerate(critiques) if c is not None and translated_chunks[i] is not None]
-
-    if not indices_to_refine:
-        log_to_state(state, "No chunks require final refinement based on critiques.", "INFO", node=NODE_NAME)
-        state["final_chunks"] = list(translated_chunks) # Copy to final_chunks
+    config = state.get("config", {})
+    if review_mode(config) == "fused_review" and table.has_stage(FINAL):
+        log_to_state(state, "Chunks were already revised by the fused review; skipping the refinement pass.", "INFO", node=NODE_NAME)
+        log_review_cost(state, NODE_NAME)
         update_progress(state, NODE_NAME, 95.0)
         return state
 
-    config = state.get("config", {})
+    translated_chunks = table.stage_values(TRANSLATION)
+    critiques = table.stage_values(CRITIQUE)
+
+    # Refine chunks with a critique, except those whose critique passes the score gate
+    critiqued = [i for i, c in enumerate(critiques) if c is not None and translated_chunks[i] is not None]
+    gate = refinement_gate(config)
+    indices_to_refine, skipped = [], []
+    for i in critiqued:
+        (indices_to_refine if needs_refinement(critiques[i], gate) else skipped).append(i)
+
+    # A FINAL value marks a chunk as done: refined, or kept as translated by the gate
+    # (in this or an earlier run of the job); chunks that were not critiqued stay None
+    finals = table.stage(FINAL)
+    work = [i for i in indices_to_refine if finals[i] is None]
+    if not has_pending_batch(state, NODE_NAME): # First run (later runs continue with the next batch)
+        for i in skipped:
+            if finals[i] is None:
+                finals[i] = translated_chunks[i]
+        record_refinement_gate(state, len(indices_to_refine), len(skipped),
+                               sum(skipped_refinement_tokens(table, i) for i in skipped), NODE_NAME)
+
+        if not work:
+            log_to_state(state, "No chunks require final refinement based on critiques.", "INFO", node=NODE_NAME)
+            log_review_cost(state, NODE_NAME)
+            update_progress(state, NODE_NAME, 95.0)
+            return state
+
     total_to_refine = len(indices_to_refine)
-    state["final_chunks"] = list(translated_chunks) # Initialize final_chunks with current translations
-    state["parallel_worker_results"] = [] # Reset results list
+    errors = table.stage(ERROR)
+    batch, remaining = next_batch(state, NODE_NAME, work)
+    done_before = total_to_refine - remaining - len(batch)
 
     # Prepare inputs for refinement workers
-    worker_inputs = []
-    for i in indices_to_refine:
-        state_essentials = {
-            "config": config,
-            "job_id": state.get("job_id"),
-            "contextualized_glossary": state.get("contextualized_glossary", []) # Add glossary here
-        }
-        # Get the original index from chunks_with_metadata if available
-        original_index = -1
-        if chunks_with_metadata:
-            for chunk_meta in chunks_with_metadata:
-                if chunk_meta["toTranslate"] and chunk_meta["chunkText"] == original_chunks[i]:
-                    original_index = chunk_meta["index"]
-                    break
-        
-        worker_inputs.append({
-            "state": state_essentials,
-            "original_chunk": original_chunks[i],
-            "translated_chunk": translated_chunks[i],
-            "critique": critiques[i], # Pass the critique data
-            "index": i,
-            "original_index": original_index,
-            "total_chunks": len(original_chunks)
-        })
-
-    max_workers = config.get("max_parallel_workers", 5)
-    log_to_state(state, f"Starting parallel final refinement for {total_to_refine} chunks.", "INFO", node=NODE_NAME)
+    state_essentials = _review_essentials(state)
+    worker_inputs = [refinement_input(state_essentials, table, i) for i in batch]
+
+    max_workers = get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int)
+    later = f", {remaining} left for later batches" if remaining else ""
+    of_total = f" (of {total_to_refine}{later})" if len(batch) < total_to_refine else ""
+    log_to_state(state, f"Starting parallel final refinement for {len(batch)} chunks{of_total}.", "INFO", node=NODE_NAME)
 
     completed_count = 0
 
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_index = {executor.submit(_finalize_chunk_worker, inp): inp["index"] for inp in worker_inputs}
+    with llm_pool(config, max_workers) as pool:
+        future_to_index = {pool.submit(FINAL, _finalize_chunk_worker, inp): inp["index"] for inp in worker_inputs}
 
         for future in concurrent.futures.as_completed(future_to_index):
             index = future_to_index[future]
             try:
                 result = future.result()
-                state["parallel_worker_results"].append(result)
-
-
-                if "error" in result:
-                    log_to_state(state, f"Refinement worker error (Chunk {index + 1}): {result['error']}", "ERROR", node=NODE_NAME)
-                    # Keep the original translation in final_chunks[index]
-                elif "refined_text" in result:
-                    state["final_chunks"][index] = result["refined_text"] # Update with refined text
-                    # Extract additional info from result for logging
-                    prompt_chars = result.get("prompt_char_count", "N/A")
-                    term_count = result.get("filtered_term_count", "N/A")
-                    log_to_state(state, f"Successfully refined chunk {index + 1} (Terms: {term_count}, Prompt Chars: {prompt_chars}).", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
-                else:
-                    log_to_state(state, f"Refinement worker for chunk {index + 1} returned unexpected result: {result}", "WARNING", node=NODE_NAME)
+                apply_refinement_result(state, table, index, result, NODE_NAME)
 
             except Exception as e:
                 log_to_state(state, f"Exception processing refinement result for chunk {index + 1}: {type(e).__name__}: {e}", "ERROR", node=NODE_NAME)
-                state["parallel_worker_results"].append({"index": index, "error": f"Future processing exception: {e}", "node_name": "final_translation_node_executor"})
+                errors[index] = f"Future processing exception: {e}"
                 # Keep original translation
 
             completed_count += 1
-            current_progress = 80.0 + (completed_count / total_to_refine) * 15.0 # Example: refinement is 15%
+            current_progress = 80.0 + ((done_before + completed_count) / total_to_refine) * 15.0 # Example: refinement is 15%
             update_progress(state, NODE_NAME, current_progress)
+    record_llm_waits(state, pool)
 
+    if remaining:
+        return state # The graph runs this node again for the next batch
 
+    log_review_cost(state, NODE_NAME)
     update_progress(state, NODE_NAME, 95.0) # Mark end of refinement stage
     return state
 
@@ -253,55 +480,32 @@ def assemble_document(state: TranslationState) -> TranslationState:
     NODE_NAME = "assemble_document"
     update_progress(state, NODE_NAME, 98.0)
 
-    # Get all chunks with metadata
-    chunks_with_metadata = state.get("chunks_with_metadata", [])
-    
-    # Get translated chunks
-    translated_chunks = state.get("final_chunks")
-    if translated_chunks is None:
-        translated_chunks = state.get("translated_chunks")
-    
-    # Get non-translatable chunks
-    non_translatable_chunks = state.get("non_translatable_chunks", [])
-    
-    if not chunks_with_metadata:
+    table = state.get("chunk_table")
+    if not table:
         log_to_state(state, "No chunks metadata available for assembly.", "ERROR", node=NODE_NAME)
         current_error = state.get("error_info") or ""
         state["error_info"] = current_error + (" | " if current_error else "") + "Cannot assemble document: Missing chunk metadata."
         state["final_document"] = None
         return state
-    
-    if not translated_chunks and not non_translatable_chunks:
-        log_to_state(state, "No chunks available to assemble.", "ERROR", node=NODE_NAME)
-        current_error = state.get("error_info") or ""
-        state["error_info"] = current_error + (" | " if current_error else "") + "Cannot assemble document: No chunks available."
-        state["final_document"] = None
-        return state
-    
-    # Prepare all chunks for assembly
-    all_chunks = []
+
+    # Rows are in document order; translatable rows use the refined translation,
+    # else the initial one, else the original text
+    contents = []
     translatable_index = 0
-    
-    for chunk in chunks_with_metadata:
-        if chunk["toTranslate"]:
-            # Use translated content if available
-            if translatable_index < len(translated_chunks) and translated_chunks[translatable_index] is not None:
-                chunk_content = translated_chunks[translatable_index]
-            else:
+    for row in range(len(table)):
+        if table.is_translatable(row):
+            chunk_content = table.output(translatable_index)
+            if chunk_content is None:
                 # Fallback to original content if translation failed
-                chunk_content = chunk["chunkText"]
+                chunk_content = table.text(row)
                 log_to_state(state,
-                    f"Warning: Using original content for translatable chunk {chunk['index']} due to missing translation",
+                    f"Warning: Using original content for translatable chunk {row} due to missing translation",
                     "WARNING", node=NODE_NAME)
             translatable_index += 1
         else:
             # Use original content for non-translatable chunks
-            chunk_content = chunk["chunkText"]
-        
-        all_chunks.append({"index": chunk["index"], "content": chunk_content})
-    
-    # Sort by original index and join
-    sorted_chunks = sorted(all_chunks, key=lambda x: x["index"])
+            chunk_content = table.text(row)
+        contents.append(chunk_content)
     
     # Determine the separator based on the original file type
     original_file_type = state.get("original_file_type")
@@ -319,7 +523,10 @@ def assemble_document(state: TranslationState) -> TranslationState:
         separator = "\n"
         log_to_state(state, f"Using newline separator ('\\n') for {original_file_type} file assembly.", "INFO", node=NODE_NAME)
         
-    final_document = separator.join([chunk["content"] for chunk in sorted_chunks])
+    final_document = separator.join(contents)
+    if table.source is not None:
+        # Release a memory-mapped source file; the text stays readable for the worker
+        table.source.close()
     
     # Post-processing for specific file types
     if original_file_type == ".srt":
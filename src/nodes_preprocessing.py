@@ -1,11 +1,13 @@
 import os
+import copy
 import json
 import uuid
 import time
 import yaml
 import concurrent.futures
+from collections import deque
 from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 import requests # Needed for handle_errors, though it's in exceptions.py now
 from langchain_core.prompts import ChatPromptTemplate
@@ -15,17 +17,57 @@ from langchain_core.output_parsers import StrOutputParser
 try:
     from .state import TranslationState, TerminologyEntry
     from .providers import get_llm_client
-    from .smartchunk import SmartChunker
+    from .smartchunk import SmartChunker, RE2_AVAILABLE
+    from .chunk_cache import get_chunk_cache
+    from .source_buffer import SourceBuffer
+    from .chunk_table import ChunkTable, TRANSLATION, CRITIQUE, FINAL
     from .utils import log_to_state, update_progress
     from .exceptions import AuthenticationError, RateLimitError, APIError, handle_errors # Import exceptions and handler
-    from .node_utils import safe_json_parse # Import utility
+    from .node_utils import safe_json_parse, get_setting, stratified_order, build_terminology_regions, terminology_sampling, record_sampled_region, sampling_should_stop, terminology_sampling_report, fit_latency_model, predict_makespan, choose_chunk_size, chunk_size_stats, review_mode, REVIEW, seed_stored_chunks, unseed_changed_neighbors # Import utilities
+    from .term_candidates import mine_term_candidates, batch_candidates
+    from .llm_scheduler import llm_pool, record_llm_waits, TERMINOLOGY
 except ImportError: # Fallback for potential direct script execution (less ideal)
     from .state import TranslationState, TerminologyEntry
     from .providers import get_llm_client
-    from .smartchunk import SmartChunker
+    from .smartchunk import SmartChunker, RE2_AVAILABLE
+    from .chunk_cache import get_chunk_cache
+    from .source_buffer import SourceBuffer
+    from .chunk_table import ChunkTable, TRANSLATION, CRITIQUE, FINAL
     from .utils import log_to_state, update_progress
     from .exceptions import AuthenticationError, RateLimitError, APIError, handle_errors
-    from .node_utils import safe_json_parse
+    from .node_utils import safe_json_parse, get_setting, stratified_order, build_terminology_regions, terminology_sampling, record_sampled_region, sampling_should_stop, terminology_sampling_report, fit_latency_model, predict_makespan, choose_chunk_size, chunk_size_stats, review_mode, REVIEW, seed_stored_chunks, unseed_changed_neighbors
+    from .term_candidates import mine_term_candidates, batch_candidates
+    from .llm_scheduler import llm_pool, record_llm_waits, TERMINOLOGY
+
+def _parse_terminology_response(response_data: Any) -> List[TerminologyEntry]:
+    """Converts a parsed LLM glossary response into deduplicated TerminologyEntry items."""
+    terms = []
+    seen_terms = set()
+
+    if isinstance(response_data, list):
+        for term_data in response_data:
+            if not isinstance(term_data, dict):
+                continue
+            source_term = term_data.get("sourceTerm")
+            if not isinstance(source_term, str) or not source_term.strip():
+                continue
+            if source_term in seen_terms:
+                continue
+            seen_terms.add(source_term)
+
+            translations = term_data.get("proposedTranslations", {})
+            if not isinstance(translations, dict) or "default" not in translations:
+                translations = {"default": ""}
+
+            entry = TerminologyEntry(
+                sourceTerm=source_term,
+                proposedTranslations=translations
+            )
+
+            terms.append(entry)
+
+    return terms
+
 
 def terminology_extraction_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -83,35 +125,67 @@ def terminology_extraction_worker(worker_input: Dict[str, Any]) -> Dict[str, Any
         # If these logs need to be preserved, the worker's return signature and the calling function (terminology_unification) would need modification.
 
         response_data = safe_json_parse(response, {}, NODE_NAME) # Use a fresh dict for safe_json_parse logging
+        terms = _parse_terminology_response(response_data)
 
-        terms = []
-        seen_terms = set()
+        return {
+            "index": index,
+            "terms": terms,
+            "node_name": NODE_NAME
+        }
 
-        if isinstance(response_data, list):
-            for term_data in response_data:
-                if not isinstance(term_data, dict):
-                    continue
-                source_term = term_data.get("sourceTerm")
-                if not isinstance(source_term, str) or not source_term.strip():
-                    continue
-                if source_term in seen_terms:
-                    continue
-                seen_terms.add(source_term)
+    except Exception as e:
+        return {
+            "index": index,
+            "error": f"{NODE_NAME} error: {type(e).__name__}: {e}",
+            "node_name": NODE_NAME
+        }
+
+
+def terminology_candidate_worker(worker_input: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Translates and validates one batch of locally mined term candidates using the LLM.
+    Designed to be run in parallel, like terminology_extraction_worker.
+    """
+    NODE_NAME = "terminology_candidate_worker"
+    index = worker_input.get("index", -1)
+    config = worker_input.get("config", {})
+    candidates = worker_input.get("candidates", [])
+
+    try:
+        prompts_path = Path(__file__).parent.parent / "prompts.yaml"
+        with open(prompts_path) as f:
+            prompts = yaml.safe_load(f)
 
-                translations = term_data.get("proposedTranslations", {})
-                if not isinstance(translations, dict) or "default" not in translations:
-                    translations = {"default": ""}
+        prompt_text = prompts["prompts"]["glossary_candidate_translation"]["user"]
 
-                entry = TerminologyEntry(
-                    sourceTerm=source_term,
-                    proposedTranslations=translations
-                )
+        llm = get_llm_client(config)
+        prompt_template = ChatPromptTemplate.from_messages([("user", prompt_text)])
+        chain = prompt_template | llm | StrOutputParser()
+
+        # One compact JSON line per candidate keeps the request small
+        candidate_list = "\n".join(
+            json.dumps({"term": c["term"], "kind": c["kinds"][0] if c.get("kinds") else "ngram", "context": c.get("context", "")}, ensure_ascii=False)
+            for c in candidates
+        )
+        invoke_context = {
+            "source_language": config["source_language"],
+            "target_language": config["target_language"],
+            "content_type": config.get("content_type", "general document"),
+            "candidate_list": candidate_list
+        }
+        temp_state_for_logging = {}
+        log_to_state(temp_state_for_logging, f"Term candidate request (Batch {index}, {len(candidates)} candidates):\n---\n{candidate_list}\n---", "DEBUG", node=NODE_NAME, log_type="LOG_LLM_PROMPTS")
+
+        response = chain.invoke(invoke_context)
+        log_to_state(temp_state_for_logging, f"Term candidate raw response (Batch {index}):\n---\n{response}\n---", "DEBUG", node=NODE_NAME, log_type="LOG_LLM_PROMPTS")
 
-                terms.append(entry)
+        response_data = safe_json_parse(response, {}, NODE_NAME)
+        terms = _parse_terminology_response(response_data)
 
         return {
             "index": index,
             "terms": terms,
+            "candidate_count": len(candidates),
             "node_name": NODE_NAME
         }
 
@@ -138,17 +212,17 @@ def init_translation(state: TranslationState) -> TranslationState:
     })
     # Initialize other fields expected later if they don't exist
     state_dict.setdefault('original_content', '')
+    state_dict.setdefault('original_content_path', None)
     state_dict.setdefault('config', {})
     state_dict.setdefault('current_step', None)
     state_dict.setdefault('progress_percent', 0.0)
-    state_dict.setdefault('chunks', None)
+    state_dict.setdefault('chunk_table', None) # Chunks and per-stage outputs (ChunkTable)
     state_dict.setdefault('terminology', None)
-    state_dict.setdefault('translated_chunks', None)
-    state_dict.setdefault('parallel_worker_results', None)
-    state_dict.setdefault('critiques', []) # Explicitly initialize critiques list
-    state_dict.setdefault('final_chunks', None) # Initialize final_chunks list
     state_dict.setdefault('final_document', None)
     state_dict.setdefault('error_info', None)
+    state_dict['pending_chunks'] = {} # Batches of a previous run on the same thread are not continued
+    state_dict.setdefault('stored_chunks', None)
+    state_dict.setdefault('base_job_id', None)
 
     # Check if user provided a glossary
     if 'contextualized_glossary' in state_dict and state_dict['contextualized_glossary']:
@@ -188,6 +262,139 @@ def init_translation(state: TranslationState) -> TranslationState:
     return state
 
 
+def _build_chunker(state: TranslationState, config: Dict[str, Any], node_name: str) -> SmartChunker:
+    """
+    SmartChunker for the translation chunks: sizes from MAX_CHUNK_SIZE/MIN_CHUNK_SIZE
+    (or the base job's auto-tuned sizes for an incremental job, or chosen from past
+    LLM latencies with CHUNK_SIZE_AUTOTUNE), algorithm, symbol separators and
+    symbol_keep_separators from the job config, and the smart mode regex engine
+    from CHUNKER_REGEX_ENGINE / chunker_regex_engine.
+    """
+    # --- Get Chunking Parameters from Environment ---
+    # Max Chunk Size
+    default_max_size = 2000
+    try:
+        max_size = int(os.environ.get("MAX_CHUNK_SIZE", default_max_size))
+        if max_size <= 0:
+            max_size = default_max_size
+            log_to_state(state, f"Invalid MAX_CHUNK_SIZE env var <= 0, using default: {max_size}", "WARNING", node=node_name)
+    except ValueError:
+        max_size = default_max_size
+        log_to_state(state, f"Non-integer MAX_CHUNK_SIZE env var, using default: {max_size}", "WARNING", node=node_name)
+
+    # Min Chunk Size
+    default_min_size = 100 # Example default minimum size
+    try:
+        min_size = int(os.environ.get("MIN_CHUNK_SIZE", default_min_size))
+        if min_size < 0: # Allow 0, but not negative
+             min_size = default_min_size
+             log_to_state(state, f"Invalid MIN_CHUNK_SIZE env var < 0, using default: {min_size}", "WARNING", node=node_name)
+        elif min_size > max_size:
+             min_size = max_size # Cannot be larger than max_size
+             log_to_state(state, f"MIN_CHUNK_SIZE env var > MAX_CHUNK_SIZE, setting min_size = max_size ({min_size})", "WARNING", node=node_name)
+    except ValueError:
+        min_size = default_min_size
+        log_to_state(state, f"Non-integer MIN_CHUNK_SIZE env var, using default: {min_size}", "WARNING", node=node_name)
+
+    base_sizes = config.get("base_chunk_sizes") if config.get("base_job_id") else None
+    if base_sizes:
+        # Incremental runs chunk like their base job, whose sizes were auto-tuned
+        min_size, max_size = int(base_sizes["min_chunk_size"]), max(1, int(base_sizes["max_chunk_size"]))
+        min_size = min(max_size, max(0, min_size))
+        log_to_state(state, f"Using the base job's auto-tuned chunk sizes: max_chunk_size={max_size}, min_chunk_size={min_size}", "INFO", node=node_name)
+    elif get_setting(config, "CHUNK_SIZE_AUTOTUNE", "chunk_size_autotune", False, bool):
+        min_size, max_size = _autotune_chunk_sizes(state, config, min_size, max_size, node_name)
+
+    # Get chunking algorithm from config
+    chunking_algorithm = config.get("chunking_algorithm", "smart")
+    log_to_state(state, f"Using chunking algorithm: {chunking_algorithm}", "INFO", node=node_name)
+
+    # Get symbol separators if using symbol mode
+    separators = None
+    keep_separators = False
+    if chunking_algorithm == "symbol":
+        keep_separators = bool(config.get("symbol_keep_separators", False))
+        symbol_separators_str = config.get("symbol_separators", '["."]')
+        try:
+            import json
+            separators = json.loads(symbol_separators_str)
+            log_to_state(state, f"Using symbol separators: {separators}", "INFO", node=node_name)
+        except json.JSONDecodeError as e:
+            log_to_state(state, f"Error parsing symbol separators: {e}. Using default separator '.'", "WARNING", node=node_name)
+            separators = ["."]  # Default to period if parsing fails
+
+    merge_strategy = get_setting(config, "CHUNK_MERGE_STRATEGY", "chunk_merge_strategy", "greedy").strip().lower()
+    if merge_strategy not in ("greedy", "balanced"):
+        log_to_state(state, f"Unknown CHUNK_MERGE_STRATEGY '{merge_strategy}', using 'greedy'", "WARNING", node=node_name)
+        merge_strategy = "greedy"
+
+    regex_engine = get_setting(config, "CHUNKER_REGEX_ENGINE", "chunker_regex_engine", "re").strip().lower()
+    if regex_engine not in ("re", "re2", "auto"):
+        log_to_state(state, f"Unknown CHUNKER_REGEX_ENGINE '{regex_engine}', using 're'", "WARNING", node=node_name)
+        regex_engine = "re"
+    elif regex_engine == "re2" and not RE2_AVAILABLE:
+        log_to_state(state, "CHUNKER_REGEX_ENGINE is 're2' but google-re2 is not installed, using 're'", "WARNING", node=node_name)
+        regex_engine = "re"
+
+    return SmartChunker(min_chunk_size=min_size, max_chunk_size=max_size, mode=chunking_algorithm, separators=separators,
+                        keep_separators=keep_separators, regex_engine=regex_engine, merge_strategy=merge_strategy)
+
+
+def _autotune_chunk_sizes(state: TranslationState, config: Dict[str, Any], min_size: int, max_size: int,
+                          node_name: str) -> Tuple[int, int]:
+    """
+    Picks the max chunk size that minimizes the predicted LLM time of the job at the
+    current MAX_PARALLEL_WORKERS, from the latencies of past calls to the same
+    provider/model (state["llm_call_history"], one latency model per stage the job
+    runs). Sizes are searched in [CHUNK_SIZE_AUTOTUNE_MIN, CHUNK_SIZE_AUTOTUNE_MAX].
+    Keeps the configured sizes when there is not enough history for the translation
+    stage. Returns (min_size, max_size).
+    """
+    history = state.get("llm_call_history") or []
+    min_samples = max(2, get_setting(config, "CHUNK_SIZE_AUTOTUNE_MIN_SAMPLES", "chunk_size_autotune_min_samples", 20, int))
+    stages = [TRANSLATION]
+    if config.get("translation_mode", "deep_mode") != "quick_mode":
+        stages += [REVIEW] if review_mode(config) == "fused_review" else [CRITIQUE, FINAL]
+    models = {}
+    for stage in stages:
+        model = fit_latency_model([(chars, seconds) for name, chars, _, seconds in history if name == stage], min_samples)
+        if model is not None:
+            models[stage] = model
+    if TRANSLATION not in models:
+        log_to_state(state, f"Chunk size auto-tune: not enough latency history ({len(history)} past calls, need {min_samples} translation calls of different sizes), using MAX_CHUNK_SIZE={max_size}.", "INFO", node=node_name)
+        return min_size, max_size
+
+    source_path = state.get("original_content_path")
+    if source_path:
+        # Characters, not bytes: multibyte text is shorter than its file
+        with SourceBuffer.from_file(source_path) as source:
+            total_chars = len(source)
+    else:
+        total_chars = len(state.get("original_content") or "")
+    concurrency = max(1, get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int))
+    lower = max(1, get_setting(config, "CHUNK_SIZE_AUTOTUNE_MIN", "chunk_size_autotune_min", 500, int))
+    upper = max(lower, get_setting(config, "CHUNK_SIZE_AUTOTUNE_MAX", "chunk_size_autotune_max", 8000, int))
+
+    stage_models = list(models.values())
+    tuned_max, predicted = choose_chunk_size(total_chars, concurrency, stage_models, lower, upper)
+    tuned_min = min(min_size, tuned_max)
+    fixed_predicted = predict_makespan(total_chars, max_size, concurrency, stage_models)
+    intercept, per_char = models[TRANSLATION]
+    log_to_state(state,
+        f"Chunk size auto-tune ({len(history)} past calls, stages {sorted(models)}, {concurrency} workers, {total_chars} chars): "
+        f"max_chunk_size={tuned_max}, min_chunk_size={tuned_min}, predicted LLM time {predicted:.1f}s "
+        f"(MAX_CHUNK_SIZE={max_size}: {fixed_predicted:.1f}s). Translation latency: {intercept:.2f}s + {per_char * 1000:.3f}s per 1000 chars.",
+        "INFO", node=node_name)
+    metrics = state.get("metrics")
+    if isinstance(metrics, dict):
+        metrics["chunk_autotune"] = {
+            "max_chunk_size": tuned_max, "min_chunk_size": tuned_min, "concurrency": concurrency,
+            "predicted_seconds": round(predicted, 1), "fixed_predicted_seconds": round(fixed_predicted, 1),
+            "history_calls": len(history),
+        }
+    return tuned_min, tuned_max
+
+
 def chunk_document(state: TranslationState) -> TranslationState:
     NODE_NAME = "chunk_document"
     update_progress(state, NODE_NAME, 10.0)
@@ -196,120 +403,184 @@ def chunk_document(state: TranslationState) -> TranslationState:
     original_file_type = state.get('original_file_type', 'unknown')
     log_to_state(state, f"Original file type: {original_file_type}", "INFO", node=NODE_NAME)
 
-    # Initialize state fields
-    state["chunks"] = [] # Reset/initialize
-    state["translated_chunks"] = [] # Also reset translated chunks array
-    state["non_translatable_chunks"] = [] # New field for non-translatable chunks
-    state["chunks_with_metadata"] = [] # New field for all chunks with metadata
+    # Reset the chunk table (all chunks and their per-stage outputs)
+    state["chunk_table"] = None
 
-    if not state.get('original_content'):
+    source_path = state.get('original_content_path')
+    if not state.get('original_content') and not source_path:
         log_to_state(state, "Original content is empty, cannot chunk.", "ERROR", node=NODE_NAME)
         state["error_info"] = "Cannot chunk empty content."
         return state # Return full state on error
 
     try:
-        content = state["original_content"]
+        content = state.get("original_content") or ""
         config = state.get("config", {})
 
-        # --- Get Chunking Parameters from Environment ---
-        # Max Chunk Size
-        default_max_size = 2000
-        try:
-            max_size = int(os.environ.get("MAX_CHUNK_SIZE", default_max_size))
-            if max_size <= 0:
-                max_size = default_max_size
-                log_to_state(state, f"Invalid MAX_CHUNK_SIZE env var <= 0, using default: {max_size}", "WARNING", node=NODE_NAME)
-        except ValueError:
-            max_size = default_max_size
-            log_to_state(state, f"Non-integer MAX_CHUNK_SIZE env var, using default: {max_size}", "WARNING", node=NODE_NAME)
+        chunker = _build_chunker(state, config, NODE_NAME)
 
-        # Min Chunk Size
-        default_min_size = 100 # Example default minimum size
-        try:
-            min_size = int(os.environ.get("MIN_CHUNK_SIZE", default_min_size))
-            if min_size < 0: # Allow 0, but not negative
-                 min_size = default_min_size
-                 log_to_state(state, f"Invalid MIN_CHUNK_SIZE env var < 0, using default: {min_size}", "WARNING", node=NODE_NAME)
-            elif min_size > max_size:
-                 min_size = max_size # Cannot be larger than max_size
-                 log_to_state(state, f"MIN_CHUNK_SIZE env var > MAX_CHUNK_SIZE, setting min_size = max_size ({min_size})", "WARNING", node=NODE_NAME)
-        except ValueError:
-            min_size = default_min_size
-            log_to_state(state, f"Non-integer MIN_CHUNK_SIZE env var, using default: {min_size}", "WARNING", node=NODE_NAME)
-
-        # Get chunking algorithm from config
-        chunking_algorithm = config.get("chunking_algorithm", "smart")
-        log_to_state(state, f"Using chunking algorithm: {chunking_algorithm}", "INFO", node=NODE_NAME)
-
-        # Get symbol separators if using symbol mode
-        separators = None
-        if chunking_algorithm == "symbol":
-            symbol_separators_str = config.get("symbol_separators", '["."]')
-            try:
-                import json
-                separators = json.loads(symbol_separators_str)
-                log_to_state(state, f"Using symbol separators: {separators}", "INFO", node=NODE_NAME)
-            except json.JSONDecodeError as e:
-                log_to_state(state, f"Error parsing symbol separators: {e}. Using default separator '.'", "WARNING", node=NODE_NAME)
-                separators = ["."]  # Default to period if parsing fails
-
-        # Initialize SmartChunker and process the content
-        chunker = SmartChunker(min_chunk_size=min_size, max_chunk_size=max_size, mode=chunking_algorithm, separators=separators)
-        chunks_with_metadata, report = chunker.chunk(content)
+        # Span mode: chunks are (start, end, type, translate) records over one shared
+        # source buffer, and chunk texts are sliced from it only when accessed.
+        # A source file on disk is memory-mapped instead of loaded.
+        if source_path or get_setting(config, "CHUNK_SPANS", "chunk_spans", False, bool):
+            return _chunk_document_spans(state, chunker, content, source_path, NODE_NAME)
+
+        # Very large documents can be scanned by several processes (smart mode);
+        # the chunks are the same as the serial chunker's. Results are cached, so
+        # terminology_unification and resubmitted jobs share them.
+        chunk_workers = get_setting(config, "CHUNK_WORKERS", "chunk_workers", 1, int)
+        chunks_with_metadata, report = get_chunk_cache().chunk(chunker, content, workers=chunk_workers)
         
         # Log chunking report
-        log_to_state(state, f"Chunking report: {report}, min_chunk_size:{min_size}, max_chunk_size:{max_size}, chunking_algorithm:{chunking_algorithm}", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+        log_to_state(state, f"Chunking report: {report}, min_chunk_size:{chunker.min_chunk_size}, max_chunk_size:{chunker.max_chunk_size}, chunking_algorithm:{chunker.mode}", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+
+        state["chunk_table"] = ChunkTable.from_chunks(chunks_with_metadata)
+        _log_chunk_table(state, state["chunk_table"], NODE_NAME)
+        _seed_stored_chunks(state, state["chunk_table"], NODE_NAME)
+        if chunker.merge_strategy == "balanced":
+            _log_merge_balance(state, config, chunker, content, state["chunk_table"], NODE_NAME)
 
-        # Separate translatable and non-translatable chunks
-        translatable_chunks = []
-        non_translatable_chunks = []
-        
-        for chunk in chunks_with_metadata:
-            if chunk["toTranslate"]:
-                translatable_chunks.append(chunk)
-            else:
-                non_translatable_chunks.append(chunk)
-        
-        # Store all chunks with metadata for reassembly
-        state["chunks_with_metadata"] = chunks_with_metadata
-        
-        # Store translatable chunks for translation process
-        state["chunks"] = [chunk["chunkText"] for chunk in translatable_chunks]
-        
-        # Store non-translatable chunks for direct inclusion in final document
-        state["non_translatable_chunks"] = non_translatable_chunks
-        
-        # Initialize translated_chunks array
-        state["translated_chunks"] = [None] * len(translatable_chunks)
-        
-        # Log chunking results
-        log_to_state(state,
-            f"Document split into {len(chunks_with_metadata)} chunks: {len(translatable_chunks)} translatable, {len(non_translatable_chunks)} non-translatable.",
-            "INFO", node=NODE_NAME)
-        
-        # Log details about non-translatable chunks
-        if non_translatable_chunks:
-            type_counts = {}
-            for chunk in non_translatable_chunks:
-                chunk_type = chunk["chunkType"]
-                type_counts[chunk_type] = type_counts.get(chunk_type, 0) + 1
-            
-            log_to_state(state,
-                f"Non-translatable chunks by type: {type_counts}",
-                "INFO", node=NODE_NAME)
-            
     except Exception as e:
         error_msg = f"Critical error during document chunking: {type(e).__name__}: {e}"
         log_to_state(state, error_msg, "CRITICAL", node=NODE_NAME)
         state["error_info"] = error_msg # Chunking failure is critical
-        state["chunks"] = [] # Ensure chunks list is empty on failure
-        state["translated_chunks"] = []
-        state["non_translatable_chunks"] = []
-        state["chunks_with_metadata"] = []
+        state["chunk_table"] = None # No chunks on failure
 
     return state # Return the entire modified state
 
 
+def _chunk_document_spans(state: TranslationState, chunker: SmartChunker, content: str,
+                          source_path: Optional[str], node_name: str) -> TranslationState:
+    """
+    Span variant of chunk_document: the chunk table holds (start, end) offsets into
+    one shared source buffer instead of chunk texts, which are sliced from it only
+    when accessed. A memory-mapped source stays mapped until assemble_document.
+    """
+    if source_path:
+        source = SourceBuffer.from_file(source_path)
+        log_to_state(state, f"Memory-mapped source file {source_path} ({len(source)} characters).", "INFO", node=node_name)
+    else:
+        source = SourceBuffer(content)
+
+    try:
+        spans = chunker.chunk_spans(source)
+    except Exception:
+        source.close(keep_text=False)
+        raise
+    state["chunk_table"] = ChunkTable.from_spans(source, spans)
+    _log_chunk_table(state, state["chunk_table"], node_name)
+    _seed_stored_chunks(state, state["chunk_table"], node_name)
+    if chunker.merge_strategy == "balanced":
+        _log_merge_balance(state, state.get("config", {}), chunker, content, state["chunk_table"], node_name)
+    return state
+
+
+def _log_merge_balance(state: TranslationState, config: Dict[str, Any], chunker: SmartChunker, content: str,
+                       table: ChunkTable, node_name: str):
+    """
+    Logs the size variance and the one-stage makespan (in characters, at
+    MAX_PARALLEL_WORKERS) of the balanced chunks next to those of the greedy merge
+    of the same content, and keeps both in metrics["chunk_balance"].
+    """
+    workers = max(1, get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int))
+    balanced = chunk_size_stats([len(table.source_text(k)) for k in range(table.translatable_count)], workers)
+    message = (f"Balanced merge: {balanced['chunks']} chunks, size variance {balanced['variance']:.0f} "
+               f"(sd {balanced['variance'] ** 0.5:.0f}), makespan {balanced['makespan']} chars at {workers} workers")
+    greedy = None
+    if content:
+        greedy_chunker = copy.copy(chunker)
+        greedy_chunker.merge_strategy = "greedy"
+        greedy_chunks, _ = get_chunk_cache().chunk(greedy_chunker, content)
+        greedy = chunk_size_stats([len(c["chunkText"]) for c in greedy_chunks if c["toTranslate"]], workers)
+        message += (f"; greedy merge: {greedy['chunks']} chunks, size variance {greedy['variance']:.0f} "
+                    f"(sd {greedy['variance'] ** 0.5:.0f}), makespan {greedy['makespan']} chars")
+    log_to_state(state, message + ".", "INFO", node=node_name)
+    metrics = state.get("metrics")
+    if isinstance(metrics, dict):
+        metrics["chunk_balance"] = {"balanced": balanced, "greedy": greedy}
+
+
+def _log_chunk_table(state: TranslationState, table: ChunkTable, node_name: str):
+    log_to_state(state,
+        f"Document split into {len(table)} chunks: {table.translatable_count} translatable, {len(table) - table.translatable_count} non-translatable.",
+        "INFO", node=node_name)
+    # Log details about non-translatable chunks
+    type_counts = table.type_counts(translatable=False)
+    if type_counts:
+        log_to_state(state, f"Non-translatable chunks by type: {type_counts}", "INFO", node=node_name)
+
+
+def _seed_stored_chunks(state: TranslationState, table: ChunkTable, node_name: str):
+    """
+    Reuses the chunk outputs the worker loaded from job_chunks (state["stored_chunks"],
+    saved by an interrupted or failed earlier run of the job, and for an incremental
+    run by its base job: records with "base"), so the translation, critique and
+    refinement stages only dispatch the missing chunks. Incremental runs also
+    re-translate the unchanged chunks within INCREMENTAL_NEIGHBORS chunks of an
+    edited one.
+    """
+    records = state.get("stored_chunks")
+    if not records:
+        return
+    counts = seed_stored_chunks(table, records)
+    state["stored_chunks"] = None # Not needed once seeded (keeps checkpoints small)
+    base_job_id = state.get("base_job_id")
+    if not base_job_id:
+        log_to_state(state, f"Reusing stored outputs of an earlier run: {counts[TRANSLATION]} of {table.translatable_count} translations, {counts[CRITIQUE]} critiques, {counts[FINAL]} refined chunks.", "INFO", node=node_name)
+        return
+
+    config = state.get("config", {})
+    neighbors = max(0, get_setting(config, "INCREMENTAL_NEIGHBORS", "incremental_neighbors", 1, int))
+    base_records = [record for record in records if record.get("base")]
+    own_sources = {record["source"] for record in records if not record.get("base")}
+    changes = unseed_changed_neighbors(table, base_records, neighbors, own_sources)
+    reused = sum(value is not None for value in table.stage_values(TRANSLATION))
+    log_to_state(state,
+        f"Incremental run on job {base_job_id}: {changes['changed']} of {table.translatable_count} chunks changed, "
+        f"{changes['neighbors']} unchanged neighbours re-translated ({neighbors} on each side), "
+        f"{reused} translations reused ({sum(value is not None for value in table.stage_values(FINAL))} refined).",
+        "INFO", node=node_name)
+    metrics = state.get("metrics")
+    if isinstance(metrics, dict):
+        metrics["incremental"] = {
+            "base_job_id": base_job_id, "chunks": table.translatable_count, "changed": changes["changed"],
+            "neighbors": changes["neighbors"], "reused_translations": reused,
+        }
+
+
+def terminology_extraction_mode(state: TranslationState, config: Dict[str, Any], node_name: str) -> str:
+    """
+    TERMINOLOGY_EXTRACTION_MODE: "llm" sends every region to the LLM, "candidates"
+    mines terms locally first and only asks the LLM to translate/validate them.
+    """
+    extraction_mode = get_setting(config, "TERMINOLOGY_EXTRACTION_MODE", "terminology_extraction_mode", "llm").strip().lower()
+    if extraction_mode not in ("llm", "candidates"):
+        log_to_state(state, f"Unknown terminology extraction mode '{extraction_mode}', falling back to 'llm'.", "WARNING", node=node_name)
+        extraction_mode = "llm"
+    return extraction_mode
+
+
+def candidate_worker_inputs(state: TranslationState, config: Dict[str, Any], regions: List[str], node_name: str) -> List[Dict[str, Any]]:
+    """Mines term candidates from the region texts and batches them into terminology_candidate_worker inputs."""
+    max_candidates = max(1, get_setting(config, "TERMINOLOGY_MAX_CANDIDATES", "terminology_max_candidates", 300, int))
+    batch_size = max(1, get_setting(config, "TERMINOLOGY_CANDIDATE_BATCH_SIZE", "terminology_candidate_batch_size", 60, int))
+    background_path = get_setting(config, "TERMINOLOGY_BACKGROUND_CORPUS", "terminology_background_corpus", None)
+
+    mining_start = time.time()
+    candidates = mine_term_candidates(regions, max_candidates=max_candidates, background_path=background_path)
+    log_to_state(state, f"Mined {len(candidates)} term candidates from {len(regions)} regions locally in {time.time() - mining_start:.2f}s.", "INFO", node=node_name)
+
+    return [{"config": config, "candidates": batch, "index": idx}
+            for idx, batch in enumerate(batch_candidates(candidates, batch_size))]
+
+
+def log_sampling_outcome(state: TranslationState, sampling: Dict[str, Any], node_name: str):
+    """Logs whether adaptive terminology sampling stopped early."""
+    if sampling["stopped_early"]:
+        log_to_state(state, f"Terminology sampling stopped early after {sampling['processed']}/{sampling['regions_total']} regions: discovery fell below {sampling['threshold']} new terms/region for {sampling['patience']} waves.", "INFO", node=node_name)
+    else:
+        log_to_state(state, f"Terminology sampling processed all {sampling['processed']} regions (discovery stayed above {sampling['threshold']} new terms/region).", "INFO", node=node_name)
+
+
 def terminology_unification(state: TranslationState) -> TranslationState:
     NODE_NAME = "terminology_unification"
     update_progress(state, NODE_NAME, 5.0)
@@ -317,14 +588,17 @@ def terminology_unification(state: TranslationState) -> TranslationState:
     # state["unified_terminology"] = []
     update_dict = {} # Dictionary to hold updates
 
-    if not state.get("original_content"):
+    content = state.get("original_content") or ""
+    source_path = state.get("original_content_path")
+    # A memory-mapped source file is chunked block by block, never read as one string
+    source = SourceBuffer.from_file(source_path) if not content and source_path else SourceBuffer(content)
+    if not len(source):
         log_to_state(state, "Original content is empty, skipping terminology unification.", "WARNING", node=NODE_NAME)
         # Return empty update if skipping
         return {}
 
     try:
         config = state.get("config", {})
-        content = state["original_content"]
 
         # Read chunk size from environment
         default_chunk_size = 8000
@@ -345,111 +619,112 @@ def terminology_unification(state: TranslationState) -> TranslationState:
             min_size = default_min_size
 
         # Decide chunking strategy
-        if len(content) <= min_size:
-            chunks = [content]
+        if len(source) <= min_size:
+            chunks = [source.text()]
             log_to_state(state, f"Content length <= {min_size}, treating as a single chunk for terminology extraction.", "INFO", node=NODE_NAME)
         else:
-            # Get chunking algorithm from config
-            chunking_algorithm = config.get("chunking_algorithm", "smart")
-            log_to_state(state, f"Using chunking algorithm for terminology extraction: {chunking_algorithm}", "INFO", node=NODE_NAME)
-
-            # Get symbol separators if using symbol mode
-            separators = None
-            if chunking_algorithm == "symbol":
-                symbol_separators_str = config.get("symbol_separators", '["."]')
-                try:
-                    import json
-                    separators = json.loads(symbol_separators_str)
-                    log_to_state(state, f"Using symbol separators for terminology extraction: {separators}", "INFO", node=NODE_NAME)
-                except json.JSONDecodeError as e:
-                    log_to_state(state, f"Error parsing symbol separators for terminology extraction: {e}. Using default separator '.'", "WARNING", node=NODE_NAME)
-                    separators = ["."]  # Default to period if parsing fails
-
-            # Initialize SmartChunker for terminology extraction
-            chunker = SmartChunker(min_chunk_size=min_size, max_chunk_size=chunk_size, mode=chunking_algorithm, separators=separators)
-            chunks_with_metadata, _ = chunker.chunk(content)
-            # Extract only the text content from translatable chunks
-            initial_chunks = [chunk["chunkText"] for chunk in chunks_with_metadata if chunk["toTranslate"]]
+            # Regions are built from the translation chunks (cached, so chunk_document
+            # reuses them) by merging consecutive chunks up to the region size
+            chunker = _build_chunker(state, config, NODE_NAME)
+            if source.is_mapped:
+                initial_chunks = [span.text(source) for span in chunker.chunk_spans(source) if span.translate]
+            else:
+                chunk_workers = get_setting(config, "CHUNK_WORKERS", "chunk_workers", 1, int)
+                chunks_with_metadata, _ = get_chunk_cache().chunk(chunker, content, workers=chunk_workers)
+                initial_chunks = [chunk["chunkText"] for chunk in chunks_with_metadata if chunk["toTranslate"]]
             log_to_state(state, f"Initial terminology chunks before merging: {len(initial_chunks)}", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
 
-            # Merge small chunks similar to chunk_document
-            merged_chunks = []
-            temp_chunk = ""
-            for i, chunk in enumerate(initial_chunks):
-                current_len = len(chunk)
-                temp_len = len(temp_chunk)
-
-                if temp_chunk and (temp_len + current_len) <= chunk_size:
-                    temp_chunk += "\n\n" + chunk
-                elif current_len < min_size and i < len(initial_chunks) - 1:
-                    if temp_chunk:
-                        merged_chunks.append(temp_chunk)
-                    temp_chunk = chunk
-                else:
-                    if temp_chunk:
-                        merged_chunks.append(temp_chunk)
-                        temp_chunk = ""
-                    merged_chunks.append(chunk)
-
-            if temp_chunk:
-                merged_chunks.append(temp_chunk)
-
-            chunks = merged_chunks
-            log_to_state(state, f"Terminology chunks after merging small chunks (<{min_size}): {len(chunks)}", "INFO", node=NODE_NAME)
-
-        # Load prompts
-        prompts_path = Path(__file__).parent.parent / "prompts.yaml"
-        with open(prompts_path) as f:
-            prompts = yaml.safe_load(f)
-
-        prompt_text = prompts["prompts"]["contextualized_glossary_extraction"]["user"] # Use renamed key
-
-        llm = get_llm_client(config)
+            chunks = [region["text"] for region in build_terminology_regions(initial_chunks, chunk_size)]
+            log_to_state(state, f"Terminology regions after merging chunks (<= {chunk_size} chars): {len(chunks)}", "INFO", node=NODE_NAME)
 
         all_terms = []
         seen_terms = set()
 
-        # Prepare worker inputs
-        worker_inputs = []
-        for idx, chunk_text in enumerate(chunks):
-            worker_inputs.append({
-                "config": config,
-                "chunk_text": chunk_text,
-                "index": idx
-            })
+        extraction_mode = terminology_extraction_mode(state, config, NODE_NAME)
 
-        # Determine max workers (env > config > default)
-        max_workers_env = os.getenv("MAX_PARALLEL_WORKERS")
-        if max_workers_env is not None:
-            try:
-                configured_max_workers = int(max_workers_env)
-            except ValueError:
-                configured_max_workers = config.get("max_parallel_workers", 5)
+        # Prepare worker inputs
+        if extraction_mode == "candidates":
+            worker_inputs = candidate_worker_inputs(state, config, chunks, NODE_NAME)
+            worker_fn = terminology_candidate_worker
         else:
-            configured_max_workers = config.get("max_parallel_workers", 5)
+            worker_inputs = []
+            for idx, chunk_text in enumerate(chunks):
+                worker_inputs.append({
+                    "config": config,
+                    "chunk_text": chunk_text,
+                    "index": idx
+                })
+            worker_fn = terminology_extraction_worker
+
+        if not worker_inputs:
+            log_to_state(state, "No terminology requests to send, glossary will be empty.", "INFO", node=NODE_NAME)
+            update_dict["contextualized_glossary"] = []
+            return update_dict
 
-        actual_workers = min(configured_max_workers, len(worker_inputs))
+        # Determine max workers (env > config > default)
+        configured_max_workers = get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int)
 
-        log_to_state(state, f"Starting parallel terminology extraction for {len(worker_inputs)} chunks using {actual_workers} workers (max configured: {configured_max_workers}).", "INFO", node=NODE_NAME)
+        actual_workers = max(1, min(configured_max_workers, len(worker_inputs)))
 
-        # Run workers in parallel
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=actual_workers) as executor:
-            future_to_index = {executor.submit(terminology_extraction_worker, inp): inp["index"] for inp in worker_inputs}
-
-            for future in concurrent.futures.as_completed(future_to_index):
-                idx = future_to_index[future]
-                try:
-                    result = future.result()
-                    results.append(result)
+        # Adaptive sampling (llm mode): visit regions in a stratified order across the
+        # book and stop once new-term discovery per region flattens out.
+        sampling = terminology_sampling(config, extraction_mode, len(worker_inputs), actual_workers)
+        if sampling:
+            queued_inputs = deque(worker_inputs[i] for i in stratified_order(len(worker_inputs)))
+        else:
+            queued_inputs = deque(worker_inputs)
 
-                    if "error" in result:
-                        log_to_state(state, f"Worker error (Chunk {idx + 1}/{len(worker_inputs)}): {result['error']}", "ERROR", node=NODE_NAME)
-                    else:
-                        log_to_state(state, f"Successfully extracted terminology for chunk {idx + 1}/{len(worker_inputs)}.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+        log_to_state(state, f"Starting parallel terminology extraction ({extraction_mode} mode) for {len(worker_inputs)} requests using {actual_workers} workers (max configured: {configured_max_workers}){' with adaptive sampling' if sampling else ''}.", "INFO", node=NODE_NAME)
 
-                except Exception as e:
-                    log_to_state(state, f"Exception in terminology worker for chunk {idx + 1}: {type(e).__name__}: {e}", "ERROR", node=NODE_NAME)
+        # Run workers in parallel. With sampling only `actual_workers` requests are in
+        # flight, the next one is submitted as soon as one finishes, and discovery is
+        # measured over every wave of finished regions.
+        results = []
+        with llm_pool(config, actual_workers) as pool:
+            in_flight = {}
+
+            def submit_next():
+                inp = queued_inputs.popleft()
+                in_flight[pool.submit(TERMINOLOGY, worker_fn, inp)] = inp["index"]
+
+            while queued_inputs and (not sampling or len(in_flight) < actual_workers):
+                submit_next()
+            while in_flight:
+                done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    idx = in_flight.pop(future)
+                    terms = []
+                    try:
+                        result = future.result()
+                        results.append(result)
+
+                        if "error" in result:
+                            log_to_state(state, f"Worker error (Chunk {idx + 1}/{len(worker_inputs)}): {result['error']}", "ERROR", node=NODE_NAME)
+                        else:
+                            terms = result.get("terms", [])
+                            log_to_state(state, f"Successfully extracted terminology for chunk {idx + 1}/{len(worker_inputs)}.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+
+                    except Exception as e:
+                        log_to_state(state, f"Exception in terminology worker for chunk {idx + 1}: {type(e).__name__}: {e}", "ERROR", node=NODE_NAME)
+
+                    if sampling:
+                        rate = record_sampled_region(sampling, terms, not (queued_inputs or in_flight))
+                        if rate is not None:
+                            log_to_state(state, f"Terminology sampling: {sampling['processed']}/{len(worker_inputs)} regions, {rate:.2f} new terms/region in the last wave, {len(sampling['discovered'])} unique terms so far.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+                            if queued_inputs and sampling_should_stop(sampling):
+                                sampling["stopped_early"] = True
+                                queued_inputs.clear() # The requests in flight still finish
+                    if queued_inputs:
+                        submit_next()
+        record_llm_waits(state, pool)
+        if isinstance(state.get("metrics"), dict):
+            update_dict["metrics"] = dict(state["metrics"])
+
+        if sampling:
+            metrics = dict(state.get("metrics") or {})
+            metrics["terminology_sampling"] = terminology_sampling_report(sampling)
+            update_dict["metrics"] = metrics
+            log_sampling_outcome(state, sampling, NODE_NAME)
 
         # Aggregate and deduplicate terms
         try:
@@ -479,5 +754,7 @@ def terminology_unification(state: TranslationState) -> TranslationState:
     except Exception:
         log_to_state(state, "Critical error in terminology_unification.", "CRITICAL", node=NODE_NAME)
         update_dict["contextualized_glossary"] = [] # Ensure CORRECT key exists in update, even if empty on error
+    finally:
+        source.close(keep_text=False)
 
     return update_dict # Return only the changes
\ No newline at end of file
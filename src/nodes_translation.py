@@ -1,22 +1,60 @@
 import concurrent.futures
+from collections import deque
 import time # Keep for potential future use (e.g., delays)
 from typing import Dict, Any, List
-import os
 
 # Ensure correct import paths if running as part of package 'src'
 try:
     from .state import TranslationState
     from .utils import log_to_state, update_progress
-    from .node_workers import translate_chunk_worker
+    from .node_workers import translate_chunk_worker, _critique_chunk_worker, _finalize_chunk_worker, _fused_review_chunk_worker
+    from .node_utils import get_setting, build_terminology_regions, stratified_order, terminology_sampling, record_sampled_region, sampling_should_stop, terminology_sampling_report, record_llm_call, review_mode, REVIEW, next_batch, has_pending_batch
+    from .nodes_preprocessing import (chunk_document, terminology_extraction_worker, terminology_candidate_worker,
+                                      terminology_extraction_mode, candidate_worker_inputs, log_sampling_outcome)
+    from .nodes_postprocessing import (_review_essentials, critique_input, apply_critique_result,
+                                       refinement_input, apply_refinement_result, refinement_gate,
+                                       needs_refinement, skipped_refinement_tokens, record_refinement_gate,
+                                       apply_fused_review_result, log_review_cost)
+    from .chunk_table import TRANSLATION, CRITIQUE, FINAL, ERROR
+    from .llm_scheduler import llm_pool, record_llm_waits, TERMINOLOGY
     # from .exceptions import ... # Import if specific exceptions need handling here
 except ImportError: # Fallback for potential direct script execution (less ideal)
     from .state import TranslationState
     from utils import log_to_state, update_progress
-    from node_workers import translate_chunk_worker
+    from node_workers import translate_chunk_worker, _critique_chunk_worker, _finalize_chunk_worker, _fused_review_chunk_worker
+    from node_utils import get_setting, build_terminology_regions, stratified_order, terminology_sampling, record_sampled_region, sampling_should_stop, terminology_sampling_report, record_llm_call, review_mode, REVIEW, next_batch, has_pending_batch
+    from nodes_preprocessing import (chunk_document, terminology_extraction_worker, terminology_candidate_worker,
+                                     terminology_extraction_mode, candidate_worker_inputs, log_sampling_outcome)
+    from nodes_postprocessing import (_review_essentials, critique_input, apply_critique_result,
+                                      refinement_input, apply_refinement_result, refinement_gate,
+                                      needs_refinement, skipped_refinement_tokens, record_refinement_gate,
+                                      apply_fused_review_result, log_review_cost)
+    from chunk_table import TRANSLATION, CRITIQUE, FINAL, ERROR
+    from llm_scheduler import llm_pool, record_llm_waits, TERMINOLOGY
     # from exceptions import ...
 
 # --- Translation Node Implementation ---
 
+def apply_translation_result(state: TranslationState, table, index: int, result: Dict[str, Any], node_name: str):
+    """Stores a translate_chunk_worker result (or its error) in the TRANSLATION/ERROR columns."""
+    total_chunks = table.translatable_count
+    if "error" in result:
+        table.stage(ERROR)[index] = result["error"]
+        log_to_state(state, f"Worker error (Chunk {index + 1}/{total_chunks}): {result['error']}", "ERROR", node=node_name)
+    elif "translated_text" in result:
+        table.stage(TRANSLATION)[index] = result["translated_text"]
+        table.stage(ERROR)[index] = None
+        record_llm_call(state, TRANSLATION, len(table.source_text(index)), result)
+        # Extract additional info from result for logging
+        chunk_size = result.get("chunk_size", "N/A")
+        term_count = result.get("filtered_term_count", "N/A")
+        prompt_chars = result.get("prompt_char_count", "N/A") # Get prompt char count
+        log_to_state(state, f"Successfully translated chunk {index + 1}/{total_chunks} (Size: {chunk_size} chars, Terms: {term_count}, Prompt Chars: {prompt_chars}).", "DEBUG", node=node_name, log_type="LOG_CHUNK_PROCESSING")
+    else:
+        # Should not happen if worker logic is correct, but handle defensively
+        log_to_state(state, f"Worker for chunk {index + 1}/{total_chunks} returned unexpected result: {result}", "WARNING", node=node_name)
+
+
 def run_parallel_translation(state: TranslationState) -> TranslationState:
     """
     Translates document chunks in parallel using worker nodes.
@@ -24,137 +62,423 @@ def run_parallel_translation(state: TranslationState) -> TranslationState:
     This node orchestrates the parallel execution of the `translate_chunk_worker`.
     It prepares inputs for each worker, manages the thread pool, collects results,
     updates the state with translated chunks and aggregated token usage, and logs
-    progress and errors.
+    progress and errors. With CHECKPOINT_BATCH_CHUNKS it translates one batch per
+    run (see `next_batch`).
     """
     NODE_NAME = "run_parallel_translation"
     update_progress(state, NODE_NAME, 20.0) # Example starting progress for this stage
 
     # Get translatable chunks
-    chunks = state.get("chunks")
-    if not chunks:
+    table = state.get("chunk_table")
+    if not table or not table.translatable_count:
         log_to_state(state, "No translatable chunks found to translate.", "ERROR", node=NODE_NAME)
         state["error_info"] = "Cannot translate: No translatable chunks found."
-        # Ensure translated_chunks is empty if chunks are missing
-        state["translated_chunks"] = []
         return state
 
-    # Get chunks with metadata for reference
-    chunks_with_metadata = state.get("chunks_with_metadata", [])
-    
-    if not state.get("translated_chunks"):
-         # Initialize if chunking happened but this somehow got reset
-         state["translated_chunks"] = [None] * len(chunks)
-         log_to_state(state, "Initialized empty translated_chunks list.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
-
+    translations = table.stage(TRANSLATION)
+    errors = table.stage(ERROR)
 
     config = state.get("config", {})
     terminology = state.get("contextualized_glossary", []) # Use the CORRECT key from state.py
     # Add logging to check terminology right after retrieval
     log_to_state(state, f"Retrieved 'contextualized_glossary' from state. Type: {type(terminology)}, Length: {len(terminology) if isinstance(terminology, list) else 'N/A'}", "DEBUG", node=NODE_NAME, log_type="LOG_API_RESPONSES") # Potentially large data
 
-    total_chunks = len(chunks)
-    state["parallel_worker_results"] = [] # Reset results list for this run
+    total_chunks = table.translatable_count
+    # Chunks translated by an earlier run of the job (seeded from job_chunks) are not sent again
+    work = [i for i in range(total_chunks) if translations[i] is None]
+    if len(work) < total_chunks and not has_pending_batch(state, NODE_NAME):
+        log_to_state(state, f"Skipping {total_chunks - len(work)} chunks translated by an earlier run.", "INFO", node=NODE_NAME)
+    batch, remaining = next_batch(state, NODE_NAME, work)
+    done_before = total_chunks - remaining - len(batch)
 
     # Prepare inputs for each worker
     worker_inputs = []
-    for i, chunk_text in enumerate(chunks):
+    for i in batch:
         # Only pass essential state parts to workers
         state_essentials = {
             "config": config,
             "contextualized_glossary": terminology, # Pass using the CORRECT key
             "job_id": state.get("job_id") # Pass job_id for potential logging within worker
         }
-        
-        # Get the original index from chunks_with_metadata if available
-        original_index = -1
-        if chunks_with_metadata:
-            for chunk_meta in chunks_with_metadata:
-                if chunk_meta["toTranslate"] and chunk_meta["chunkText"] == chunk_text:
-                    original_index = chunk_meta["index"]
-                    break
-        
         worker_inputs.append({
             "state": state_essentials,
-            "chunk_text": chunk_text,
+            "chunk_text": table.source_text(i),
             "index": i,
-            "original_index": original_index,
+            "original_index": table.translatable[i], # Row of the chunk among all chunks
             "total_chunks": total_chunks
         })
 
     # Determine max workers (consider API limits and CPU cores)
     # Priority: .env > config > default
-    max_workers_env = os.getenv("MAX_PARALLEL_WORKERS")
-    if max_workers_env is not None:
-        try:
-            configured_max_workers = int(max_workers_env)
-        except ValueError:
-            configured_max_workers = config.get("max_parallel_workers", 5)
-    else:
-        configured_max_workers = config.get("max_parallel_workers", 5)
+    configured_max_workers = get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int)
 
     # Ensure we don't use more workers than chunks
-    actual_workers = min(configured_max_workers, total_chunks)
+    actual_workers = max(1, min(configured_max_workers, len(batch)))
 
-    log_to_state(state, f"Starting parallel translation for {total_chunks} chunks using {actual_workers} workers (max configured: {configured_max_workers}).", "INFO", node=NODE_NAME)
+    if len(batch) < total_chunks:
+        later = f" ({remaining} left for later batches)" if remaining else ""
+        log_to_state(state, f"Starting parallel translation for {len(batch)} of {total_chunks} chunks{later} using {actual_workers} workers (max configured: {configured_max_workers}).", "INFO", node=NODE_NAME)
+    else:
+        log_to_state(state, f"Starting parallel translation for {total_chunks} chunks using {actual_workers} workers (max configured: {configured_max_workers}).", "INFO", node=NODE_NAME)
 
     completed_count = 0
 
-    # Use ThreadPoolExecutor for I/O-bound tasks (like API calls)
-    with concurrent.futures.ThreadPoolExecutor(max_workers=actual_workers) as executor:
+    # Calls go through the process-wide LLM scheduler (at most actual_workers of them at once)
+    with llm_pool(config, actual_workers) as pool:
         # Submit all tasks
-        future_to_index = {executor.submit(translate_chunk_worker, inp): inp["index"] for inp in worker_inputs}
+        future_to_index = {pool.submit(TRANSLATION, translate_chunk_worker, inp): inp["index"] for inp in worker_inputs}
 
         # Process completed futures as they finish
         for future in concurrent.futures.as_completed(future_to_index):
             index = future_to_index[future]
             try:
                 result = future.result()
-                state["parallel_worker_results"].append(result) # Store raw result
-
-
-                if "error" in result:
-                    log_to_state(state, f"Worker error (Chunk {index + 1}/{total_chunks}): {result['error']}", "ERROR", node=NODE_NAME)
-                    
-                elif "translated_text" in result:
-                    state["translated_chunks"][index] = result["translated_text"]
-                    # Extract additional info from result for logging
-                    chunk_size = result.get("chunk_size", "N/A")
-                    term_count = result.get("filtered_term_count", "N/A")
-                    prompt_chars = result.get("prompt_char_count", "N/A") # Get prompt char count
-                    log_to_state(state, f"Successfully translated chunk {index + 1}/{total_chunks} (Size: {chunk_size} chars, Terms: {term_count}, Prompt Chars: {prompt_chars}).", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
-                else:
-                    # Should not happen if worker logic is correct, but handle defensively
-                    log_to_state(state, f"Worker for chunk {index + 1}/{total_chunks} returned unexpected result: {result}", "WARNING", node=NODE_NAME)
+
+                apply_translation_result(state, table, index, result, NODE_NAME)
 
             except Exception as e:
                 # Catch exceptions raised *during* future.result() call (e.g., worker raised unhandled exception)
                 log_to_state(state, f"Exception processing result for chunk {index + 1}/{total_chunks}: {type(e).__name__}: {e}", "ERROR", node=NODE_NAME)
-                state["parallel_worker_results"].append({"index": index, "error": f"Future processing exception: {e}", "node_name": "run_parallel_translation_executor"})
+                errors[index] = f"Future processing exception: {e}"
                 
 
             completed_count += 1
-            current_progress = 20.0 + (completed_count / total_chunks) * 40.0 # Example: translation is 40% of total progress
+            current_progress = 20.0 + ((done_before + completed_count) / total_chunks) * 40.0 # Example: translation is 40% of total progress
             update_progress(state, NODE_NAME, current_progress)
+    record_llm_waits(state, pool)
 
-
-    # Log final aggregated token usage for this node
-
-    # Sanity check: Ensure translated_chunks has the correct length
-    if len(state["translated_chunks"]) != total_chunks:
-        log_to_state(state, f"Mismatch in translated_chunks length! Expected {total_chunks}, got {len(state['translated_chunks'])}", "ERROR", node=NODE_NAME)
-        # Attempt to fix or pad if possible, otherwise flag error
-        # This indicates a potential logic error in the parallel processing loop
-        state["error_info"] = state.get("error_info", "") + " | Length mismatch in translated chunks."
-        # Pad with None to avoid downstream index errors, though data is likely corrupt
-        state["translated_chunks"].extend([None] * (total_chunks - len(state["translated_chunks"])))
-
+    if remaining:
+        return state # The graph runs this node again for the next batch
 
     # Check if any chunks failed (are still None)
-    failed_chunks = [i + 1 for i, chunk in enumerate(state["translated_chunks"]) if chunk is None]
+    failed_chunks = [i + 1 for i, chunk in enumerate(translations) if chunk is None]
     if failed_chunks:
         log_to_state(state, f"Translation failed for chunks: {failed_chunks}", "WARNING", node=NODE_NAME)
         current_error_info = state.get("error_info") or "" # Default to empty string if None or empty
         state["error_info"] = current_error_info + f" | Failed to translate chunks: {failed_chunks}"
 
     update_progress(state, NODE_NAME, 60.0) # Mark end of this stage
-    return state
\ No newline at end of file
+    return state
+
+
+def pipelined_terminology_translation(state: TranslationState) -> TranslationState:
+    """
+    Deep-mode replacement for terminology_unification -> chunk_document -> initial_translation.
+
+    The document is chunked first (cheap, CPU only), then consecutive translatable
+    chunks are grouped into terminology extraction regions. Extraction and translation
+    share one worker pool: as soon as a region's extraction completes, its terms are
+    merged into the glossary and the chunks it covers are released to translation,
+    while extraction of the remaining regions continues. With adaptive sampling the
+    regions are extracted in stratified order and, once discovery flattens out, the
+    chunks of the skipped regions are released at once. In candidates extraction
+    mode the terms are mined from the whole document, so chunks are released when
+    every candidate batch has been answered.
+    """
+    NODE_NAME = "pipelined_terminology_translation"
+    update_progress(state, NODE_NAME, 5.0)
+
+    state = chunk_document(state)
+    if state.get("error_info"):
+        return state
+
+    table = state.get("chunk_table")
+    if not table or not table.translatable_count:
+        log_to_state(state, "No translatable chunks found to translate.", "ERROR", node=NODE_NAME)
+        state["error_info"] = "Cannot translate: No translatable chunks found."
+        return state
+
+    config = state.get("config", {})
+    total_chunks = table.translatable_count
+    translations = table.stage(TRANSLATION)
+    chunks = table.source_texts()
+
+    region_size = get_setting(config, "TERMINOLOGY_EXTRACTION_CHUNK_SIZE", None, 8000, int)
+    if region_size <= 0:
+        region_size = 8000
+    regions = build_terminology_regions(chunks, region_size)
+
+    extraction_mode = terminology_extraction_mode(state, config, NODE_NAME)
+    if extraction_mode == "candidates":
+        requests = candidate_worker_inputs(state, config, [region["text"] for region in regions], NODE_NAME)
+        worker_fn = terminology_candidate_worker
+    else:
+        requests = [{"config": config, "chunk_text": region["text"], "index": i} for i, region in enumerate(regions)]
+        worker_fn = terminology_extraction_worker
+
+    # Determine max workers (env > config > default)
+    configured_max_workers = get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int)
+    actual_workers = max(1, min(configured_max_workers, total_chunks + len(requests)))
+    sampling = terminology_sampling(config, extraction_mode, len(requests), actual_workers)
+
+    log_to_state(state, f"Starting pipelined terminology extraction ({extraction_mode} mode, {len(requests)} requests for {len(regions)} regions{', adaptive sampling' if sampling else ''}) and translation ({total_chunks} chunks) using {actual_workers} workers (max configured: {configured_max_workers}).", "INFO", node=NODE_NAME)
+
+    glossary = []
+    seen_terms = set()
+    pending_requests = deque(stratified_order(len(requests)) if sampling else range(len(requests)))
+    ready_chunks = deque()  # Chunk indices whose regions are done, waiting for a worker
+    completed_count = sum(1 for t in translations if t is not None) # Seeded from an earlier run
+    pipeline_start = time.time()
+    first_translation_start = None
+    extraction_end = None
+
+    def release(region_indices):
+        # Queue the chunks of the regions for translation (except those translated by
+        # an earlier run of the job)
+        for region_index in region_indices:
+            ready_chunks.extend(i for i in regions[region_index]["chunk_indices"] if translations[i] is None)
+
+    if not requests:
+        release(range(len(regions))) # No candidates mined: nothing to wait for
+
+    def submit_next(pool, in_flight):
+        # Released chunks go first so translation starts as early as possible
+        nonlocal first_translation_start
+        if ready_chunks:
+            index = ready_chunks.popleft()
+            worker_input = {
+                "state": {
+                    "config": config,
+                    "contextualized_glossary": list(glossary), # Snapshot of the glossary so far
+                    "job_id": state.get("job_id")
+                },
+                "chunk_text": chunks[index],
+                "index": index,
+                "original_index": table.translatable[index],
+                "total_chunks": total_chunks
+            }
+            if first_translation_start is None:
+                first_translation_start = time.time()
+            in_flight[pool.submit(TRANSLATION, translate_chunk_worker, worker_input)] = ("translate", index)
+            return True
+        if pending_requests:
+            request_index = pending_requests.popleft()
+            in_flight[pool.submit(TERMINOLOGY, worker_fn, requests[request_index])] = ("extract", request_index)
+            return True
+        return False
+
+    with llm_pool(config, actual_workers) as pool:
+        in_flight = {}
+        while len(in_flight) < actual_workers and submit_next(pool, in_flight):
+            pass
+
+        while in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                kind, index = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"index": index, "error": f"Future processing exception: {e}", "node_name": NODE_NAME}
+
+                if kind == "extract":
+                    if "error" in result:
+                        log_to_state(state, f"Terminology worker error (Request {index + 1}/{len(requests)}): {result['error']}", "ERROR", node=NODE_NAME)
+                    terms = result.get("terms", [])
+                    for entry in terms:
+                        source_term = entry.get("sourceTerm")
+                        if isinstance(source_term, str) and source_term.strip() and source_term not in seen_terms:
+                            seen_terms.add(source_term)
+                            glossary.append(entry)
+                    extraction_done = not pending_requests and not any(k == "extract" for k, _ in in_flight.values())
+                    # The request is resolved (even on error): release the chunks of its region,
+                    # or of every region once the last candidate batch is answered
+                    if extraction_mode == "candidates":
+                        if extraction_done:
+                            release(range(len(regions)))
+                    else:
+                        release([index])
+                        log_to_state(state, f"Terminology region {index + 1}/{len(regions)} done, released {len(regions[index]['chunk_indices'])} chunks. Glossary size: {len(glossary)}.", "DEBUG", node=NODE_NAME, log_type="LOG_CHUNK_PROCESSING")
+                    if sampling:
+                        rate = record_sampled_region(sampling, [] if "error" in result else terms, extraction_done)
+                        if rate is not None and pending_requests and sampling_should_stop(sampling):
+                            # Skip the remaining regions; their chunks go straight to translation
+                            sampling["stopped_early"] = True
+                            release(pending_requests)
+                            pending_requests.clear()
+                            extraction_done = not any(k == "extract" for k, _ in in_flight.values())
+                    if extraction_done:
+                        extraction_end = time.time()
+                else:
+                    apply_translation_result(state, table, index, result, NODE_NAME)
+                    completed_count += 1
+                    update_progress(state, NODE_NAME, 20.0 + (completed_count / total_chunks) * 40.0)
+
+            while len(in_flight) < actual_workers and submit_next(pool, in_flight):
+                pass
+    record_llm_waits(state, pool)
+
+    state["contextualized_glossary"] = glossary
+    if sampling:
+        metrics = state.get("metrics")
+        if isinstance(metrics, dict):
+            metrics["terminology_sampling"] = terminology_sampling_report(sampling)
+        log_sampling_outcome(state, sampling, NODE_NAME)
+    elapsed = time.time() - pipeline_start
+    overlap = 0.0
+    if first_translation_start is not None and extraction_end is not None:
+        overlap = max(0.0, extraction_end - first_translation_start)
+    log_to_state(state, f"Pipelined extraction/translation finished in {elapsed:.2f}s. Unique terms: {len(glossary)}. Extraction/translation overlap: {overlap:.2f}s.", "INFO", node=NODE_NAME)
+
+    failed_chunks = [i + 1 for i, chunk in enumerate(translations) if chunk is None]
+    if failed_chunks:
+        log_to_state(state, f"Translation failed for chunks: {failed_chunks}", "WARNING", node=NODE_NAME)
+        current_error_info = state.get("error_info") or ""
+        state["error_info"] = current_error_info + f" | Failed to translate chunks: {failed_chunks}"
+
+    update_progress(state, NODE_NAME, 60.0)
+    return state
+
+
+def streaming_deep_translation(state: TranslationState) -> TranslationState:
+    """
+    Deep-mode replacement for initial_translation -> critique_stage -> final_translation
+    (STREAMING_DEEP_PIPELINE).
+
+    The three stages share one pool of MAX_PARALLEL_WORKERS workers and no longer
+    wait for each other: a chunk is sent to critique as soon as its translation
+    lands and to refinement as soon as its critique lands. Free workers take the
+    most advanced work first (refinement, then critique, then a new translation),
+    so finished chunks leave the pipeline early. Only the slowest chunk of the
+    whole job is waited for, instead of the slowest chunk of every stage. Results
+    are stored in the same chunk table columns as the separate nodes. With
+    REVIEW_MODE=fused_review a chunk goes from translation to one fused review call.
+    """
+    NODE_NAME = "streaming_deep_translation"
+    update_progress(state, NODE_NAME, 20.0)
+
+    table = state.get("chunk_table")
+    if not table or not table.translatable_count:
+        log_to_state(state, "No translatable chunks found to translate.", "ERROR", node=NODE_NAME)
+        state["error_info"] = "Cannot translate: No translatable chunks found."
+        return state
+
+    config = state.get("config", {})
+    total_chunks = table.translatable_count
+    translations = table.stage(TRANSLATION)
+    critiques = table.stage(CRITIQUE)
+    final_chunks = table.stage(FINAL)
+    review_essentials = _review_essentials(state)
+    gate = refinement_gate(config)
+    fused = review_mode(config) == "fused_review"
+    review_stages = (TRANSLATION, REVIEW) if fused else (TRANSLATION, CRITIQUE, FINAL)
+    translate_essentials = {
+        "config": config,
+        "contextualized_glossary": state.get("contextualized_glossary", []),
+        "job_id": state.get("job_id")
+    }
+
+    configured_max_workers = get_setting(config, "MAX_PARALLEL_WORKERS", "max_parallel_workers", 5, int)
+    actual_workers = max(1, min(configured_max_workers, total_chunks))
+    log_to_state(state, f"Starting streaming translation, critique and refinement for {total_chunks} chunks using {actual_workers} workers (max configured: {configured_max_workers}).", "INFO", node=NODE_NAME)
+
+    pending = deque()  # Chunks still to translate, in document order
+    critique_ready = deque()  # Translated chunks waiting for a critique worker
+    refine_ready = deque()  # Critiqued chunks waiting for a refinement worker
+    stage_done = {stage: 0 for stage in review_stages}
+    skipped_refinements = 0  # Critiqued chunks that passed the refinement gate
+    saved_tokens = 0
+    reused = 0  # Stage results seeded from an earlier run of the job (job_chunks)
+    for index in range(total_chunks):
+        if translations[index] is None:
+            pending.append(index)
+        elif critiques[index] is None or (fused and final_chunks[index] is None):
+            critique_ready.append(index)
+            reused += 1
+        elif final_chunks[index] is not None:
+            reused += len(review_stages)
+        elif needs_refinement(critiques[index], gate):
+            refine_ready.append(index)
+            reused += 2
+        else:
+            final_chunks[index] = translations[index]
+            skipped_refinements += 1
+            reused += 2
+    if reused:
+        log_to_state(state, f"Reusing {reused} stage results of an earlier run.", "INFO", node=NODE_NAME)
+    stage_end = {}  # Time the latest chunk of each stage completed
+    pipeline_start = time.time()
+
+    def submit_next(pool, in_flight):
+        if refine_ready:
+            index = refine_ready.popleft()
+            in_flight[pool.submit(FINAL, _finalize_chunk_worker, refinement_input(review_essentials, table, index))] = (FINAL, index)
+        elif critique_ready:
+            index = critique_ready.popleft()
+            if fused:
+                in_flight[pool.submit(REVIEW, _fused_review_chunk_worker, critique_input(review_essentials, table, index))] = (REVIEW, index)
+            else:
+                in_flight[pool.submit(CRITIQUE, _critique_chunk_worker, critique_input(review_essentials, table, index))] = (CRITIQUE, index)
+        elif pending:
+            index = pending.popleft()
+            worker_input = {
+                "state": translate_essentials,
+                "chunk_text": table.source_text(index),
+                "index": index,
+                "original_index": table.translatable[index], # Row of the chunk among all chunks
+                "total_chunks": total_chunks
+            }
+            in_flight[pool.submit(TRANSLATION, translate_chunk_worker, worker_input)] = (TRANSLATION, index)
+        else:
+            return False
+        return True
+
+    with llm_pool(config, actual_workers) as pool:
+        in_flight = {}
+        while len(in_flight) < actual_workers and submit_next(pool, in_flight):
+            pass
+
+        while in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage, index = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    log_to_state(state, f"Exception processing {stage} result for chunk {index + 1}: {type(e).__name__}: {e}", "ERROR", node=NODE_NAME)
+                    result = {"index": index, "error": f"Future processing exception: {e}", "node_name": NODE_NAME}
+
+                if stage == TRANSLATION:
+                    apply_translation_result(state, table, index, result, NODE_NAME)
+                    if translations[index] is not None:
+                        critique_ready.append(index)
+                    else:
+                        critiques[index] = {"error": "Critique skipped due to failed translation"}
+                elif stage == REVIEW:
+                    apply_fused_review_result(state, table, index, result, NODE_NAME)
+                elif stage == CRITIQUE:
+                    apply_critique_result(state, table, index, result, NODE_NAME)
+                    # Same rule as final_translation_node: chunks whose critique passes the gate keep their translation
+                    if critiques[index] is not None and needs_refinement(critiques[index], gate):
+                        refine_ready.append(index)
+                    elif critiques[index] is not None:
+                        final_chunks[index] = translations[index]
+                        skipped_refinements += 1
+                        saved_tokens += skipped_refinement_tokens(table, index)
+                else:
+                    apply_refinement_result(state, table, index, result, NODE_NAME)
+
+                stage_done[stage] += 1
+                stage_end[stage] = time.time() - pipeline_start
+                update_progress(state, NODE_NAME, 20.0 + (sum(stage_done.values()) + skipped_refinements + reused) / (len(review_stages) * total_chunks) * 75.0)
+
+            while len(in_flight) < actual_workers and submit_next(pool, in_flight):
+                pass
+    record_llm_waits(state, pool)
+
+    elapsed = time.time() - pipeline_start
+    stage_times = ", ".join(f"{stage} {stage_end[stage]:.2f}s" for stage in review_stages if stage in stage_end)
+    stage_counts = ", ".join(f"{stage} {stage_done[stage]}" for stage in review_stages)
+    log_to_state(state, f"Streaming pipeline finished in {elapsed:.2f}s (last chunk done per stage: {stage_times}). Chunks done per stage: {stage_counts}.", "INFO", node=NODE_NAME)
+    if not fused:
+        record_refinement_gate(state, stage_done[FINAL], skipped_refinements, saved_tokens, NODE_NAME)
+    log_review_cost(state, NODE_NAME)
+
+    failed_chunks = [i + 1 for i, chunk in enumerate(translations) if chunk is None]
+    if failed_chunks:
+        log_to_state(state, f"Translation failed for chunks: {failed_chunks}", "WARNING", node=NODE_NAME)
+        current_error_info = state.get("error_info") or ""
+        state["error_info"] = current_error_info + f" | Failed to translate chunks: {failed_chunks}"
+
+    update_progress(state, NODE_NAME, 95.0)
+    return state
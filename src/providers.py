@@ -1,5 +1,5 @@
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -146,6 +146,14 @@ def _initialize_openai_compatible(
 
 # --- Main Client Factory Function ---
 
+def resolve_provider_model(config: Dict[str, Any], role: str = "default") -> Tuple[str, str]:
+    """(provider, model name) that get_llm_client() uses for `config` and `role`."""
+    role_prefix = f"{role.upper()}_" if role != "default" else ""
+    provider = config.get(f"{role_prefix}provider") or config.get("provider", "openai")
+    provider = provider.lower()
+    return provider, _resolve_model_name(provider, config, role_prefix)
+
+
 def get_llm_client(config: Dict[str, Any], role: str = "default") -> BaseChatModel:
     """
     Initializes and returns a Langchain Chat Model client based on config and role.
@@ -158,9 +166,7 @@ def get_llm_client(config: Dict[str, Any], role: str = "default") -> BaseChatMod
     """
     # Get role-specific config with fallback to default
     role_prefix = f"{role.upper()}_" if role != "default" else ""
-    provider = config.get(f"{role_prefix}provider") or config.get("provider", "openai")
-    provider = provider.lower()
-    model_name = _resolve_model_name(provider, config, role_prefix)
+    provider, model_name = resolve_provider_model(config, role)
     api_key_source = config.get(f"{role_prefix}api_key_source") or config.get("api_key_source", "env")
     temperature = config.get(f"{role_prefix}temperature") or config.get("temperature", 0.2)
 
@@ -5,6 +5,7 @@ import os
 import logging
 import time
 from datetime import datetime
+from typing import Any, Dict, Optional
 load_dotenv() # Load environment variables from .env file
 
 # --- Setup file logger ---
@@ -40,7 +41,10 @@ import queue
 import copy
 from . import graph
 from .state import TranslationState
+from .chunk_table import ChunkTable, TRANSLATION, FINAL
 from .utils import update_progress
+from .checkpoints import run_config, delete_checkpoints
+from .llm_scheduler import get_llm_scheduler
 from fastapi.responses import HTMLResponse, FileResponse # Add FileResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
@@ -59,6 +63,7 @@ from .database import (
     get_default_glossary,
     get_job as db_get_job, # Avoid name clash with endpoint
     delete_job as db_delete_job,
+    update_job as db_update_job,
     get_logs as db_get_logs,
     get_chunks as db_get_chunks,
     get_glossary as db_get_job_glossary, # Avoid name clash
@@ -83,6 +88,13 @@ job_queue = JobQueue()
 worker = TranslationWorker()
 
 
+def _state_json_default(value):
+    """JSON fallback for graph state values: chunk tables as lists, anything else as str."""
+    if isinstance(value, ChunkTable):
+        return value.legacy_lists()
+    return str(value)
+
+
 try:
     from .graph import app as langgraph_app # Use relative import
     from .state import TranslationState     # Use relative import
@@ -295,14 +307,69 @@ async def create_job(request: Request):
     else:
         logger.info(f"Using explicitly provided translation_mode: {data['config']['translation_mode']}")
 
-    # 7. Enqueue job
+    # 7. Incremental re-translation of an edited document
+    base_job_id = data.get("base_job_id") or data['config'].get("base_job_id")
+    if base_job_id:
+        error = await _incremental_job_config(base_job_id, data['config'])
+        if error is not None:
+            return error
+
+    # 8. Enqueue job
     job_id = await job_queue.enqueue_job(data)
-    return {
+    response = {
         "job_id": job_id,
         "status": "pending",
         "glossary_used": glossary_source,
         "translation_mode": data['config']['translation_mode']
     }
+    if base_job_id:
+        response["base_job_id"] = base_job_id
+    return response
+
+# Job config keys that decide how a document is chunked; an incremental job uses
+# its base job's values so that unchanged text is chunked the same way
+CHUNKING_CONFIG_KEYS = ("chunking_algorithm", "symbol_separators", "symbol_keep_separators",
+                        "chunk_merge_strategy", "base_chunk_sizes")
+
+async def _incremental_job_config(base_job_id: str, config: Dict[str, Any]) -> Optional[JSONResponse]:
+    """
+    Prepares the config of a job that re-translates an edited version of the base
+    job's document: records base_job_id (the worker then reuses the base job's
+    stored chunk outputs for the unchanged chunks) and copies the base job's chunking
+    settings, with chunk sizes chosen by auto-tuning as base_chunk_sizes. Returns an
+    error response if the base job does not exist, is still queued or running, or
+    translated into another language.
+    """
+    base_job = await db_get_job(base_job_id)
+    if not base_job:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "base_job_not_found", "detail": f"Base job {base_job_id} not found"}
+        )
+    if base_job["status"] in ("pending", "processing"):
+        return JSONResponse(
+            status_code=409,
+            content={"error": "base_job_not_finished", "detail": f"Base job {base_job_id} is {base_job['status']}"}
+        )
+    base_config = json.loads(base_job["config_json"]) if base_job.get("config_json") else {}
+    for key in ("source_lang", "target_lang", "target_language_accent"):
+        if config.get(key, base_config.get(key)) != base_config.get(key):
+            return JSONResponse(
+                status_code=400,
+                content={"error": "base_job_mismatch", "detail": f"Base job {base_job_id} has {key} '{base_config.get(key)}', not '{config.get(key)}'"}
+            )
+    for key in CHUNKING_CONFIG_KEYS:
+        if key in base_config:
+            config[key] = base_config[key]
+    base_metrics = await db_get_metrics(base_job_id) or {}
+    autotune = base_metrics.get("chunk_autotune")
+    if isinstance(autotune, dict) and "base_chunk_sizes" not in base_config:
+        # Only used with base_job_id: a fresh job copying this config auto-tunes again
+        config["base_chunk_sizes"] = {"max_chunk_size": autotune["max_chunk_size"], "min_chunk_size": autotune["min_chunk_size"]}
+    config["base_job_id"] = base_job_id
+    chunking = {key: config[key] for key in CHUNKING_CONFIG_KEYS if key in config}
+    logger.info(f"Incremental job on base job {base_job_id}, chunking settings {chunking}")
+    return None
 
 @app.get("/jobs", tags=["Jobs"])
 async def list_jobs(limit: int = 100, offset: int = 0):
@@ -457,6 +524,7 @@ async def delete_job_endpoint(job_id: str):
     # Delete the job
     success = await db_delete_job(job_id)
     if success:
+        delete_checkpoints(graph.memory, job_id)
         return JSONResponse(
             status_code=200,
             content={"detail": f"Job {job_id} deleted successfully"}
@@ -467,6 +535,29 @@ async def delete_job_endpoint(job_id: str):
             content={"detail": f"Failed to delete job {job_id}"}
         )
 
+@app.post("/jobs/{job_id}/retry", tags=["Jobs"])
+async def retry_job_endpoint(job_id: str):
+    """
+    Queues a failed job again. The worker reuses the chunks the failed run already
+    translated, critiqued or refined (job_chunks) and only processes the rest.
+    """
+    job = await db_get_job(job_id)
+    if not job:
+        return JSONResponse(
+            status_code=404,
+            content={"detail": f"Job {job_id} not found"}
+        )
+    if job["status"] != "failed":
+        return JSONResponse(
+            status_code=409,
+            content={"detail": f"Job {job_id} is {job['status']}; only failed jobs can be retried"}
+        )
+
+    await db_update_job(job_id, {"status": "pending", "error_info": None, "progress_percent": 0.0, "current_step": "retry"})
+    chunks = await db_get_chunks(job_id)
+    reusable = sum(1 for chunk in chunks if chunk.get("translated_chunk"))
+    return {"job_id": job_id, "status": "pending", "stored_chunks": len(chunks), "reusable_translations": reusable}
+
 @app.get("/jobs/{job_id}/stream", tags=["Jobs"])
 async def stream_job_updates(job_id: str):
     """Stream updates for a specific job."""
@@ -534,6 +625,11 @@ async def health():
     """Basic health check endpoint."""
     return {"status": "ok"}
 
+@app.get("/health/llm-scheduler", tags=["Health"])
+async def llm_scheduler_stats():
+    """Queue depth, active LLM calls (by stage and provider) and queue waits of the shared LLM scheduler."""
+    return get_llm_scheduler().stats()
+
 @app.get("/providers", tags=["Providers"])
 async def get_providers():
     return list_available_providers()
@@ -718,11 +814,16 @@ async def stream_translation(
         result_holder = {}
 
         def run_workflow():
+            # Checkpoints are kept under the thread_id from the config; without one the
+            # run checkpoints under its run_id, and they are deleted when it ends. A
+            # thread_id run keeps them only to resume after a failure
+            configurable = config_obj.get("configurable") if isinstance(config_obj, dict) else None
+            thread_id = (configurable or {}).get("thread_id") or run_id
             try:
                 # Pass the callback handler to the graph/app
                 final_state = graph.app.invoke(
                     input_obj,
-                    config={"callbacks": [ProgressHandler()]}
+                    config=run_config(thread_id, [ProgressHandler()])
                 )
                 # Always put the final state in the queue, even if callback missed it
                 import logging
@@ -749,12 +850,10 @@ async def stream_translation(
 
                 # Ensure final_document is present
                 if not final_state_dict.get("final_document"):
-                    if final_state_dict.get("final_chunks"):
-                        final_state_dict["final_document"] = "\n".join(final_state_dict["final_chunks"])
-                    elif final_state_dict.get("parallel_worker_results"):
+                    table = final_state_dict.get("chunk_table")
+                    if table and (table.has_stage(FINAL) or table.has_stage(TRANSLATION)):
                         final_state_dict["final_document"] = "\n".join(
-                            r.get("refined_text") or r.get("initial_translation") or ""
-                            for r in final_state_dict.get("parallel_worker_results", []) # Add default empty list
+                            table.output(i) or "" for i in range(table.translatable_count)
                         )
                     else:
                         final_state_dict["final_document"] = None
@@ -774,6 +873,9 @@ async def stream_translation(
                 logging.getLogger("turjuman").exception("Error during workflow execution or final state processing:")
                 result_holder["error"] = str(e)
                 state_queue.put({"error": str(e)})
+            finally:
+                if thread_id == run_id or "final" in result_holder:
+                    delete_checkpoints(graph.memory, thread_id)
 
         t = threading.Thread(target=run_workflow)
         t.start()
@@ -802,7 +904,7 @@ async def stream_translation(
                             "feedback_tokens": feedback_tokens
                         }
                     }
-                    yield f"data: {json.dumps(wrapped, default=str)}\n\n"
+                    yield f"data: {json.dumps(wrapped, default=_state_json_default)}\n\n"
                     queues_were_empty = False
                 except queue.Empty:
                     break # Should not happen with check, but safety
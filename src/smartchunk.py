@@ -1,5 +1,31 @@
 import re
+import bisect
+import codecs
 import math # Not directly used now, but kept for potential future use
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+try:
+    from .source_buffer import ChunkSpan
+except ImportError: # Fallback for direct script execution
+    from source_buffer import ChunkSpan
+
+try:
+    from markdown_it import MarkdownIt
+except ImportError: # markdown_ast mode needs markdown-it-py
+    MarkdownIt = None
+
+try:
+    import re2
+except ImportError: # regex_engine="re2" needs google-re2
+    re2 = None
+
+RE2_AVAILABLE = re2 is not None
+
+# Bump whenever a change alters the chunks produced for some input, so cached
+# chunking results (see chunk_cache.py) from older versions are not reused
+CHUNKER_VERSION = 2
 
 class SmartChunker:
     """
@@ -8,11 +34,31 @@ class SmartChunker:
     translatable text segments.
     """
 
-    def __init__(self, min_chunk_size: int = 50, max_chunk_size: int = 500, mode: str = "smart", separators: list = None):
+    # chunk_parallel(): smallest segment worth a worker process
+    PARALLEL_MIN_SEGMENT = 1 << 18
+
+    def __init__(self, min_chunk_size: int = 50, max_chunk_size: int = 500, mode: str = "smart", separators: list = None,
+                 keep_separators: bool = False, regex_engine: str = "re", merge_strategy: str = "greedy"):
         # Validate mode
-        valid_modes = ["smart", "line", "symbol", "subtitle_srt"]
+        valid_modes = ["smart", "line", "symbol", "subtitle_srt", "markdown_ast"]
         if mode not in valid_modes:
             raise ValueError(f"mode must be one of {valid_modes}")
+        if mode == "markdown_ast" and MarkdownIt is None:
+            raise ImportError("markdown_ast mode requires markdown-it-py (pip install markdown-it-py)")
+        # Smart mode pattern scan: "re" (standard library), "re2" (google-re2, linear
+        # time) or "auto" (re2 when installed)
+        valid_engines = ["re", "re2", "auto"]
+        if regex_engine not in valid_engines:
+            raise ValueError(f"regex_engine must be one of {valid_engines}")
+        if regex_engine == "re2" and re2 is None:
+            raise ImportError("regex_engine 're2' requires google-re2 (pip install google-re2)")
+        self.regex_engine = "re2" if regex_engine == "auto" and re2 is not None else regex_engine.replace("auto", "re")
+        # Merging of translatable pieces between non-translatable chunks: "greedy"
+        # (fill each chunk in turn) or "balanced" (fewest chunks, then the most even sizes)
+        valid_strategies = ["greedy", "balanced"]
+        if merge_strategy not in valid_strategies:
+            raise ValueError(f"merge_strategy must be one of {valid_strategies}")
+        self.merge_strategy = merge_strategy
         
         self.mode = mode
         
@@ -25,6 +71,16 @@ class SmartChunker:
             else:
                 # Default separators for symbol mode
                 self.separators = ["."] # Default separator is just a dot
+            # One alternation of all separators, longest first (captured to keep them)
+            alternatives = sorted({sep for sep in self.separators if sep}, key=len, reverse=True)
+            single = [sep for sep in alternatives if len(sep) == 1]
+            longer = [re.escape(sep) for sep in alternatives if len(sep) > 1]
+            # Single characters go last, as one character class
+            if single:
+                longer.append("[" + "".join(re.escape(sep) for sep in single) + "]")
+            alternation = "|".join(longer) or "(?!)"
+            self._symbol_pattern = re.compile(f"({alternation})" if keep_separators else alternation)
+            self._symbol_max_len = len(alternatives[0]) if alternatives else 1
         else:
             # Default separators for other modes (not used but kept for consistency)
             self.separators = separators or [
@@ -36,6 +92,9 @@ class SmartChunker:
                 ""
             ]
         
+        # Symbol mode: keep each separator at the end of the chunk it closes
+        self.keep_separators = bool(keep_separators)
+
         # Validate min_chunk_size and max_chunk_size
         if not isinstance(min_chunk_size, int) or min_chunk_size <= 0:
             raise ValueError("min_chunk_size must be a positive integer")
@@ -49,14 +108,14 @@ class SmartChunker:
 
         # 1. Fenced Code Blocks - Most distinct block element
         self.regex_code_fenced = re.compile(
-            r"""^(```|~~~)                 # G1: Opening fence type (``` or ~~~)
+            r"""^(?P<fence>```|~~~)        # G1: Opening fence type (``` or ~~~)
                  [ \t]*                    # Optional spaces/tabs
                  ([\w\-\+]+)?              # G2: Optional language identifier
                  [ \t]*                    # Optional spaces/tabs
                  \n                        # Newline
                  (.*?)                     # G3: Code content
                  \n\s*                     # Newline ending content, optional whitespace before closing fence
-                 \1                        # Matching closing fence (\1)
+                 (?P=fence)                # Matching closing fence (G1)
                  [ \t]*                    # Optional trailing space/tabs on closing fence line
                  $                         # End of line
             """,
@@ -117,7 +176,7 @@ class SmartChunker:
         # 8. Footnote references - Should not be translated
         self.regex_footnote_ref = re.compile(
             r"""
-            ^\s*\[(\^[0-9]+)\]:      # G1: Footnote reference marker with optional leading whitespace (e.g., [^1]:)
+            ^[^\S\n]*\[(\^[0-9]+)\]: # G1: Footnote reference marker with optional leading whitespace (e.g., [^1]:)
             """,
             re.MULTILINE | re.VERBOSE
         )
@@ -135,34 +194,65 @@ class SmartChunker:
             'footnote_ref': self.regex_footnote_ref
         }
         
-        # Create a combined pattern for initial splitting
-        combined_patterns_list = [p.pattern for p in self.pattern_dict.values()]
+        # Chunk type for each named pattern
+        self.pattern_types = {
+            'fenced_code': 'code',
+            'html_code': 'code',
+            'html_image': 'image',
+            'markdown_image': 'image',
+            'markdown_link': 'url',
+            'inline_code': 'code',
+            'standalone_url': 'url',
+            'footnote_ref': 'footnote'
+        }
+
+        # Create a combined pattern for initial splitting. Every alternative ends with an
+        # empty named group, so `match.lastgroup` tells which pattern fired without
+        # re-matching. The marker only runs once an alternative has matched, which keeps
+        # the scan as fast as plain non-capturing alternatives.
+        # The leading guard skips positions where no alternative can start: patterns
+        # either begin at a line start (fenced code, footnotes) or with one of these
+        # characters (`, <, !, [ and h/f/w for standalone URLs).
         self.combined_pattern = re.compile(
-            "|".join(f"(?:{p})" for p in combined_patterns_list),
+            r"(?:^|(?=[`<!\[hfw]))(?:"
+            + "|".join(f"(?:(?:{p.pattern}\n)(?P<{name}>))" for name, p in self.pattern_dict.items())
+            + ")",
             re.MULTILINE | re.DOTALL | re.IGNORECASE | re.VERBOSE
         )
 
+        # Guards for the standard library engine (see `_scan`): closing fence lines
+        # and closing HTML code tags
+        self._closing_fence = re.compile(r"^[^\S\n]*(?:```|~~~)[ \t]*$", re.MULTILINE)
+        self._closing_html_code = re.compile(r"</(?:pre|code)>", re.IGNORECASE)
+        self._guarded_patterns = {frozenset(self.pattern_dict): self.combined_pattern}
+        self._re2_pattern = self._compile_re2() if self.regex_engine == "re2" else None
+
+        # Streaming support (chunk_iter): openers of elements that may span many lines,
+        # and how much text must follow a match before it is final
+        self._block_opener = re.compile(r"^(?:```|~~~)|<(?:pre|code)\b", re.MULTILINE | re.IGNORECASE)
+        self._paragraph_break = re.compile(r"\n[ \t]*\n")
+        self._srt_entry_break = re.compile(r"\n\s*\n")
+        # Parallel split points: a blank line followed by a line that does not start
+        # a list item, quote, table, HTML block, fence, link definition or indented code
+        self._parallel_split = re.compile(r"\n[ \t]*\n(?=[^\s\-*+>|<`~\[\d])")
+        self._stream_lookahead = max(1 << 14, 4 * self.max_chunk_size)
+        # markdown_ast mode: CommonMark parser and the paragraph text taken for a bare URL
+        self._markdown = MarkdownIt("commonmark") if mode == "markdown_ast" else None
+        # Sentence ends for splitting long text (_split_large_text_chunk)
+        self._sentence_end = re.compile(r"[.!?](?=\s|$)")
+        self._bare_url = re.compile(r"(?:https?://|ftp://|www\.)\S+")
+
     def _identify_chunk_type(self, match: re.Match) -> tuple[str, str, bool]:
         """
         Determine chunk type and translate flag based on the matched pattern.
-        Uses a more readable approach with pattern characteristics instead of group indices.
+        Matches from the combined pattern are classified by their named group;
+        pattern characteristics are used as a fallback for other matches.
         """
-        # Get the full matched text using a more descriptive approach
-        matched_text = match.string[match.start():match.end()]
-        
-        # Try each pattern individually to identify the type
-        for pattern_name, pattern in self.pattern_dict.items():
-            if pattern.match(matched_text):
-                # Map pattern names to chunk types and translate flags
-                if pattern_name == 'fenced_code' or pattern_name == 'html_code' or pattern_name == 'inline_code':
-                    return matched_text, "code", False
-                elif pattern_name == 'html_image' or pattern_name == 'markdown_image':
-                    return matched_text, "image", False
-                elif pattern_name == 'markdown_link' or pattern_name == 'standalone_url':
-                    return matched_text, "url", False
-                elif pattern_name == 'footnote_ref':
-                    return matched_text, "footnote", False
-        
+        matched_text = match.group()
+        chunk_type = self.pattern_types.get(match.lastgroup)
+        if chunk_type:
+            return matched_text, chunk_type, False
+
         # Fallback to pattern characteristics if the pattern matching fails
         if matched_text.startswith(('```', '~~~')):
             return matched_text, "code", False  # Fenced code block
@@ -189,11 +279,16 @@ class SmartChunker:
         """
         Splits a text chunk larger than max_chunk_size.
         Tries to split by paragraphs (\n\n), then sentences (. ! ?), then words.
+
+        Paragraph and sentence boundaries are found once for the whole text and
+        looked up per window with bisect; word boundaries are the last space or
+        newline in the window.
         """
         if len(text) <= self.max_chunk_size:
             stripped_text = text.strip()
             return [stripped_text] if stripped_text else []
 
+        paragraphs, sentences = self._text_boundaries(text)
         chunks = []
         current_pos = 0
         while current_pos < len(text) and text[current_pos].isspace():
@@ -203,33 +298,24 @@ class SmartChunker:
             end_pos = min(current_pos + self.max_chunk_size, len(text))
 
             if end_pos == len(text):
-                chunk = text[current_pos:]
-                if chunk.strip(): chunks.append(chunk.strip())
-                current_pos = end_pos
-                continue
+                chunk = text[current_pos:].strip()
+                if chunk: chunks.append(chunk)
+                break
 
-            split_pos = -1
-            para_break = text.rfind('\n\n', current_pos, end_pos)
-            if para_break > current_pos and para_break + 2 <= end_pos:
-                split_pos = para_break + 2
+            # Last paragraph break that ends inside the window
+            found = bisect.bisect_right(paragraphs, end_pos - 2) - 1
+            if found >= 0 and paragraphs[found] > current_pos:
+                split_pos = paragraphs[found] + 2
+            elif text[end_pos - 1] in ".!?":
+                # Punctuation closing the window counts as a sentence end
+                split_pos = end_pos
             else:
-                sentence_break = -1
-                for match in re.finditer(r'[.!?](?=\s|\n|$)', text[current_pos:end_pos]):
-                     potential_break = current_pos + match.end()
-                     if potential_break > current_pos : sentence_break = max(sentence_break, potential_break)
-
-                if sentence_break > current_pos:
-                    split_pos = sentence_break
+                found = bisect.bisect_right(sentences, end_pos - 2) - 1
+                if found >= 0 and sentences[found] >= current_pos:
+                    split_pos = sentences[found] + 1
                 else:
-                    space_break = text.rfind(' ', current_pos, end_pos)
-                    newline_break = text.rfind('\n', current_pos, end_pos)
-                    word_break = max(space_break, newline_break)
-                    if word_break > current_pos and word_break + 1 <= end_pos :
-                        split_pos = word_break + 1
-
-                    if split_pos == -1: split_pos = end_pos
-
-            if split_pos == -1: split_pos = end_pos
+                    word_break = max(text.rfind(' ', current_pos, end_pos), text.rfind('\n', current_pos, end_pos))
+                    split_pos = word_break + 1 if word_break > current_pos else end_pos
 
             chunk = text[current_pos:split_pos].strip()
             if chunk: chunks.append(chunk)
@@ -238,7 +324,17 @@ class SmartChunker:
             while current_pos < len(text) and text[current_pos].isspace():
                 current_pos += 1
 
-        return [c for c in chunks if c]
+        return chunks
+
+    def _text_boundaries(self, text: str) -> tuple[list[int], list[int]]:
+        """Sorted start offsets of every '\n\n' (overlapping) and of every sentence-ending . ! ?"""
+        paragraphs = []
+        position = text.find('\n\n')
+        while position >= 0:
+            paragraphs.append(position)
+            position = text.find('\n\n', position + 1)
+        sentences = [match.start() for match in self._sentence_end.finditer(text)]
+        return paragraphs, sentences
 
     def chunk(self, text: str) -> tuple[list[dict], dict]:
         """Performs the chunking operation based on the selected mode."""
@@ -253,316 +349,1035 @@ class SmartChunker:
             return self._chunk_symbol(text)
         elif self.mode == "subtitle_srt":
             return self._chunk_subtitle_srt(text)
+        elif self.mode == "markdown_ast":
+            return self._chunk_markdown_ast(text)
     
+    def chunk_parallel(self, text: str, workers: int = None) -> tuple[list[dict], dict]:
+        """
+        Same result as `chunk(text)`, with the smart mode pattern scan spread over
+        `workers` processes (default: the CPU count).
+
+        The text is split at blank lines that do not start a list, code or HTML block,
+        one segment of at least PARALLEL_MIN_SEGMENT characters per worker. Each worker
+        scans the whole text from its split point until `_stream_lookahead` characters
+        past the next one. A split point may still fall inside an element (e.g. a long
+        fenced code block), so a segment's tokens are only used from the first match
+        that the previous segment's scan also found: from there on both scans are the
+        same. The merge passes then run once over the stitched tokens.
+
+        Other modes, short texts and `workers` <= 1 are chunked serially.
+        """
+        if not isinstance(text, str):
+            raise TypeError("Input text must be a string.")
+        workers = workers or os.cpu_count() or 1
+        starts = self._parallel_split_points(text, workers) if self.mode == "smart" else [0]
+        if len(starts) < 2:
+            return self.chunk(text)
+
+        limits = [min(len(text), end + self._stream_lookahead) for end in starts[1:]] + [len(text)]
+        settings = (self.min_chunk_size, self.max_chunk_size, self.mode, self.separators, self.keep_separators,
+                    self.regex_engine, self.merge_strategy)
+        with ProcessPoolExecutor(max_workers=len(starts), initializer=_parallel_init,
+                                 initargs=(settings, text)) as pool:
+            scans = list(pool.map(_parallel_scan, starts, limits))
+        tokens = self._stitch_scans(text, scans)
+        return self._index_chunks(list(self._merge_passes(iter(tokens))))
+
+    def chunk_iter(self, stream, read_size: int = 1 << 16) -> Iterator[dict]:
+        """
+        Chunks a file-like object (or a string) incrementally and yields final chunks lazily.
+
+        Input is read in blocks of `read_size` characters (bytes streams are decoded as
+        UTF-8). Chunks are indexed sequentially across the whole stream and are the
+        same as the ones `chunk()` returns for the full text.
+
+        In smart mode every pass runs as a generator, so only a bounded lookahead is
+        buffered: the unmatched tail of the input (an open fenced code block or HTML
+        <pre> region is held until it closes) and the chunks a merge pass has not
+        decided on yet. Inline elements (code spans, links, images) longer than the
+        lookahead window are treated as plain text, as if they were never closed.
+        The line and symbol modes cut the input at line ends or separators and chunk
+        each segment on its own. subtitle_srt mode cuts it only after complete
+        entries, and holds the input until its first valid entry: an input without one
+        is a single text chunk, as in `chunk()`. markdown_ast mode reads the
+        whole input first: a later link reference definition can change how an
+        earlier paragraph is classified.
+        """
+        blocks = self._read_blocks(stream, max(1, read_size))
+        if self.mode == "smart":
+            chunks = self._iter_smart(blocks)
+        elif self.mode == "markdown_ast":
+            chunks = iter(self.chunk("".join(blocks))[0])
+        else:
+            chunks = self._iter_segments(blocks, max(read_size, 8 * self.max_chunk_size))
+        for index, chunk in enumerate(chunks):
+            chunk['index'] = index
+            yield chunk
+
+    def chunk_spans(self, source) -> list[ChunkSpan]:
+        """
+        Chunks `source` (a str or a SourceBuffer) into ChunkSpan records instead of
+        text copies. `span.text(source)` is `source[start:end]`.
+
+        Spans cover the same chunks as `chunk()`: merged chunks are measured, split
+        and partitioned on their parts joined with single spaces in both. A span
+        keeps the source text between the parts (e.g. a paragraph break, or nothing
+        before inline code) where `chunk()` has the space. In smart mode a SourceBuffer is read block by
+        block; markdown_ast mode parses the whole text and keeps the block offsets;
+        other modes chunk the whole text and locate each chunk in it.
+        """
+        if self.mode == "smart":
+            blocks = [source] if isinstance(source, str) else source.iter_blocks()
+            return list(self._merge_passes(self._tokenize_smart(blocks), source))
+        if self.mode == "markdown_ast":
+            text = source if isinstance(source, str) else source.text()
+            return list(self._finalize_chunks(self._tokenize_markdown(text), source))
+
+        text = source if isinstance(source, str) else source.text()
+        chunks, _ = self.chunk(text)
+        spans = []
+        position = 0
+        for chunk in chunks:
+            chunk_text = chunk['chunkText']
+            start = text.find(chunk_text, position)
+            if start >= 0:
+                end = start + len(chunk_text)
+            else:
+                # Chunks rebuilt from stripped lines (e.g. subtitle timings) span from
+                # their first line to their last one
+                lines = chunk_text.split("\n")
+                start = text.find(lines[0], position)
+                last = text.find(lines[-1], max(start, 0))
+                if start < 0 or last < 0:
+                    raise ValueError(f"Chunk {chunk['index']} cannot be located in the source text.")
+                end = last + len(lines[-1])
+            spans.append(ChunkSpan(start, end, chunk['chunkType'], chunk['toTranslate']))
+            position = end
+        return spans
+
+    def _read_blocks(self, stream, read_size: int) -> Iterator[str]:
+        """Yields text blocks from a string or a text/binary stream."""
+        if isinstance(stream, str):
+            if stream:
+                yield stream
+            return
+        decoder = None
+        while True:
+            data = stream.read(read_size)
+            if not data:
+                if decoder is not None:
+                    tail = decoder.decode(b"", final=True)
+                    if tail:
+                        yield tail
+                return
+            if isinstance(data, bytes):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+                data = decoder.decode(data)
+                if not data:
+                    continue  # Only part of a multi-byte character so far
+            yield data
+
+    def _iter_segments(self, blocks: Iterator[str], segment_size: int) -> Iterator[dict]:
+        """Line, symbol and subtitle modes: chunks of the `_iter_cut_segments` segments."""
+        segments = self._iter_cut_segments(blocks, segment_size)
+        if self.mode == "subtitle_srt":
+            yield from self._iter_srt_segments(segments)
+            return
+        for segment in segments:
+            yield from self.chunk(segment)[0]
+
+    def _iter_srt_segments(self, segments: Iterator[str]) -> Iterator[dict]:
+        """
+        Subtitle mode: the entry chunks of each segment. Segments are held until the
+        first valid entry, since an input without any is chunked as one text chunk.
+        """
+        held = []
+        for segment in segments:
+            chunks = self._srt_entry_chunks(segment)
+            if held is not None:
+                if not chunks:
+                    held.append(segment)
+                    continue
+                held = None
+            yield from chunks
+        if held is not None:
+            yield {'chunkText': "".join(held).strip(), 'toTranslate': True, 'chunkType': 'text', 'index': 0}
+
+    def _iter_cut_segments(self, blocks: Iterator[str], segment_size: int) -> Iterator[str]:
+        """
+        Buffers about `segment_size` characters, cuts at the last line end / separator /
+        entry break and yields the part before the cut.
+        """
+        pending = []
+        pending_len = 0
+        next_attempt = segment_size
+        for block in blocks:
+            pending.append(block)
+            pending_len += len(block)
+            if pending_len < next_attempt:
+                continue
+            buffer = "".join(pending)
+            cut = self._find_safe_cut(buffer)
+            if cut <= 0:
+                # No cut point yet (e.g. one very long line): read another segment first
+                pending, pending_len = [buffer], len(buffer)
+                next_attempt = pending_len + segment_size
+                continue
+            rest = buffer[cut:]
+            pending, pending_len = ([rest], len(rest)) if rest else ([], 0)
+            next_attempt = segment_size
+            yield buffer[:cut]
+        if pending:
+            yield "".join(pending)
+
+    def _find_safe_cut(self, buffer: str) -> int:
+        """
+        Returns the end of the last line (line mode), separator (symbol mode) or break
+        between subtitle entries (subtitle mode) in `buffer`, or -1. Chunking both sides of such a cut
+        separately gives the same chunks as chunking the buffer whole.
+        """
+        if self.mode == "line":
+            return buffer.rfind("\n") + 1 or -1
+        if self.mode == "symbol":
+            # A separator match is final once the longest separator would fit after its start
+            cut = -1
+            for match in self._symbol_pattern.finditer(buffer):
+                if match.start() + self._symbol_max_len > len(buffer):
+                    break
+                cut = match.end()
+            return cut
+        last = None
+        for last in self._srt_entry_break.finditer(buffer):
+            pass
+        return last.end() if last else -1
+
+    def _parallel_split_points(self, text: str, workers: int) -> list[int]:
+        """Start offsets of the chunk_parallel() segments, beginning with 0."""
+        parts = min(workers, len(text) // self.PARALLEL_MIN_SEGMENT)
+        starts = [0]
+        for part in range(1, parts):
+            split = self._parallel_split.search(text, part * len(text) // parts)
+            if split is None:
+                break
+            if split.end() - starts[-1] >= self.PARALLEL_MIN_SEGMENT // 2:
+                starts.append(split.end())
+        return starts
+
+    def _scan_range(self, text: str, start: int, limit: int) -> tuple[list[dict], int]:
+        """
+        Tokens of a scan of the whole `text` from `start` up to the first match ending
+        after `limit`, and the end of the last match (len(text) once the scan is done).
+        """
+        tokens = []
+        scan = self._match_tokens(text, self._scan(text, start), start, 0, limit)
+        while True:
+            try:
+                tokens.append(next(scan))
+            except StopIteration as done:
+                last_end = done.value
+                break
+        if limit >= len(text):
+            token = self._text_token(text[last_end:], last_end)
+            if token is not None:
+                tokens.append(token)
+            last_end = len(text)
+        return tokens, last_end
+
+    def _stitch_scans(self, text: str, scans: list) -> list[dict]:
+        """Joins the `_scan_range` results of consecutive segments into the tokens of one scan."""
+        tokens, last_end = scans[0]
+        stitched = []
+        for next_tokens, next_last_end in scans[1:]:
+            # A match at the same offset is found identically by both scans
+            shared = {(token['start'], token['end'], token['type']): j for j, token in enumerate(next_tokens) if token['type'] != 'text'}
+            for i, token in enumerate(tokens):
+                j = shared.get((token['start'], token['end'], token['type'])) if token['type'] != 'text' else None
+                if j is not None:
+                    break
+            else:
+                # The scans did not meet: finish the scan serially
+                stitched.extend(tokens)
+                if last_end < len(text):
+                    stitched.extend(self._scan_range(text, last_end, len(text))[0])
+                return stitched
+            stitched.extend(tokens[:i + 1])
+            tokens, last_end = next_tokens[j + 1:], next_last_end
+        stitched.extend(tokens)
+        return stitched
+
     def _chunk_smart(self, text: str) -> tuple[list[dict], dict]:
         """Original smart chunking algorithm."""
         if not isinstance(text, str): raise TypeError("Input text must be a string.")
 
-        # Step 1: Initial Split using finditer (isolate all elements)
-        raw_chunks = []
-        last_end = 0
-        
-        # First pass: Identify all potential chunks
-        potential_chunks = []
-        for match in self.combined_pattern.finditer(text):
+        return self._index_chunks(list(self._iter_smart([text])))
+
+    def _index_chunks(self, final_chunks: list[dict]) -> tuple[list[dict], dict]:
+        """Step 4: Final indexing and report"""
+        report = { 'total_chunks': 0, 'translatable_chunks': 0, 'non_translatable_chunks': 0, 'text_chunks': 0, 'code_chunks': 0, 'image_chunks': 0, 'url_chunks': 0, 'unknown_chunks': 0 }
+        for current_index, chunk in enumerate(final_chunks):
+            chunk['index'] = current_index
+            report['total_chunks'] += 1
+            if chunk['toTranslate']:
+                report['translatable_chunks'] += 1
+                report['text_chunks'] += 1
+            else:
+                report['non_translatable_chunks'] += 1
+                type_key = f"{chunk['chunkType']}_chunks"
+                report[type_key] = report.get(type_key, 0) + 1
+        if report['unknown_chunks'] == 0: del report['unknown_chunks']
+        return final_chunks, report
+
+    def _iter_smart(self, blocks) -> Iterator[dict]:
+        """Smart mode passes chained as generators; yields final (unindexed) chunks."""
+        return self._merge_passes(self._tokenize_smart(blocks))
+
+    def _merge_passes(self, potential_chunks, source=None) -> Iterator:
+        """Steps after tokenizing, chained as generators (see `_finalize_chunks` for `source`)."""
+        potential_chunks = self._merge_bullet_points(potential_chunks)
+        potential_chunks = self._merge_inline_code(potential_chunks)
+        return self._finalize_chunks(potential_chunks, source)
+
+    def _tokenize_smart(self, blocks) -> Iterator[dict]:
+        """
+        Step 1: Single pass over the combined pattern. Splits the text into special
+        elements (code, images, URLs, footnotes) and the plain text between them.
+
+        `blocks` is an iterable of consecutive text pieces. A match is only accepted
+        once at least `_stream_lookahead` characters follow it and no unclosed fenced
+        code block or HTML <pre>/<code> region starts before it, so every accepted
+        match is the one a scan of the whole text would find. `start`/`end` are
+        offsets into the whole text.
+        """
+        lookahead = self._stream_lookahead
+        buffer = ""
+        offset = 0    # Position of buffer[0] in the whole text
+        last_end = 0  # End of the last accepted match within buffer
+        pending = []
+        pending_len = 0
+        blocks = iter(blocks)
+        # One block is read ahead so the last one is known (`chunk()` passes a single block)
+        block = next(blocks, None)
+        eof = block is None
+
+        while not eof:
+            pending.append(block)
+            pending_len += len(block)
+            block = next(blocks, None)
+            eof = block is None
+            # Wait for at least as much new text as is still unconsumed, so a
+            # block that stays open for long is rescanned a logarithmic number of times
+            if not eof and pending_len < max(lookahead, len(buffer) - last_end):
+                continue
+            buffer += "".join(pending)
+            pending, pending_len = [], 0
+
+            if eof:
+                matches = self._scan(buffer, last_end)
+                limit = len(buffer)
+            else:
+                matches = list(self._scan(buffer, last_end))
+                limit = self._token_limit(buffer, last_end, matches, len(buffer) - lookahead)
+
+            last_end = yield from self._match_tokens(buffer, matches, last_end, offset, limit)
+
+            if not eof and last_end > lookahead:
+                # Drop consumed text, keeping one character so that `^` and `\b`
+                # still see what precedes the next match
+                buffer = buffer[last_end - 1:]
+                offset += last_end - 1
+                last_end = 1
+
+        if last_end < len(buffer):
+            token = self._text_token(buffer[last_end:], offset + last_end)
+            if token is not None:
+                yield token
+
+    def _scan(self, buffer: str, position: int = 0) -> Iterator:
+        """
+        Matches of the combined pattern in `buffer` from `position`, as
+        `combined_pattern.finditer(buffer, position)` finds them.
+
+        With the re2 engine the scan is linear in the buffer length. The standard
+        library engine backtracks: an opener that never closes (an unclosed fence,
+        <pre>, image or link) is tried against the rest of the buffer, so thousands
+        of them take quadratic time. Such alternatives are dropped from the pattern
+        past the last position where they can still start (see `_last_starts`).
+        Alternatives are only dropped where they cannot match, so the matches are
+        the same.
+        """
+        if self._re2_pattern is not None:
+            yield from self._re2_pattern.finditer(buffer, position)
+            return
+        last_starts = self._last_starts(buffer, position)
+        live = set(self.pattern_dict)
+        while True:
+            live.difference_update(name for name, last in last_starts.items() if last <= position)
+            if not live:
+                return
+            bound = min((last_starts[name] for name in live if name in last_starts), default=len(buffer) + 1)
+            pattern = self._guarded_patterns.get(frozenset(live))
+            if pattern is None:
+                pattern = self._guarded_patterns[frozenset(live)] = self._compile_alternatives(live)
+            for match in pattern.finditer(buffer, position):
+                if match.start() >= bound:
+                    break
+                yield match
+                position = match.end()
+            else:
+                return
+            # Nothing starts in [position, bound) either without the alternative that ends there
+            position = max(position, bound)
+
+    def _last_starts(self, buffer: str, position: int) -> dict:
+        """
+        For the alternatives that need a closing delimiter: the offset from which
+        they can no longer start in `buffer`, i.e. that of their last closer.
+        """
+        last_fence = -1
+        for last_fence_match in self._closing_fence.finditer(buffer, position):
+            last_fence = last_fence_match.start()
+        last_html = -1
+        for last_html_match in self._closing_html_code.finditer(buffer, position):
+            last_html = last_html_match.start()
+        # Images and links need "](" followed by a ")"
+        closing_paren = buffer.rfind(")", position)
+        last_target = buffer.rfind("](", position, closing_paren) if closing_paren >= 0 else -1
+        return {
+            'fenced_code': last_fence,
+            'html_code': last_html,
+            'markdown_image': last_target,
+            'markdown_link': last_target,
+            'inline_code': buffer.rfind("`", position),
+        }
+
+    def _compile_alternatives(self, names) -> re.Pattern:
+        """The combined pattern restricted to the named alternatives (in their usual order)."""
+        return re.compile(
+            r"(?:^|(?=[`<!\[hfw]))(?:"
+            + "|".join(f"(?:(?:{p.pattern}\n)(?P<{name}>))" for name, p in self.pattern_dict.items() if name in names)
+            + ")",
+            re.MULTILINE | re.DOTALL | re.IGNORECASE | re.VERBOSE
+        )
+
+    def _re2_source(self) -> str:
+        """
+        The combined pattern in RE2 syntax: no verbose mode, inline flags, no
+        leading guard, and the fenced code alternative split per fence kind since
+        RE2 has no backreferences. RE2's \\w and \\b only match ASCII word characters.
+        """
+        parts = []
+        for name, p in self.pattern_dict.items():
+            body = _strip_verbose(p.pattern)
+            if "(?P=fence)" in body:
+                body = "|".join(body.replace("(?P<fence>```|~~~)", fence).replace("(?P=fence)", fence)
+                                for fence in ("```", "~~~"))
+            parts.append(f"(?:(?:{body})(?P<{name}>))")
+        return "(?ims)(?:" + "|".join(parts) + ")"
+
+    def _compile_re2(self):
+        return re2.compile(self._re2_source())
+
+    def _match_tokens(self, buffer: str, matches, last_end: int, offset: int, limit: int):
+        """
+        Yields the tokens for `matches` (from a scan of `buffer` starting at `last_end`)
+        and the text between them, up to the first match that ends after `limit`.
+        Returns the end of the last consumed match.
+        """
+        pattern_types = self.pattern_types
+        for match in matches:
             start, end = match.span()
+            if end > limit:
+                break
             if start > last_end:
-                preceding_text = text[last_end:start]
-                stripped_preceding = preceding_text.strip()
-                if stripped_preceding:
-                    # New rule: If chunk has less than 2 chars, it's considered non-translatable
-                    is_translatable = len(stripped_preceding) >= 2
-                    potential_chunks.append({
-                        'text': stripped_preceding,
-                        'type': 'text',
-                        'translate': is_translatable,
-                        'start': last_end,
-                        'end': start
-                    })
-            
-            try:
-                chunk_text_raw, chunk_type, translate_flag = self._identify_chunk_type(match)
-                chunk_text_final = chunk_text_raw.strip()
-                
-                if chunk_text_final:
-                    potential_chunks.append({
-                        'text': chunk_text_final, 
-                        'type': chunk_type, 
-                        'translate': translate_flag,
-                        'start': start,
-                        'end': end,
-                        'raw': chunk_text_raw
-                    })
-            except IndexError as e:
-                full_match_text = match.string[match.start():match.end()]
-                print(f"Error identifying chunk type for match: {full_match_text[:100]}... Error: {e}")
-                stripped_match = full_match_text.strip()
-                if stripped_match:
-                    potential_chunks.append({
-                        'text': stripped_match, 
-                        'type': 'unknown_error', 
-                        'translate': False,
-                        'start': start,
-                        'end': end
-                    })
-            
+                token = self._text_token(buffer[last_end:start], offset + last_end)
+                if token is not None:
+                    yield token
+
+            chunk_type = pattern_types.get(match.lastgroup)
+            if chunk_type is None:
+                _, chunk_type, _ = self._identify_chunk_type(match)
+            matched = match.group()
+            chunk_text_final = matched.strip()
+            if chunk_text_final:
+                text_start = offset + start + len(matched) - len(matched.lstrip())
+                yield {
+                    'text': chunk_text_final,
+                    'type': chunk_type,
+                    'translate': False,
+                    'start': text_start,
+                    'end': text_start + len(chunk_text_final)
+                }
+
             last_end = end
-        
-        if last_end < len(text):
-            remaining_text = text[last_end:]
-            stripped_remaining = remaining_text.strip()
-            if stripped_remaining:
-                # New rule: If chunk has less than 2 chars, it's considered non-translatable
-                is_translatable = len(stripped_remaining) >= 2
-                potential_chunks.append({
-                    'text': stripped_remaining,
-                    'type': 'text',
-                    'translate': is_translatable,
-                    'start': last_end,
-                    'end': len(text)
-                })
-        
-        # Second pass: Process special cases
-        
-        # First, identify bullet points or lists with multiple inline code segments or links
-        bullet_points = []
-        i = 0
-        while i < len(potential_chunks):
+        return last_end
+
+    @staticmethod
+    def _text_token(preceding: str, position: int):
+        """Token for the plain text `preceding` found at `position`, or None if it is blank."""
+        stripped_preceding = preceding.strip()
+        if not stripped_preceding:
+            return None
+        # Offsets of the stripped text, so that it is exactly source[start:end]
+        text_start = position + len(preceding) - len(preceding.lstrip())
+        # New rule: If chunk has less than 2 chars, it's considered non-translatable
+        return {
+            'text': stripped_preceding,
+            'type': 'text',
+            'translate': len(stripped_preceding) >= 2,
+            'start': text_start,
+            'end': text_start + len(stripped_preceding)
+        }
+
+    def _token_limit(self, buffer: str, position: int, matches: list, limit: int) -> int:
+        """
+        Lowers `limit` to the first fenced code fence or HTML <pre>/<code> opener after
+        `position` that is not covered by a match of its own kind yet: more input may
+        still close it and change how the text after it is split.
+        """
+        starts = [match.start() for match in matches]
+        for opener in self._block_opener.finditer(buffer, position, max(position, limit)):
+            at = opener.start()
+            i = bisect.bisect_right(starts, at) - 1
+            if i >= 0 and at < matches[i].end():
+                match = matches[i]
+                expected = 'fenced_code' if opener.group()[0] in '`~' else 'html_code'
+                if match.start() != at or match.lastgroup == expected:
+                    continue  # Inside an earlier element, or the element is complete
+            return at
+        return limit
+
+    def _merge_bullet_points(self, potential_chunks) -> Iterator[dict]:
+        """
+        Second pass: Merges bullet points / list items containing inline code or links into one chunk.
+
+        A bullet item is held back until the chunk that ends it (a new paragraph or
+        the next bullet) has been seen, then emitted merged or unchanged.
+        """
+        potential_chunks = iter(potential_chunks)
+        window = []  # window[0] is the chunk being examined
+
+        def fill(size):
+            while len(window) < size:
+                chunk = next(potential_chunks, None)
+                if chunk is None:
+                    return False
+                window.append(chunk)
+            return True
+
+        while fill(1):
+            first = window[0]
             # Look for text chunks that might be the start of a bullet point or list item
-            if (potential_chunks[i]['type'] == 'text' and
-                (('-' in potential_chunks[i]['text'] and potential_chunks[i]['text'].strip().startswith('-')) or
-                 ('*' in potential_chunks[i]['text'] and potential_chunks[i]['text'].strip().startswith('*')))):
-                
+            if first['type'] == 'text' and first['text'].strip().startswith(('-', '*')):
                 # Special case: Check if this is a bullet point followed by a link
-                if (i + 1 < len(potential_chunks) and
-                    potential_chunks[i+1]['type'] == 'url' and
-                    potential_chunks[i]['text'].strip() in ['-', '*']):
+                if fill(2) and window[1]['type'] == 'url' and first['text'].strip() in ['-', '*']:
                     # This is a bullet point with a link, merge them and ensure it's translatable
-                    bullet_points.append((i, i+1))
-                    i += 2
+                    yield self._merge_chunk_run(window[:2])
+                    del window[:2]
                     continue
-                
-                # Check if this is followed by inline code and more text
-                bullet_start = i
-                bullet_end = i
+
+                # Look ahead to find all related chunks: everything up to a new
+                # paragraph or another bullet point belongs to this one
                 has_inline_code = False
-                
-                # Look ahead to find all related chunks
-                j = i + 1
-                while j < len(potential_chunks):
-                    # If we find inline code, mark it
-                    if potential_chunks[j]['type'] == 'code' and '`' in potential_chunks[j]['text'] and len(potential_chunks[j]['text']) < 50:
-                        has_inline_code = True
-                        bullet_end = j
-                    # If we find text that might be part of the same bullet point
-                    elif potential_chunks[j]['type'] == 'text' and (
-                        ',' in potential_chunks[j]['text'] or
-                        ' and ' in potential_chunks[j]['text'] or
-                        potential_chunks[j]['text'].strip().startswith('for') or
-                        potential_chunks[j]['text'].strip().startswith('to') or
-                        potential_chunks[j]['text'].strip().startswith('of')):
-                        bullet_end = j
-                    # If we find a new paragraph or another bullet point, stop
-                    elif potential_chunks[j]['type'] == 'text' and (
-                        '\n\n' in potential_chunks[j]['text'] or
-                        potential_chunks[j]['text'].strip().startswith('-') or
-                        potential_chunks[j]['text'].strip().startswith('*')):
-                        break
-                    else:
-                        # If it's not related to the bullet point, stop
-                        if j > bullet_end + 1:
+                j = 1
+                while fill(j + 1):
+                    chunk = window[j]
+                    if chunk['type'] == 'code':
+                        # If we find inline code, mark it
+                        if '`' in chunk['text'] and len(chunk['text']) < 50:
+                            has_inline_code = True
+                    elif chunk['type'] == 'text':
+                        text = chunk['text']
+                        # Text that might be part of the same bullet point continues it;
+                        # a new paragraph or another bullet point ends it
+                        if not (',' in text or ' and ' in text or text.strip().startswith(('for', 'to', 'of'))) and (
+                                '\n\n' in text or text.strip().startswith(('-', '*'))):
                             break
-                        bullet_end = j
                     j += 1
-                
-                # If we found a bullet point with inline code, add it to our list
-                if has_inline_code and bullet_end > bullet_start:
-                    # Make sure this is actually a bullet point and not just text with a dash
-                    if potential_chunks[bullet_start]['text'].strip().startswith('-') or potential_chunks[bullet_start]['text'].strip().startswith('*'):
-                        bullet_points.append((bullet_start, bullet_end))
-                        i = bullet_end + 1
-                        continue
-            
-            i += 1
-        
-        # Now merge the identified bullet points
-        for start, end in sorted(bullet_points, reverse=True):  # Process in reverse to avoid index issues
-            # Merge all chunks in the bullet point into a single chunk
-            merged_text = ""
-            for i in range(start, end + 1):
-                if i > start:
-                    merged_text += " "
-                merged_text += potential_chunks[i]['text']
-            
-            # Update the first chunk with the merged text and ensure it's translatable
-            potential_chunks[start]['text'] = merged_text
-            potential_chunks[start]['end'] = potential_chunks[end]['end']
-            potential_chunks[start]['translate'] = True  # Always make bullet points with links translatable
-            
-            # Remove the merged chunks
-            for i in range(end, start, -1):
-                potential_chunks.pop(i)
-        
-        # Process remaining special cases
-        i = 0
-        while i < len(potential_chunks):
-            current = potential_chunks[i]
-            
+
+                # If we found a bullet point with inline code, merge it
+                if has_inline_code and j > 1:
+                    yield self._merge_chunk_run(window[:j])
+                    del window[:j]
+                    continue
+
+            yield first
+            del window[0]
+
+    @staticmethod
+    def _merge_chunk_run(run: list[dict]) -> dict:
+        first = run[0]
+        first['text'] = " ".join(chunk['text'] for chunk in run)
+        first['end'] = run[-1]['end']
+        first['translate'] = True  # Always make bullet points with links translatable
+        first['merged'] = True
+        return first
+
+    def _merge_inline_code(self, potential_chunks) -> Iterator[dict]:
+        """
+        Second pass: Merges short inline code found inside bullet points or lists with the surrounding text.
+
+        Single forward sweep. The last emitted chunk is held back while following
+        chunks may still merge into it; the text of merged chunks is collected as
+        pieces and joined once when the chunk is released.
+        """
+        # Text pieces of chunks that received merges, keyed by id(chunk), plus whether
+        # any piece contains a list marker ('-' / '*') so it never needs rescanning
+        pieces = {}
+        markers = {}
+
+        def extend(chunk, *texts):
+            key = id(chunk)
+            if key not in pieces:
+                pieces[key] = [chunk['text']]
+                markers[key] = ('-' in chunk['text'], '*' in chunk['text'])
+            pieces[key].extend(texts)
+            has_dash, has_star = markers[key]
+            markers[key] = (has_dash or any('-' in t for t in texts), has_star or any('*' in t for t in texts))
+
+        def release(chunk):
+            key = id(chunk)
+            if key in pieces:
+                chunk['text'] = ' '.join(pieces.pop(key))
+                chunk['merged'] = True
+                del markers[key]
+            return chunk
+
+        potential_chunks = iter(potential_chunks)
+        held = None
+        current = next(potential_chunks, None)
+        while current is not None:
+            following = next(potential_chunks, None)
+
             # Special case: Inline code within bullet points or paragraphs (for any we missed)
             if current['type'] == 'code' and '`' in current['text'] and len(current['text']) < 50:
+                prev = held if held is not None and held['type'] == 'text' else None
+                nxt = following if following is not None and following['type'] == 'text' else None
+
                 # Check if this is part of a bullet point or list
                 is_in_bullet = False
                 is_in_list = False
-                
+
                 # Look at previous chunk
-                if i > 0 and potential_chunks[i-1]['type'] == 'text':
-                    prev_text = potential_chunks[i-1]['text']
-                    if prev_text.strip().endswith('-') or prev_text.strip().endswith('*'):
+                if prev is not None:
+                    key = id(prev)
+                    if key in pieces:
+                        last_piece = pieces[key][-1]
+                        has_dash, has_star = markers[key]
+                    else:
+                        last_piece = prev['text']
+                        has_dash, has_star = '-' in last_piece, '*' in last_piece
+                    if last_piece.strip().endswith('-') or last_piece.strip().endswith('*'):
                         is_in_bullet = True
                     # Check if we're in a list (contains bullet points)
-                    if '-' in prev_text or '*' in prev_text:
+                    if has_dash or has_star:
                         is_in_list = True
-                
+
                 # Look at next chunk
-                if i < len(potential_chunks) - 1 and potential_chunks[i+1]['type'] == 'text':
-                    next_text = potential_chunks[i+1]['text']
+                if nxt is not None:
+                    next_text = nxt['text']
                     if next_text.strip().startswith('for') or next_text.strip().startswith('to') or next_text.strip().startswith('of'):
                         is_in_bullet = True
                     # Check if we're in a list (contains commas, 'and', etc.)
                     if ',' in next_text or ' and ' in next_text:
                         is_in_list = True
-                
+
                 if is_in_bullet or is_in_list:
-                    # Merge with surrounding text
-                    if i > 0 and i < len(potential_chunks) - 1 and potential_chunks[i-1]['type'] == 'text' and potential_chunks[i+1]['type'] == 'text':
+                    if prev is not None and nxt is not None:
                         # Merge previous, current, and next chunks
-                        merged_text = potential_chunks[i-1]['text'] + ' ' + current['text'] + ' ' + potential_chunks[i+1]['text']
-                        potential_chunks[i-1]['text'] = merged_text
-                        potential_chunks[i-1]['end'] = potential_chunks[i+1]['end']
-                        # Remove current and next chunks
-                        potential_chunks.pop(i)
-                        potential_chunks.pop(i)
-                        i -= 1  # Adjust index
-                    elif i > 0 and potential_chunks[i-1]['type'] == 'text':
+                        extend(prev, current['text'], nxt['text'])
+                        prev['end'] = nxt['end']
+                        current = next(potential_chunks, None)
+                        continue
+                    elif prev is not None:
                         # Merge with previous chunk
-                        potential_chunks[i-1]['text'] += ' ' + current['text']
-                        potential_chunks[i-1]['end'] = current['end']
-                        potential_chunks.pop(i)
-                        i -= 1  # Adjust index
-                    elif i < len(potential_chunks) - 1 and potential_chunks[i+1]['type'] == 'text':
-                        # Merge with next chunk
-                        potential_chunks[i+1]['text'] = current['text'] + ' ' + potential_chunks[i+1]['text']
-                        potential_chunks[i+1]['start'] = current['start']
-                        potential_chunks.pop(i)
-                        i -= 1  # Adjust index
-            
-            i += 1
-        
-        # Convert potential_chunks to raw_chunks
-        for chunk in potential_chunks:
-            raw_chunks.append({
-                'text': chunk['text'],
-                'type': chunk['type'],
-                'translate': chunk['translate']
-            })
+                        extend(prev, current['text'])
+                        prev['end'] = current['end']
+                        current = following
+                        continue
+                    elif nxt is not None:
+                        # Merge with next chunk; it is examined on the next iteration
+                        next_text = nxt['text']
+                        nxt['text'] = current['text']
+                        extend(nxt, next_text)
+                        nxt['start'] = current['start']
+                        current = following
+                        continue
+
+            if held is not None:
+                yield release(held)
+            held = current
+            current = following
+
+        if held is not None:
+            yield release(held)
+
+    def _finalize_chunks(self, potential_chunks, source=None) -> Iterator:
+        """
+        Steps 2-3: Splits large text chunks and merges small neighbours; yields unindexed
+        final chunks, or ChunkSpan records when the `source` text is given.
+        With the "balanced" merge strategy, translatable runs are partitioned by
+        `_balance_run` instead of merged greedily.
+        """
+        if self.merge_strategy == "balanced":
+            return self._finalize_balanced(potential_chunks, source)
+        return self._merge_pieces(self._split_chunks(potential_chunks, source), source)
+
+    def _merge_pieces(self, pieces, source=None) -> Iterator:
+        """Step 3 (greedy): merges the split pieces with their small neighbours."""
+        group = None  # Pieces of the chunk being merged
+        group_type = None
+        group_translate = False
+        group_start = group_end = 0
+        buffer_len = 0
+        separator = " " # Assume space needed between merged parts
 
-        # Step 2: Split large text chunks
-        processed_chunks = []
-        for chunk_info in raw_chunks:
-            if chunk_info['translate'] and len(chunk_info['text']) > self.max_chunk_size:
-                split_texts = self._split_large_text_chunk(chunk_info['text'])
-                for split_text in split_texts:
-                    processed_chunks.append({'text': split_text, 'type': 'text', 'translate': True})
-            elif chunk_info['text']:
-                 processed_chunks.append(chunk_info)
-
-        # Step 3: Merge consecutive chunks of the same type if they're small
-        final_chunks = []
-        i = 0
-        while i < len(processed_chunks):
-            current_chunk_info = processed_chunks[i]
-            
-            if current_chunk_info['translate']:
-                # Merging logic for translatable text chunks
-                text_buffer = current_chunk_info['text']
-                j = i + 1
-                
-                # Continue merging until we reach a non-translatable chunk or exceed max_chunk_size
-                while j < len(processed_chunks) and processed_chunks[j]['translate']:
-                    next_text = processed_chunks[j]['text']
-                    next_text_len = len(next_text)
-                    separator = " " # Assume space needed between merged text parts
-                    potential_merged_len = len(text_buffer) + len(separator) + next_text_len
-                    
+        def emit():
+            if source is not None:
+                return ChunkSpan(group_start, group_end, group_type, group_translate)
+            return {'chunkText': separator.join(group), 'toTranslate': group_translate, 'chunkType': group_type, 'index': -1}
+
+        for processed in pieces:
+            next_text = processed['text']
+            next_text_len = len(next_text)
+            if group is not None:
+                if group_translate and processed['translate']:
+                    # Merging logic for translatable text chunks. Only the running
+                    # length is needed to decide; pieces are joined once.
+                    potential_merged_len = buffer_len + len(separator) + next_text_len
                     # Case 1: Always merge if either current buffer or next chunk is smaller than min_chunk_size
                     # This ensures we try to merge small chunks together regardless of their position
-                    if len(text_buffer) < self.min_chunk_size or next_text_len < self.min_chunk_size:
+                    if buffer_len < self.min_chunk_size or next_text_len < self.min_chunk_size:
                         # Only stop merging if we would exceed max_chunk_size by a significant margin
-                        if potential_merged_len > self.max_chunk_size * 1.2:  # Allow some flexibility
-                            break
-                        text_buffer += separator + next_text
-                        j += 1
+                        mergeable = potential_merged_len <= self.max_chunk_size * 1.2  # Allow some flexibility
                     # Case 2: If both chunks are large enough, only merge if it doesn't exceed max_chunk_size
-                    elif potential_merged_len <= self.max_chunk_size:
-                        text_buffer += separator + next_text
-                        j += 1
                     # Case 3: We've reached max_chunk_size, stop merging
                     else:
-                        break
-                
-                final_chunks.append({'chunkText': text_buffer, 'toTranslate': True, 'chunkType': 'text', 'index': -1})
-                i = j
-            else:
-                # For non-translatable chunks, we'll be more conservative with merging
-                # Only merge if they're consecutive, of the same type, and both are very small
-                current_type = current_chunk_info['type']
-                
+                        mergeable = potential_merged_len <= self.max_chunk_size
+                    if mergeable:
+                        group.append(next_text)
+                        buffer_len = potential_merged_len
+                        group_end = processed.get('end', 0)
+                        continue
+                elif (not group_translate and not processed['translate'] and processed['type'] == group_type
+                      # Only merge if both chunks are very small (less than half the min_chunk_size)
+                      and buffer_len < self.min_chunk_size / 2 and next_text_len < self.min_chunk_size / 2):
+                    group.append(next_text)
+                    buffer_len += len(separator) + next_text_len
+                    group_end = processed.get('end', 0)
+                    continue
+                yield emit()
+                group = None
+
+            group_start, group_end = processed.get('start', 0), processed.get('end', 0)
+            if processed['translate']:
+                group, group_type, group_translate, buffer_len = [next_text], 'text', True, next_text_len
+            elif processed['type'] in ['url', 'image', 'code', 'footnote']:
                 # Special handling for URL, image, and code chunks - don't merge these
                 # as they often need to be preserved separately
-                if current_type in ['url', 'image', 'code', 'footnote']:
-                    final_chunks.append({'chunkText': current_chunk_info['text'], 'toTranslate': False, 'chunkType': current_type, 'index': -1})
-                    i += 1
+                if source is not None:
+                    yield ChunkSpan(group_start, group_end, processed['type'], False)
                 else:
-                    # For other non-translatable chunks, apply merging logic
-                    content_buffer = current_chunk_info['text']
-                    j = i + 1
-                    
-                    # Continue merging until we reach a different type chunk
-                    while j < len(processed_chunks) and not processed_chunks[j]['translate'] and processed_chunks[j]['type'] == current_type:
-                        next_content = processed_chunks[j]['text']
-                        next_content_len = len(next_content)
-                        separator = " " # Assume space needed between merged parts
-                        potential_merged_len = len(content_buffer) + len(separator) + next_content_len
-                        
-                        # Only merge if both chunks are very small (less than half the min_chunk_size)
-                        if len(content_buffer) < self.min_chunk_size / 2 and next_content_len < self.min_chunk_size / 2:
-                            content_buffer += separator + next_content
-                            j += 1
-                        else:
-                            break
-                    
-                    final_chunks.append({'chunkText': content_buffer, 'toTranslate': False, 'chunkType': current_type, 'index': -1})
-                    i = j
+                    yield {'chunkText': next_text, 'toTranslate': False, 'chunkType': processed['type'], 'index': -1}
+            else:
+                # For other non-translatable chunks, merge only with consecutive
+                # very small chunks of the same type
+                group, group_type, group_translate, buffer_len = [next_text], processed['type'], False, next_text_len
 
-        # Step 4: Final indexing and report
-        report = { 'total_chunks': 0, 'translatable_chunks': 0, 'non_translatable_chunks': 0, 'text_chunks': 0, 'code_chunks': 0, 'image_chunks': 0, 'url_chunks': 0, 'unknown_chunks': 0 }
-        final_indexed_chunks = []
-        current_index = 0
-        for chunk in final_chunks:
-            chunk['index'] = current_index
-            final_indexed_chunks.append(chunk)
-            current_index += 1
-            report['total_chunks'] += 1
-            if chunk['toTranslate']:
-                report['translatable_chunks'] += 1
-                report['text_chunks'] += 1
+        if group is not None:
+            yield emit()
+
+    def _finalize_balanced(self, potential_chunks, source=None) -> Iterator:
+        """
+        `_finalize_chunks` for the "balanced" merge strategy. Translatable texts are
+        cut into sentences and paragraphs (`_text_atoms`); each run of them between
+        two non-translatable chunks is held back until the run ends and then
+        partitioned as a whole. Non-translatable chunks are handled as in greedy mode.
+        """
+        run = []
+        others = []
+
+        def flush():
+            if run:
+                yield from self._balance_run(run, source)
+                run.clear()
+            if others:
+                yield from self._merge_pieces(others, source)
+                others.clear()
+
+        for processed in self._atomize(potential_chunks, source):
+            if processed['translate']:
+                if others:
+                    yield from flush()
+                run.append(processed)
             else:
-                report['non_translatable_chunks'] += 1
-                type_key = f"{chunk['chunkType']}_chunks"
-                report[type_key] = report.get(type_key, 0) + 1
-        if report['unknown_chunks'] == 0: del report['unknown_chunks']
-        return final_indexed_chunks, report
+                if run:
+                    yield from flush()
+                others.append(processed)
+        yield from flush()
+
+    def _atomize(self, potential_chunks, source=None) -> Iterator[dict]:
+        """
+        Replaces each translatable token by its `_text_atoms` (see `_balance_run` for
+        'joiner'); other tokens go through `_split_chunks`.
+        """
+        for chunk in potential_chunks:
+            if not chunk['translate']:
+                yield from self._split_chunks((chunk,), source)
+                continue
+            start = chunk.get('start', 0)
+            text = chunk['text']
+            offsets = self._merged_offsets(chunk, source)
+            previous_end = None
+            for atom_start, atom_end in self._text_atoms(text):
+                atom = {'text': text[atom_start:atom_end], 'type': 'text', 'translate': True,
+                        'joiner': text[previous_end:atom_start] if previous_end is not None else None}
+                if source is not None:
+                    atom['start'], atom['end'] = self._source_range(start, offsets, atom_start, atom_end)
+                previous_end = atom_end
+                yield atom
+
+    @staticmethod
+    def _merged_offsets(chunk: dict, source):
+        """
+        For a merged chunk in span mode: the offset in its source text
+        (source[start:end]) of each character of its text, plus the length of the
+        source text; None for other chunks, whose text is the source text.
+
+        A merged chunk's text is its parts joined with single spaces, as in `chunk()`,
+        so sizes, splits and partitions are measured the same way in both modes. The
+        parts are exact substrings of the source text, separated there by any
+        whitespace (possibly none).
+        """
+        if source is None or not chunk.get('merged'):
+            return None
+        raw = source[chunk['start']:chunk['end']]
+        offsets = []
+        j = 0
+        for char in chunk['text']:
+            while j < len(raw) and raw[j] != char and raw[j].isspace():
+                j += 1
+            offsets.append(j)
+            if j < len(raw) and raw[j] == char:
+                j += 1
+            # else: a joining space with no whitespace between the parts in the source
+        offsets.append(len(raw))
+        return offsets
+
+    @staticmethod
+    def _source_range(start: int, offsets, begin: int, end: int) -> tuple[int, int]:
+        """Source offsets of the stripped piece text[begin:end] of a chunk starting at `start`."""
+        if offsets is None:
+            return start + begin, start + end
+        return start + offsets[begin], start + offsets[end - 1] + 1
+
+    def _text_atoms(self, text: str) -> list[tuple[int, int]]:
+        """
+        (start, end) offsets of the stripped paragraphs and sentences of `text`.
+        Pieces longer than max_chunk_size are split at words as in
+        `_split_large_text_chunk`.
+        """
+        paragraphs, sentences = self._text_boundaries(text)
+        cuts = sorted(set([p + 2 for p in paragraphs] + [e + 1 for e in sentences]))
+        cuts.append(len(text))
+        atoms = []
+        previous = 0
+        for cut in cuts:
+            piece = text[previous:cut]
+            stripped = piece.strip()
+            if stripped:
+                start = previous + piece.index(stripped[0])
+                if len(stripped) <= self.max_chunk_size:
+                    atoms.append((start, start + len(stripped)))
+                else:
+                    position = start
+                    for split_text in self._split_large_text_chunk(stripped):
+                        position = text.find(split_text, position)
+                        atoms.append((position, position + len(split_text)))
+                        position += len(split_text)
+            previous = cut
+        return atoms
+
+    def _balance_run(self, run: list[dict], source=None) -> Iterator:
+        """
+        Partitions a run of consecutive translatable atoms into chunks, like line
+        breaking: dynamic programming over the atom boundaries finds the fewest chunks
+        of at most max_chunk_size characters (an atom longer than that is a chunk on
+        its own) and, among those, the one with the smallest sum of squared sizes,
+        i.e. the smallest size variance. Atoms of one text keep the original
+        whitespace between them ('joiner'); atoms of different texts are joined with
+        a space, as in greedy mode.
+        """
+        count = len(run)
+        # offsets[k]: length of atoms[:k] joined, plus the joiner before atom k
+        offsets = [0] * (count + 1)
+        joins = [0] * count
+        for k, atom in enumerate(run):
+            joins[k] = 0 if k == 0 else (1 if atom.get('joiner') is None else len(atom['joiner']))
+            offsets[k + 1] = offsets[k] + joins[k] + len(atom['text'])
+
+        best = [(0, 0)] + [None] * count
+        back = [0] * (count + 1)
+        for end in range(1, count + 1):
+            for begin in range(end - 1, -1, -1):
+                size = offsets[end] - offsets[begin] - joins[begin]
+                if size > self.max_chunk_size and begin < end - 1:
+                    break
+                chunks, cost = best[begin]
+                candidate = (chunks + 1, cost + size * size)
+                if best[end] is None or candidate < best[end]:
+                    best[end], back[end] = candidate, begin
+
+        bounds = []
+        end = count
+        while end > 0:
+            bounds.append((back[end], end))
+            end = back[end]
+        for begin, end in reversed(bounds):
+            if source is not None:
+                yield ChunkSpan(run[begin]['start'], run[end - 1]['end'], 'text', True)
+                continue
+            parts = [run[begin]['text']]
+            for atom in run[begin + 1:end]:
+                parts.append(" " if atom.get('joiner') is None else atom['joiner'])
+                parts.append(atom['text'])
+            yield {'chunkText': "".join(parts), 'toTranslate': True, 'chunkType': 'text', 'index': -1}
+
+    def _split_chunks(self, potential_chunks, source=None) -> Iterator[dict]:
+        """
+        Step 2: Split large text chunks.
+        With a `source`, chunks also carry their `start`/`end` offsets; pieces of
+        merged chunks are mapped back to the source with `_merged_offsets`.
+        """
+        for chunk in potential_chunks:
+            text = chunk['text']
+            if source is None:
+                if chunk['translate'] and len(text) > self.max_chunk_size:
+                    for split_text in self._split_large_text_chunk(text):
+                        yield {'text': split_text, 'type': 'text', 'translate': True}
+                elif text:
+                    yield {'text': text, 'type': chunk['type'], 'translate': chunk['translate']}
+                continue
+
+            start = chunk['start']
+            if chunk['translate'] and len(text) > self.max_chunk_size:
+                # Split pieces are stripped substrings of the text, in order
+                offsets = self._merged_offsets(chunk, source)
+                position = 0
+                for split_text in self._split_large_text_chunk(text):
+                    position = text.find(split_text, position)
+                    piece_start, piece_end = self._source_range(start, offsets, position, position + len(split_text))
+                    yield {'text': split_text, 'type': 'text', 'translate': True, 'start': piece_start, 'end': piece_end}
+                    position += len(split_text)
+            elif text:
+                yield {'text': text, 'type': chunk['type'], 'translate': chunk['translate'],
+                       'start': start, 'end': chunk['end']}
     
+    def _chunk_markdown_ast(self, text: str) -> tuple[list[dict], dict]:
+        """
+        Chunks Markdown from its CommonMark block structure instead of pattern
+        matches. Split/merge sizes follow the same rules as smart mode.
+        """
+        return self._index_chunks(list(self._finalize_chunks(self._tokenize_markdown(text))))
+
+    def _tokenize_markdown(self, text: str) -> Iterator[dict]:
+        """
+        Parses `text` once and yields potential chunks (with `start`/`end` offsets)
+        from the top-level blocks of the token stream:
+        - fenced and indented code, and HTML <pre>/<code> blocks and comments: code
+        - paragraphs holding only images (possibly linked): image
+        - paragraphs holding only links or a bare URL, and link reference definitions: url
+        - everything else (headings, paragraphs, lists, quotes, tables, rules):
+          text, with consecutive blocks kept as one run so the source text between
+          them (e.g. paragraph breaks) is preserved; `_split_chunks` splits long runs.
+        """
+        tokens = self._markdown.parse(text)
+        # Token maps are line ranges; line_starts turns them into offsets
+        line_starts = [0]
+        line_starts.extend(match.end() for match in re.finditer("\n", text))
+        line_starts.append(len(text))
+
+        run_start = run_end = None
+        position = 0  # End of the previous top-level block
+        for index, token in enumerate(tokens):
+            if token.level != 0 or token.nesting == -1 or token.map is None:
+                continue
+            start = line_starts[min(token.map[0], len(line_starts) - 1)]
+            end = line_starts[min(token.map[1], len(line_starts) - 1)]
+            if token.type != "code_block":
+                # Indentation is part of an indented code block, not of other blocks
+                while start < end and text[start].isspace():
+                    start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if start >= end:
+                continue
+
+            # Text outside of any block can only be link reference definitions
+            gap = text[position:start]
+            chunk_type = "url" if gap.strip() else None
+            if chunk_type:
+                if run_start is not None:
+                    yield {'text': text[run_start:run_end], 'type': 'text', 'translate': True, 'start': run_start, 'end': run_end}
+                    run_start = None
+                gap_start = position + len(gap) - len(gap.lstrip())
+                gap_end = position + len(gap.rstrip())
+                yield {'text': text[gap_start:gap_end], 'type': 'url', 'translate': False, 'start': gap_start, 'end': gap_end}
+            position = end
+
+            chunk_type = self._markdown_block_type(token, tokens[index + 1] if index + 1 < len(tokens) else None)
+            if chunk_type is None:
+                if run_start is None:
+                    run_start = start
+                run_end = end
+                continue
+            if run_start is not None:
+                yield {'text': text[run_start:run_end], 'type': 'text', 'translate': True, 'start': run_start, 'end': run_end}
+                run_start = None
+            yield {'text': text[start:end], 'type': chunk_type, 'translate': False, 'start': start, 'end': end}
+
+        tail = text[position:]
+        if run_start is not None:
+            yield {'text': text[run_start:run_end], 'type': 'text', 'translate': True, 'start': run_start, 'end': run_end}
+        if tail.strip():
+            tail_start = position + len(tail) - len(tail.lstrip())
+            tail_end = position + len(tail.rstrip())
+            yield {'text': text[tail_start:tail_end], 'type': 'url', 'translate': False, 'start': tail_start, 'end': tail_end}
+
+    def _markdown_block_type(self, token, inline) -> str:
+        """Non-translatable chunk type of a top-level block token, or None for text."""
+        if token.type in ("fence", "code_block"):
+            return "code"
+        if token.type == "html_block":
+            opening = token.content.lstrip().lower()
+            if opening.startswith(("<pre", "<code", "<!--")):
+                return "code"
+            return "image" if opening.startswith("<img") else None
+        if token.type != "paragraph_open" or inline is None or inline.type != "inline":
+            return None
+
+        has_image = has_link = False
+        depth = 0  # Nesting of links; anything inside a link belongs to it
+        for child in inline.children or ():
+            if child.type == "link_open":
+                depth += 1
+                has_link = True
+            elif child.type == "link_close":
+                depth -= 1
+            elif child.type == "image":
+                has_image = True
+            elif depth or child.type in ("softbreak", "hardbreak"):
+                continue
+            elif child.type == "text" and not child.content.strip():
+                continue
+            elif child.type == "text" and self._bare_url.fullmatch(child.content.strip()):
+                has_link = True
+            else:
+                return None  # Translatable content outside links and images
+        if has_image:
+            return "image"
+        return "url" if has_link else None
+
     def _chunk_line(self, text: str) -> tuple[list[dict], dict]:
         """
         Chunks text by lines, ignoring empty lines.
@@ -599,156 +1414,131 @@ class SmartChunker:
         Chunks text based on a list of separator symbols.
         All chunks are considered translatable.
         """
-        chunks = []
+        chunks = list(self._iter_symbol(text))
         report = {
-            'total_chunks': 0,
-            'translatable_chunks': 0,
+            'total_chunks': len(chunks),
+            'translatable_chunks': len(chunks),
             'non_translatable_chunks': 0,
-            'text_chunks': 0
+            'text_chunks': len(chunks)
         }
-        
-        # Separators list is guaranteed non-empty by __init__ validation.
-        
-        # Start with the whole text
-        current_chunks = [text]
-        
-        # Iterate through separators and split chunks
-        for separator in self.separators:
-            if not separator:  # Skip empty separator
-                continue
-            
-            new_chunks = []
-            for chunk in current_chunks:
-                if separator in chunk:
-                    # Split by this separator and keep the order
-                    parts = chunk.split(separator)
-                    for part in parts:
-                        new_chunks.append(part)
-                else:
-                    new_chunks.append(chunk)
-            
-            # Update current_chunks for the next separator
-            current_chunks = new_chunks
-        
-        # Create final chunks
-        for i, chunk_text in enumerate(current_chunks):
-            chunk_text = chunk_text.strip()
-            if chunk_text:  # Skip empty chunks
-                chunk = {
-                    'chunkText': chunk_text,
-                    'toTranslate': True,
-                    'chunkType': 'text',
-                    'index': i
-                }
-                chunks.append(chunk)
-                report['total_chunks'] += 1
-                report['translatable_chunks'] += 1
-                report['text_chunks'] += 1
-        
         return chunks, report
+
+    def _iter_symbol(self, text: str) -> Iterator[dict]:
+        """
+        Yields the pieces of `text` between separator matches, stripped and indexed,
+        skipping empty ones. All separators are matched in one pass; where several
+        match at the same position the longest one wins. With `keep_separators` the
+        separator stays at the end of the piece it closes.
+        """
+        parts = self._symbol_pattern.split(text)
+        if self.keep_separators:
+            # The pattern captures the separators: [piece, separator, piece, ..., piece]
+            parts = [piece + separator for piece, separator in zip(parts[::2], parts[1::2] + [""])]
+        index = 0
+        for piece in parts:
+            piece = piece.strip()
+            if piece:
+                yield {'chunkText': piece, 'toTranslate': True, 'chunkType': 'text', 'index': index}
+                index += 1
     
     def _chunk_subtitle_srt(self, text: str) -> tuple[list[dict], dict]:
         """
         Chunks .srt subtitle files into timing sections (non-translatable) and content sections (translatable).
         Preserves original formatting.
         """
-        chunks = []
-        report = {
-            'total_chunks': 0,
-            'translatable_chunks': 0,
-            'non_translatable_chunks': 0,
-            'text_chunks': 0,
-            'timing_chunks': 0
-        }
-        
-        # Regular expression to match SRT format:
-        # 1. Line number
-        # 2. Timestamp line (00:00:00,000 --> 00:00:00,000)
-        # 3. Content (one or more lines)
-        # 4. Blank line
-        
-        import re
-        
-        # Initialize valid_srt_entries counter
-        valid_srt_entries = 0
-        
-        # First, split the text into subtitle entries by double newlines
-        entries = re.split(r'\n\s*\n', text)
-        entries = [entry.strip() for entry in entries if entry.strip()]
-        
-        # If no entries found, treat the entire text as a single chunk
-        if not entries:
-            chunks.append({
+        chunks = self._srt_entry_chunks(text)
+        # If no valid SRT entries were found, treat the entire text as a single chunk
+        if not chunks:
+            chunks = [{
                 'chunkText': text.strip(),
                 'toTranslate': True,
                 'chunkType': 'text',
                 'index': 0
-            })
-            report['total_chunks'] = 1
-            report['translatable_chunks'] = 1
-            report['text_chunks'] = 1
-            return chunks, report
-        
-        # Process each entry
-        for entry in entries:
-            lines = entry.split('\n')
-            
-            # First line should be the subtitle number
-            if not lines:
+            }]
+        report = {
+            'total_chunks': len(chunks),
+            'translatable_chunks': sum(chunk['toTranslate'] for chunk in chunks),
+            'non_translatable_chunks': sum(not chunk['toTranslate'] for chunk in chunks),
+            'text_chunks': sum(chunk['chunkType'] == 'text' for chunk in chunks),
+            'timing_chunks': sum(chunk['chunkType'] == 'timing' for chunk in chunks)
+        }
+        return chunks, report
+
+    def _srt_entry_chunks(self, text: str) -> list[dict]:
+        """
+        Timing and content chunks of the valid subtitle entries in `text`. An entry is
+        a line number, a timestamp line (00:00:00,000 --> 00:00:00,000) and content
+        lines, separated from the next entry by a blank line; other entries are skipped.
+        """
+        chunks = []
+        for entry in self._srt_entry_break.split(text):
+            entry = entry.strip()
+            if not entry:
                 continue
-                
-            line_num = lines[0].strip()
-            
-            # Second line should be the timestamp
+            lines = entry.split('\n')
             if len(lines) < 2:
                 continue
-                
+            line_num = lines[0].strip()
             timestamp = lines[1].strip()
-            
             # Check if it's a valid timestamp format
             if not re.match(r'\d{2}:\d{2}:\d{2},\d{3}\s*-->\s*\d{2}:\d{2}:\d{2},\d{3}', timestamp):
                 continue
-                
-            valid_srt_entries += 1
-            
-            # Create timing chunk (non-translatable)
-            timing_text = f"{line_num}\n{timestamp}"
-            timing_chunk = {
-                'chunkText': timing_text,
+
+            # Timing chunk (non-translatable)
+            chunks.append({
+                'chunkText': f"{line_num}\n{timestamp}",
                 'toTranslate': False,
                 'chunkType': 'timing',
                 'index': len(chunks)
-            }
-            chunks.append(timing_chunk)
-            report['total_chunks'] += 1
-            report['non_translatable_chunks'] += 1
-            report['timing_chunks'] = report.get('timing_chunks', 0) + 1
-            
+            })
             # If there are more lines, they are the content
-            if len(lines) > 2:
-                content = '\n'.join(lines[2:]).strip()
-                if content:
-                    content_chunk = {
-                        'chunkText': content,
-                        'toTranslate': True,
-                        'chunkType': 'text',
-                        'index': len(chunks)
-                    }
-                    chunks.append(content_chunk)
-                    report['total_chunks'] += 1
-                    report['translatable_chunks'] += 1
-                    report['text_chunks'] += 1
-        
-        # If no valid SRT entries were found, treat the entire text as a single chunk
-        if valid_srt_entries == 0:
-            chunks = [{
-                'chunkText': text.strip(),
-                'toTranslate': True,
-                'chunkType': 'text',
-                'index': 0
-            }]
-            report['total_chunks'] = 1
-            report['translatable_chunks'] = 1
-            report['text_chunks'] = 1
-        
-        return chunks, report
\ No newline at end of file
+            content = '\n'.join(lines[2:]).strip()
+            if content:
+                chunks.append({
+                    'chunkText': content,
+                    'toTranslate': True,
+                    'chunkType': 'text',
+                    'index': len(chunks)
+                })
+        return chunks
+
+
+# chunk_parallel() worker process state
+_parallel_state = {}
+
+
+def _strip_verbose(pattern: str) -> str:
+    """Removes the whitespace and comments that re.VERBOSE ignores from `pattern`."""
+    out = []
+    i = 0
+    in_class = False
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            out.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            # A "]" right after "[" or "[^" is a literal
+            in_class = char != "]" or out[-1] == "[" or out[-2:] == ["[", "^"]
+        elif char == "[":
+            in_class = True
+        elif char.isspace():
+            i += 1
+            continue
+        elif char == "#":
+            end = pattern.find("\n", i)
+            i = len(pattern) if end < 0 else end
+            continue
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _parallel_init(settings: tuple, text: str):
+    _parallel_state['chunker'] = SmartChunker(*settings)
+    _parallel_state['text'] = text
+
+
+def _parallel_scan(start: int, limit: int) -> tuple[list[dict], int]:
+    return _parallel_state['chunker']._scan_range(_parallel_state['text'], start, limit)
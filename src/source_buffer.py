@@ -0,0 +1,203 @@
+import mmap
+from typing import Iterator, List, NamedTuple, Optional
+
+
+class ChunkSpan(NamedTuple):
+    """A chunk as a character range [start, end) of the source document."""
+    start: int
+    end: int
+    type: str
+    translate: bool
+
+    def text(self, source) -> str:
+        """Materializes the chunk text from `source` (a str or SourceBuffer)."""
+        return source[self.start:self.end]
+
+
+class SourceBuffer:
+    """
+    Immutable document text shared by every chunk of a job.
+
+    Holds either a Python string or a read-only memory map of a UTF-8 file. For
+    memory-mapped files the byte offset of every CHECKPOINT-th character is
+    recorded once, so a character range is decoded from the nearest checkpoint
+    instead of from the start of the file.
+
+    Copying a buffer (including deepcopy of the graph state) returns the same
+    object. Pickling a memory-mapped buffer stores only the file path and the
+    checkpoints, so graph checkpoints do not carry the document; the file is
+    mapped again on the first read after unpickling or close().
+    """
+
+    CHECKPOINT = 4096
+
+    def __init__(self, text: str = ""):
+        if not isinstance(text, str):
+            raise TypeError("SourceBuffer text must be a string.")
+        self._text: Optional[str] = text
+        self._mmap = None
+        self._file = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._checkpoints: List[int] = []
+        self._length = len(text)
+
+    @classmethod
+    def from_file(cls, path: str) -> "SourceBuffer":
+        """Memory-maps a UTF-8 file. Raises UnicodeDecodeError for invalid UTF-8."""
+        buffer = cls()
+        handle = open(path, "rb")
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            handle.close()
+            return buffer
+        buffer._text, buffer._file, buffer._mmap = None, handle, mapped
+        buffer._path, buffer._size = path, len(mapped)
+        try:
+            buffer._index()
+        except Exception:
+            buffer.close(keep_text=False)
+            raise
+        return buffer
+
+    @classmethod
+    def _from_checkpoints(cls, path: str, size: int, length: int, checkpoints: List[int]) -> "SourceBuffer":
+        """Unpickles a memory-mapped buffer; the file is mapped on the first read."""
+        buffer = cls()
+        buffer._text = None
+        buffer._path, buffer._size = path, size
+        buffer._length, buffer._checkpoints = length, checkpoints
+        return buffer
+
+    def _open(self):
+        """Maps the file again after close() or unpickling."""
+        handle = open(self._path, "rb")
+        try:
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            handle.close()
+            mapped = None
+        if mapped is None or len(mapped) != self._size:
+            if mapped is not None:
+                mapped.close()
+                handle.close()
+            raise ValueError(f"Source file {self._path} changed since it was indexed.")
+        self._file, self._mmap = handle, mapped
+
+    def _index(self):
+        """Counts characters and records checkpoint byte offsets in one pass."""
+        checkpoints = [0]
+        length = 0
+        for byte_start, text in self._iter_decoded(1 << 20):
+            # Byte offset of every checkpoint character that falls inside this block
+            next_checkpoint = len(checkpoints) * self.CHECKPOINT
+            position, byte_position = 0, byte_start
+            while next_checkpoint < length + len(text):
+                offset = next_checkpoint - length
+                byte_position += len(text[position:offset].encode("utf-8"))
+                position = offset
+                checkpoints.append(byte_position)
+                next_checkpoint += self.CHECKPOINT
+            length += len(text)
+        self._checkpoints = checkpoints
+        self._length = length
+
+    def _iter_decoded(self, block_bytes: int) -> Iterator[tuple]:
+        """Yields (byte offset, text) for consecutive blocks of the mapped file."""
+        mapped = self._mmap
+        size = len(mapped)
+        position = 0
+        while position < size:
+            end = self._char_boundary(min(size, position + block_bytes))
+            if end <= position:
+                end = size
+            yield position, mapped[position:end].decode("utf-8")
+            position = end
+
+    def _char_boundary(self, position: int) -> int:
+        """Moves `position` back to the start of a UTF-8 character."""
+        mapped = self._mmap
+        while 0 < position < len(mapped) and (mapped[position] & 0xC0) == 0x80:
+            position -= 1
+        return position
+
+    @property
+    def is_mapped(self) -> bool:
+        return self._mmap is not None
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, key) -> str:
+        if not isinstance(key, slice):
+            raise TypeError("SourceBuffer only supports slicing.")
+        start, stop, step = key.indices(self._length)
+        if step != 1:
+            raise ValueError("SourceBuffer slices must be contiguous.")
+        if self._text is not None:
+            return self._text[start:stop]
+        if stop <= start:
+            return ""
+        if self._mmap is None:
+            self._open()
+        checkpoint = start // self.CHECKPOINT
+        base = checkpoint * self.CHECKPOINT
+        byte_start = self._checkpoints[checkpoint]
+        # A character is at most 4 bytes long
+        byte_end = self._char_boundary(min(len(self._mmap), byte_start + 4 * (stop - base)))
+        return self._mmap[byte_start:byte_end].decode("utf-8")[start - base:stop - base]
+
+    def text(self) -> str:
+        """Materializes the whole document."""
+        return self[0:self._length]
+
+    def iter_blocks(self, block_size: int = 1 << 16) -> Iterator[str]:
+        """Yields the document as consecutive text blocks of about `block_size` characters."""
+        if self._text is not None:
+            for start in range(0, self._length, max(1, block_size)):
+                yield self._text[start:start + block_size]
+            return
+        if self._mmap is None:
+            self._open()
+        # UTF-8 text is at least one byte per character
+        for _, text in self._iter_decoded(max(1, block_size)):
+            yield text
+
+    def close(self, keep_text: bool = True):
+        """
+        Releases the memory map and the file. Existing spans stay valid (the file is
+        mapped again on the next read) unless keep_text is False (the buffer is then
+        empty).
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+        if not keep_text and self._text is None:
+            self._text, self._length, self._checkpoints = "", 0, []
+            self._path, self._size = None, 0
+
+    def __enter__(self) -> "SourceBuffer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(keep_text=False)
+        return False
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        if self._text is None:
+            return (SourceBuffer._from_checkpoints, (self._path, self._size, self._length, self._checkpoints))
+        return (SourceBuffer, (self._text,))
+
+    def __repr__(self) -> str:
+        kind = "mapped" if self._mmap is not None else "str"
+        return f"SourceBuffer({kind}, {self._length} chars)"
+
@@ -2,6 +2,11 @@ import time
 from typing import List, Dict, Optional, Any, Literal
 from typing_extensions import TypedDict
 
+try:
+    from .chunk_table import ChunkTable
+except ImportError: # Fallback for direct script execution
+    from chunk_table import ChunkTable
+
 LogLevel = Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
 
 class LogEntry(TypedDict):
@@ -25,6 +30,7 @@ class TerminologyEntry(TypedDict):
 class TranslationState(TypedDict):
     job_id: str
     original_content: str
+    original_content_path: Optional[str] # UTF-8 source file to memory-map instead of original_content
     original_file_type: Optional[str] # e.g., '.srt', '.txt'
     config: Dict[str, Any] # source_lang, target_lang, model_info, api_key_source etc.
     current_step: Optional[str] # Name of the current node/phase
@@ -32,13 +38,8 @@ class TranslationState(TypedDict):
     logs: List[LogEntry]
 
     # Core data flow
-    chunks: Optional[List[str]]  # Translatable chunks text only
-    chunks_with_metadata: Optional[List[Dict[str, Any]]]  # All chunks with metadata
-    non_translatable_chunks: Optional[List[Dict[str, Any]]]  # Non-translatable chunks
+    chunk_table: Optional[ChunkTable]  # All chunks (type, translate flag, text or span) and per-stage outputs (translation, critique, final, error)
     contextualized_glossary: Optional[List[Dict[str, Any]]]  # Enhanced terms with context
-    translated_chunks: Optional[List[Optional[str]]]  # Translated chunks
-    parallel_worker_results: Optional[List[Dict[str, Any]]]  # Intermediate results
-    critiques: Optional[List[Dict[str, Any]]]  # Structured feedback from critique stage
 
     # Output & Errors
     final_document: Optional[str]
@@ -46,3 +47,8 @@ class TranslationState(TypedDict):
 
     # Metrics
     metrics: Metrics
+    llm_calls: Optional[List[tuple]] # (stage, chunk_chars, output_chars, seconds) of every LLM call of this job
+    llm_call_history: Optional[List[tuple]] # Past calls (same records as llm_calls) of the same provider/model, loaded by the worker for chunk size auto-tuning
+    pending_chunks: Optional[Dict[str, List[int]]] # Chunk indices batched nodes still have to process (CHECKPOINT_BATCH_CHUNKS), by node name
+    stored_chunks: Optional[List[Dict[str, Any]]] # Chunk outputs of an earlier run of the job (job_chunks), seeded into the chunk table by the worker
+    base_job_id: Optional[str] # Incremental run: the job whose stored chunks are in stored_chunks (None when they are this job's own)
@@ -0,0 +1,252 @@
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+
+# Compact background vocabulary used when no background corpus file is configured.
+# Words in this list are treated as "seen everywhere", so they score low on their own
+# and can never start or end a multi-word candidate.
+_DEFAULT_BACKGROUND_WORDS = """
+a about above after again against all almost also although always am among an and another any
+are around as at be because been before being below between both but by can cannot could did
+do does doing done down during each either else enough even ever every few first for from
+further get gets given go goes going good got had has have having he her here hers herself him
+himself his how however i if in into is it its itself just last least less let like made make
+makes many may me might more most much must my myself need never new next no nor not now of
+off often on once one only or other others our ours ourselves out over own per perhaps rather
+same second see seen several shall she should since so some something such than that the their
+theirs them themselves then there these they this those though three through thus to too two
+under until up upon us use used uses using very via was we well were what when where whether
+which while who whom whose why will with within without would yet you your yours yourself
+yourselves example examples following follows figure chapter section part note notes page
+pages way ways thing things time times number numbers value values case cases type types
+different important possible simple able called call calls show shows shown also able
+"""
+
+DEFAULT_BACKGROUND = frozenset(_DEFAULT_BACKGROUND_WORDS.split())
+
+_WORD_RE = re.compile(r"[^\W\d_][\w'\-]*[\w]|[^\W\d_]", re.UNICODE)
+_FENCED_CODE_RE = re.compile(r"^(```|~~~).*?^\1[ \t]*$", re.MULTILINE | re.DOTALL)
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+# Code identifiers: camelCase / PascalCase with an inner capital, snake_case,
+# dotted names and call syntax (init_db()). Every part of a dotted name after a
+# dot is at least 2 characters and has an underscore, a digit or an inner
+# capital (self.max_size), unless the name is called (os.path.join()), so
+# abbreviations and host names in prose (e.g., i.e., example.com) are not code.
+_CODE_IDENTIFIER_RE = re.compile(
+    r"""
+    (?<![\w.])
+    (
+        [A-Za-z_][A-Za-z0-9_]*
+        (?:\.(?=[A-Za-z0-9_]*(?:_|\d|[a-z][A-Z]))[A-Za-z_][A-Za-z0-9_]+)+(?:\(\))?  # dotted.name_x
+      | [A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]+)+\(\)                    # dotted.call()
+      | [a-z]+[A-Z][A-Za-z0-9]*(?:\(\))?                                          # camelCase
+      | [A-Z][a-z0-9]+[A-Z][A-Za-z0-9]*(?:\(\))?                                  # PascalCase
+      | [A-Za-z][A-Za-z0-9]*_[A-Za-z0-9_]+(?:\(\))?                               # snake_case
+      | [A-Za-z_][A-Za-z0-9_]*\(\)                                                # call()
+    )
+    (?![\w]|\.\w)
+    """,
+    re.VERBOSE,
+)
+_ACRONYM_RE = re.compile(r"^[A-Z][A-Z0-9]{1,7}s?$")
+
+
+def load_background_corpus(path: str) -> Counter:
+    """
+    Builds word frequencies from a plain-text background corpus file.
+    Every line may be either free text or "word<TAB>count".
+    """
+    counts = Counter()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 2 and parts[1].strip().isdigit():
+                counts[parts[0].strip().lower()] += int(parts[1])
+            else:
+                for word in _WORD_RE.findall(line):
+                    counts[word.lower()] += 1
+    return counts
+
+
+class TermCandidateMiner:
+    """
+    CPU-side terminology candidate miner.
+
+    Scores word n-grams with TF-IDF against a background vocabulary and adds
+    capitalization, acronym and code-identifier heuristics. The result is a ranked
+    list of candidate terms that an LLM only has to translate and validate, instead
+    of reading the whole document to discover them.
+    """
+
+    def __init__(self, max_ngram: int = 3, min_frequency: int = 2,
+                 background: Optional[Counter] = None):
+        if max_ngram < 1:
+            raise ValueError("max_ngram must be at least 1")
+        self.max_ngram = max_ngram
+        self.min_frequency = max(1, min_frequency)
+        # Background frequencies: either a real corpus or the built-in vocabulary.
+        if background:
+            self.background = background
+            self.background_total = sum(background.values())
+        else:
+            self.background = Counter({w: 1000 for w in DEFAULT_BACKGROUND})
+            self.background_total = 1000 * len(DEFAULT_BACKGROUND)
+
+    def _is_background(self, word: str) -> bool:
+        lowered = word.lower()
+        if lowered in DEFAULT_BACKGROUND:
+            return True
+        # With a real corpus, anything more frequent than 1 in 10k words is background.
+        return self.background.get(lowered, 0) * 10000 >= self.background_total
+
+    def _idf(self, words: Iterable[str]) -> float:
+        # An n-gram is as rare as its most common component, so we use the
+        # highest background count among its words.
+        bg_count = max(self.background.get(w.lower(), 0) for w in words)
+        return math.log((self.background_total + 1) / (bg_count + 1)) + 1.0
+
+    def mine(self, regions: List[str], max_candidates: int = 300) -> List[Dict[str, object]]:
+        """
+        Mines ranked term candidates from a list of text regions.
+
+        Returns a list of dicts with `term`, `score`, `frequency`, `regions`
+        (number of regions containing the term), `kinds` and a short `context`
+        sentence, sorted by descending score.
+        """
+        freq = Counter()
+        region_freq = Counter()
+        kinds = defaultdict(set)
+        contexts: Dict[str, str] = {}
+        surfaces = defaultdict(Counter)
+
+        for region in regions:
+            if not region:
+                continue
+            seen_in_region = set()
+            prose = _FENCED_CODE_RE.sub(" ", region)
+
+            for sentence in _SENTENCE_SPLIT_RE.split(prose):
+                if not sentence.strip():
+                    continue
+                found = self._candidates_in_sentence(sentence)
+                for key, term, kind in found:
+                    freq[key] += 1
+                    kinds[key].add(kind)
+                    surfaces[key][term] += 1
+                    if key not in contexts:
+                        contexts[key] = " ".join(sentence.split())[:160]
+                    seen_in_region.add(key)
+
+            for key in seen_in_region:
+                region_freq[key] += 1
+
+        scored = []
+        region_count = max(1, len([r for r in regions if r]))
+        for key, count in freq.items():
+            term_kinds = kinds[key]
+            special = term_kinds & {"acronym", "code", "proper"}
+            if count < self.min_frequency and not special:
+                continue
+            words = key.split(" ")
+            score = (1.0 + math.log(count)) * self._idf(words)
+            # Terms that show up across many regions are likely book-wide terminology.
+            score *= 1.0 + region_freq[key] / region_count
+            if len(words) > 1:
+                score *= 1.0 + 0.5 * (len(words) - 1)
+            if "acronym" in term_kinds:
+                score *= 2.0
+            if "code" in term_kinds:
+                score *= 2.0
+            if "proper" in term_kinds:
+                score *= 1.5
+            scored.append((score, key))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        scored = self._drop_subsumed(scored[:max_candidates * 3], freq)
+
+        return [
+            {
+                "term": surfaces[key].most_common(1)[0][0],
+                "score": round(score, 4),
+                "frequency": freq[key],
+                "regions": region_freq[key],
+                "kinds": sorted(kinds[key]),
+                "context": contexts.get(key, ""),
+            }
+            for score, key in scored[:max_candidates]
+        ]
+
+    def _candidates_in_sentence(self, sentence: str):
+        """Returns (key, surface_term, kind) tuples for one sentence."""
+        found = []
+
+        for match in _CODE_IDENTIFIER_RE.finditer(sentence):
+            term = match.group(1)
+            found.append((term, term, "code"))
+        # Replace identifiers with a barrier so n-grams never span across them.
+        prose = _CODE_IDENTIFIER_RE.sub(" | ", sentence)
+
+        words = [(m.group(0), m.start()) for m in _WORD_RE.finditer(prose)]
+        lowered = [w.lower() for w, _ in words]
+
+        for n in range(1, self.max_ngram + 1):
+            for i in range(len(words) - n + 1):
+                span = words[i:i + n]
+                if n > 1:
+                    gap_text = prose[span[0][1]:span[-1][1]]
+                    if any(p in gap_text for p in "|,;:()\""):
+                        continue
+                if self._is_background(lowered[i]) or self._is_background(lowered[i + n - 1]):
+                    continue
+                if n == 1:
+                    word = span[0][0]
+                    if _ACRONYM_RE.match(word):
+                        # "APIs" and "API" are the same term.
+                        key = word[:-1] if word.endswith("s") else word
+                        found.append((key, key, "acronym"))
+                        continue
+                    if len(word) < 3:
+                        continue
+                key = " ".join(lowered[i:i + n])
+                term = " ".join(w for w, _ in span)
+                # Capitalized away from the sentence start: likely a proper name.
+                capitalized = all(w[0].isupper() for w, _ in span)
+                kind = "proper" if capitalized and (i > 0 or n > 1) else "ngram"
+                found.append((key, term, kind))
+        return found
+
+    @staticmethod
+    def _drop_subsumed(scored, freq):
+        """Drops n-grams that only ever occur inside a longer kept candidate."""
+        kept = []
+        kept_keys = []
+        for score, key in scored:
+            subsumed = False
+            for longer in kept_keys:
+                if len(longer) > len(key) and f" {key} " in f" {longer} " and freq[longer] >= freq[key]:
+                    subsumed = True
+                    break
+            if not subsumed:
+                kept.append((score, key))
+                kept_keys.append(key)
+        return kept
+
+
+def mine_term_candidates(regions: List[str], max_candidates: int = 300, max_ngram: int = 3,
+                         min_frequency: int = 2, background_path: Optional[str] = None) -> List[Dict[str, object]]:
+    """Convenience wrapper: mines ranked term candidates from text regions."""
+    background = None
+    if background_path and os.path.exists(background_path):
+        background = load_background_corpus(background_path)
+    miner = TermCandidateMiner(max_ngram=max_ngram, min_frequency=min_frequency, background=background)
+    return miner.mine(regions, max_candidates=max_candidates)
+
+
+def batch_candidates(candidates: List[Dict[str, object]], batch_size: int) -> List[List[Dict[str, object]]]:
+    """Splits the ranked candidate list into batches for compact LLM requests."""
+    batch_size = max(1, batch_size)
+    return [candidates[i:i + batch_size] for i in range(0, len(candidates), batch_size)]
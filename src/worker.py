@@ -11,14 +11,57 @@ import queue
 from .job_queue import JobQueue
 from . import graph
 from .state import TranslationState
+from .chunk_table import TRANSLATION, CRITIQUE, FINAL
+from .providers import resolve_provider_model
+from .checkpoints import run_config, has_checkpoint, delete_checkpoints
+from .source_buffer import SourceBuffer
 from langchain_core.callbacks import BaseCallbackHandler
 from .database import (
-    add_log, add_chunk, update_chunk, get_chunks,
-    add_glossary_entry, add_critique, add_metrics, get_job
+    add_log, add_chunk, update_chunk, get_chunks, delete_chunks_from,
+    add_glossary_entry, add_critique, add_metrics, get_job,
+    add_llm_calls, get_llm_call_history, get_jobs_by_status,
+    write_source_file, delete_source_file
 )
 
 logger = logging.getLogger("turjuman.worker")
 
+RESUME_STEP = "resume_from_checkpoint" # current_step of interrupted jobs queued to resume from their checkpoint
+
+def stored_chunk_records(rows) -> List[Dict[str, Any]]:
+    """
+    job_chunks rows as the records seed_stored_chunks expects (state["stored_chunks"]).
+    Rows without a translation are kept (translation None): incremental runs need
+    every source text of the base job to tell edited chunks from unchanged ones.
+    """
+    records = []
+    for row in rows:
+        try:
+            critique = json.loads(row["critique_feedback"]) if row.get("critique_feedback") else None
+        except (TypeError, ValueError):
+            critique = None
+        records.append({
+            "index": row["chunk_index"],
+            "source": row["original_chunk"],
+            "translation": row.get("translated_chunk") or None,
+            "critique": critique,
+            "final": row.get("refined_chunk"),
+        })
+    return records
+
+def count_source_words(state: Dict[str, Any]) -> int:
+    """Word count of the job's source, read block by block from its source file."""
+    path = state.get("original_content_path")
+    if not path:
+        return len((state.get("original_content") or "").split())
+    count, open_word = 0, False
+    with SourceBuffer.from_file(path) as source:
+        for block in source.iter_blocks():
+            count += len(block.split())
+            if open_word and not block[0].isspace():
+                count -= 1 # A word split across two blocks
+            open_word = not block[-1].isspace()
+    return count
+
 class TranslationWorker:
     def __init__(self):
         self.job_queue = JobQueue()
@@ -29,6 +72,7 @@ class TranslationWorker:
         """Start the worker process."""
         self.running = True
         logger.info("Translation worker started")
+        await self.resume_interrupted_jobs()
         
         while self.running:
             try:
@@ -38,6 +82,7 @@ class TranslationWorker:
                 if job:
                     # Process the job
                     logger.info(f"Processing job {job['job_id']}")
+                    resume = job.get("current_step") == RESUME_STEP and self.checkpoint_exists(job['job_id'])
                     self.current_job = job
                     await self.job_queue.update_job_status(
                         job['job_id'], 
@@ -46,32 +91,12 @@ class TranslationWorker:
                     )
                     
                     try:
-                        # Prepare input state
-                        config = json.loads(job['config_json']) if job['config_json'] else {}
-                        glossary = None
-                        try:
-                            if job.get('glossary_json'):
-                                glossary = json.loads(job['glossary_json'])
-                                if not isinstance(glossary, list): # Basic validation
-                                    logger.warning(f"Job {job['job_id']}: Invalid glossary format in DB (not a list), ignoring.")
-                                    glossary = None
-                        except json.JSONDecodeError:
-                            logger.error(f"Job {job['job_id']}: Failed to parse glossary_json from DB, ignoring.")
-                            glossary = None
-
-                        input_state = {
-                            "job_id": job['job_id'],
-                            "original_content": job['original_content'],
-                            "original_file_type": job.get('original_file_type', '.txt'), # Add file type, default to .txt
-                            "config": config,
-                            "contextualized_glossary": glossary, # Add the loaded glossary
-                            "current_step": None,
-                            "progress_percent": 0.0,
-                            "logs": []
-                        }
-
-                        # Process with state updates
-                        await self.process_job(job['job_id'], input_state)
+                        if resume:
+                            # Interrupted by a server restart: continue from the last checkpoint
+                            await add_log(job['job_id'], "INFO", "Resuming interrupted job from its last checkpoint.", "worker")
+                            await self.process_job(job['job_id'], None)
+                        else:
+                            await self.process_job(job['job_id'], await self.prepare_input_state(job))
                         
                     except Exception as e:
                         logger.exception(f"Error processing job {job['job_id']}")
@@ -80,6 +105,8 @@ class TranslationWorker:
                             "failed", 
                             error_info=f"Worker error: {str(e)}"
                         )
+                        delete_checkpoints(graph.memory, job['job_id'])
+                        delete_source_file(job['job_id'])
                     
                     self.current_job = None
                 else:
@@ -90,8 +117,96 @@ class TranslationWorker:
                 logger.exception("Error in worker loop")
                 await asyncio.sleep(10)  # Wait longer on error
     
-    async def process_job(self, job_id: str, input_state: Dict[str, Any]):
-        """Process a translation job and update the database."""
+    async def resume_interrupted_jobs(self):
+        """
+        Queues the jobs a previous server run left in 'processing' again. Jobs with a
+        graph checkpoint are marked to resume from it when the worker loop reaches them;
+        the others run again from the start.
+        """
+        for job in await get_jobs_by_status("processing"):
+            job_id = job['job_id']
+            if self.checkpoint_exists(job_id):
+                logger.info(f"Job {job_id} was interrupted, queueing it to resume from its last checkpoint.")
+                await self.job_queue.update_job_status(job_id, "pending", current_step=RESUME_STEP)
+            else:
+                logger.info(f"Job {job_id} was interrupted without a checkpoint, queueing it again.")
+                await self.job_queue.update_job_status(job_id, "pending", progress=0.0, current_step="requeued")
+
+    @staticmethod
+    def checkpoint_exists(job_id: str) -> bool:
+        try:
+            return has_checkpoint(graph.memory, job_id)
+        except Exception:
+            logger.exception(f"Job {job_id}: Failed to read its checkpoint.")
+            return False
+
+    async def prepare_input_state(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Graph input of a job run from the start."""
+        config = json.loads(job['config_json']) if job['config_json'] else {}
+        glossary = None
+        try:
+            if job.get('glossary_json'):
+                glossary = json.loads(job['glossary_json'])
+                if not isinstance(glossary, list): # Basic validation
+                    logger.warning(f"Job {job['job_id']}: Invalid glossary format in DB (not a list), ignoring.")
+                    glossary = None
+        except json.JSONDecodeError:
+            logger.error(f"Job {job['job_id']}: Failed to parse glossary_json from DB, ignoring.")
+            glossary = None
+
+        # Past LLM call latencies of this provider/model (chunk size auto-tuning)
+        provider, model = resolve_provider_model(config)
+        try:
+            llm_call_history = [(row["stage"], row["chunk_chars"], row["output_chars"], row["latency_seconds"])
+                                for row in await get_llm_call_history(provider, model)]
+        except Exception:
+            logger.exception(f"Job {job['job_id']}: Failed to load LLM call history, auto-tuning disabled.")
+            llm_call_history = []
+
+        # The source is memory-mapped from a file, so graph checkpoints do not carry its text
+        source_path = write_source_file(job['job_id'], job['original_content']) if job['original_content'] else None
+        input_state = {
+            "job_id": job['job_id'],
+            "original_content": "" if source_path else job['original_content'],
+            "original_content_path": source_path,
+            "original_file_type": job.get('original_file_type', '.txt'), # Add file type, default to .txt
+            "config": config,
+            "contextualized_glossary": glossary, # Add the loaded glossary
+            "llm_call_history": llm_call_history,
+            "current_step": None,
+            "progress_percent": 0.0,
+            "logs": []
+        }
+        return input_state
+
+    async def process_job(self, job_id: str, input_state: Optional[Dict[str, Any]]):
+        """
+        Process a translation job and update the database. With input_state None the
+        job continues from its last checkpoint.
+        """
+        resume = input_state is None
+        stored_rows = {row["chunk_index"]: row for row in await get_chunks(job_id)}
+        if resume:
+            graph_input = None
+            input_state = dict(graph.app.get_state(run_config(job_id)).values)
+        else:
+            graph_input = input_state
+            delete_checkpoints(graph.memory, job_id) # Stale checkpoints of an earlier run of this job
+            # Chunks an earlier (failed or interrupted) run already translated, critiqued or refined
+            input_state["stored_chunks"] = stored_chunk_records(stored_rows.values())
+            base_job_id = (input_state.get("config") or {}).get("base_job_id")
+            if base_job_id:
+                # Incremental run: reuse the base job's outputs for the unchanged chunks this
+                # job has not stored yet (all base records are kept to tell edited chunks apart)
+                own_sources = {row["original_chunk"] for row in stored_rows.values()}
+                base_records = stored_chunk_records(await get_chunks(base_job_id))
+                for record in base_records:
+                    record["base"] = True
+                    if record["source"] in own_sources:
+                        record.update(translation=None, critique=None, final=None)
+                input_state["stored_chunks"] += base_records
+                input_state["base_job_id"] = base_job_id
+        
         # Create a state handler to capture updates
         state_queue = queue.Queue()
         
@@ -104,10 +219,10 @@ class TranslationWorker:
                         # outputs is the current state after node execution
                         state_queue.put(copy.deepcopy(outputs))
                 
-                # Run the graph with callbacks
+                # Run the graph with callbacks (from the last checkpoint when resuming)
                 final_state = graph.app.invoke(
-                    input_state,
-                    config={"callbacks": [ProgressHandler()]}
+                    graph_input,
+                    config=run_config(job_id, [ProgressHandler()])
                 )
                 
                 # Put the final state in the queue
@@ -124,6 +239,10 @@ class TranslationWorker:
         # Process state updates as they come in
         last_progress = 0
         last_step = None
+        stored_llm_calls = len(input_state.get("llm_calls") or []) # Stored before an interruption
+        stored_critiques = {i for i, row in stored_rows.items() if row.get("critique_feedback")}
+        provider, model = resolve_provider_model(input_state.get("config") or {})
+        source_words = None
         
         while thread.is_alive() or not state_queue.empty():
             # Process any state updates
@@ -169,29 +288,10 @@ class TranslationWorker:
                                 log.get("node")
                             )
                     
-                    # Store chunks if available
-                    if state.get("chunks"):
-                        chunks = state.get("chunks", [])
-                        translated_chunks = state.get("translated_chunks", [None] * len(chunks))
-                        
-                        for i, (orig, trans) in enumerate(zip(chunks, translated_chunks)):
-                            # Check if chunk already exists
-                            existing_chunks = await get_chunks(job_id)
-                            chunk_exists = any(c["chunk_index"] == i for c in existing_chunks)
-                            
-                            if chunk_exists:
-                                # Update existing chunk
-                                for chunk in existing_chunks:
-                                    if chunk["chunk_index"] == i:
-                                        updates = {}
-                                        if trans:
-                                            updates["translated_chunk"] = trans
-                                        
-                                        if updates:
-                                            await update_chunk(chunk["chunk_id"], updates)
-                            else:
-                                # Add new chunk
-                                await add_chunk(job_id, i, orig)
+                    # Store chunks and their stage outputs (a later run of the job reuses them)
+                    table = state.get("chunk_table")
+                    if table and table.translatable_count:
+                        await self.store_chunks(job_id, table, stored_rows)
                     
                     # Store glossary if available
                     if state.get("contextualized_glossary"):
@@ -208,9 +308,12 @@ class TranslationWorker:
                                     metadata={"language": lang}
                                 )
                     
-                    # Store critiques if available
-                    if state.get("critiques"):
-                        for i, critique in enumerate(state.get("critiques", [])):
+                    # Store critiques not stored yet
+                    if table and table.has_stage(CRITIQUE):
+                        for i, critique in enumerate(table.stage_values(CRITIQUE)):
+                            if critique is None or i in stored_critiques:
+                                continue
+                            stored_critiques.add(i)
                             await add_critique(
                                 job_id,
                                 i,
@@ -220,6 +323,12 @@ class TranslationWorker:
                                 metadata=critique
                             )
                     
+                    # Store the latencies of LLM calls made since the last update
+                    llm_calls = state.get("llm_calls") or []
+                    if len(llm_calls) > stored_llm_calls:
+                        await add_llm_calls(job_id, provider, model, llm_calls[stored_llm_calls:])
+                        stored_llm_calls = len(llm_calls)
+                    
                     # Check for final document
                     if state.get("final_document"):
                         await self.job_queue.update_job_status(
@@ -234,13 +343,15 @@ class TranslationWorker:
                         metrics = state.get("metrics", {})
                         
                         # Add word counts
-                        metrics["word_count_source"] = len(input_state.get("original_content", "").split())
+                        if source_words is None:
+                            source_words = count_source_words(input_state)
+                        metrics["word_count_source"] = source_words
                         if state.get("final_document"):
                             metrics["word_count_target"] = len(state.get("final_document", "").split())
                         
                         # Add total chunks
-                        if state.get("chunks"):
-                            metrics["total_chunks"] = len(state.get("chunks", []))
+                        if table:
+                            metrics["total_chunks"] = table.translatable_count
                         
                         await add_metrics(job_id, metrics)
                     
@@ -263,7 +374,49 @@ class TranslationWorker:
                 "failed",
                 error_info="Job processing did not complete properly"
             )
+        # Only jobs interrupted by a restart resume from their checkpoint; a failed job
+        # is retried from its stored chunks
+        delete_checkpoints(graph.memory, job_id)
+        # A retry writes the source file again from the job's stored content
+        delete_source_file(job_id)
     
+    async def store_chunks(self, job_id: str, table, stored_rows: Dict[int, Dict[str, Any]]):
+        """
+        Writes the chunks of the table and their translation, critique and refined
+        text to job_chunks, updating only the values that changed since the last
+        state update (stored_rows mirrors the stored rows by chunk index). Rows past
+        the table's chunks, left by a stored run that was chunked into more chunks,
+        are deleted.
+        """
+        stale = [i for i in stored_rows if i >= table.translatable_count]
+        if stale:
+            await delete_chunks_from(job_id, table.translatable_count)
+            for i in stale:
+                del stored_rows[i]
+        translations = table.stage_values(TRANSLATION)
+        critiques = table.stage_values(CRITIQUE)
+        finals = table.stage_values(FINAL)
+        for i, orig in enumerate(table.source_texts()):
+            critique = critiques[i]
+            values = {
+                "original_chunk": orig,
+                "translated_chunk": translations[i],
+                # Failed critiques are not kept, so a later run critiques the chunk again
+                "critique_feedback": json.dumps(critique, ensure_ascii=False) if isinstance(critique, dict) and "error" not in critique else None,
+                # Only set once the chunk is refined (or kept as translated by the refinement gate)
+                "refined_chunk": finals[i],
+            }
+            row = stored_rows.get(i)
+            if row is None:
+                row = stored_rows[i] = {"chunk_id": await add_chunk(job_id, i, orig), "original_chunk": orig}
+            if row.get("original_chunk") != orig:
+                updates = values # Chunked differently than the stored run: replace the row
+            else:
+                updates = {key: value for key, value in values.items() if value is not None and row.get(key) != value}
+            if updates:
+                await update_chunk(row["chunk_id"], updates)
+                row.update(updates)
+
     async def stop(self):
         """Stop the worker process."""
         self.running = False
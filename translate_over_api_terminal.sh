@@ -209,11 +209,8 @@ JSON_PAYLOAD=$(jq -n \
     "current_step": null,
     "progress_percent": 0.0,
     "logs": [],
-    "chunks": null,
+    "chunk_table": null,
     "contextualized_glossary": null,
-    "translated_chunks": null,
-    "parallel_worker_results": null,
-    "critiques": null,
     "final_document": null,
     "error_info": null,
     "metrics": {
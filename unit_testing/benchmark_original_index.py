@@ -0,0 +1,93 @@
+"""
+Cost of finding every translatable chunk's original_index (its row among all
+chunks, sent to the workers) in the translation, critique and refinement stages.
+
+The stages used to scan chunks_with_metadata for the first translatable chunk
+with the same chunkText, once per chunk and stage: quadratic in the chunk count,
+with full string compares, and wrong for repeated paragraphs (scene breaks,
+repeated headings), which all got the index of the first copy. The chunk table
+records the mapping once when the document is chunked (ChunkTable.translatable)
+and the stages index it.
+
+Builds a synthetic job (default: 10,000 chunks, one in five non-translatable,
+one in fifty a repeated "* * *" scene break) and reports the time of both
+approaches for the three stages and the number of wrong indices.
+
+Usage:
+    python unit_testing/benchmark_original_index.py [--chunks 10000] [--stages 3]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chunk_table import ChunkTable
+
+WORDS = "translation chapter model system worker queue glossary context memory the of and to in is".split()
+
+
+def build_chunks(count: int, seed: int = 1) -> list:
+    """SmartChunker-style chunk dicts with code blocks and repeated scene breaks."""
+    rng = random.Random(seed)
+    chunks = []
+    for index in range(count):
+        if index % 5 == 4:
+            chunks.append({'chunkText': "```\ncode\n```", 'toTranslate': False, 'chunkType': 'code', 'index': index})
+        elif index % 50 == 0:
+            chunks.append({'chunkText': "* * *", 'toTranslate': True, 'chunkType': 'text', 'index': index})
+        else:
+            text = " ".join(rng.choice(WORDS) for _ in range(250))
+            chunks.append({'chunkText': text, 'toTranslate': True, 'chunkType': 'text', 'index': index})
+    return chunks
+
+
+def scan_indices(chunks_with_metadata: list, chunks: list) -> list:
+    """The per-stage lookup the nodes used before the chunk table."""
+    indices = []
+    for chunk_text in chunks:
+        original_index = -1
+        for chunk_meta in chunks_with_metadata:
+            if chunk_meta["toTranslate"] and chunk_meta["chunkText"] == chunk_text:
+                original_index = chunk_meta["index"]
+                break
+        indices.append(original_index)
+    return indices
+
+
+def table_indices(table: ChunkTable) -> list:
+    """The lookup the nodes use now."""
+    return [table.translatable[i] for i in range(table.translatable_count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="original_index lookup benchmark")
+    parser.add_argument("--chunks", type=int, default=10000, help="Number of chunks in the job")
+    parser.add_argument("--stages", type=int, default=3, help="Stages that look the indices up")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.chunks)
+    translatable = [c['chunkText'] for c in chunks if c['toTranslate']]
+    expected = [c['index'] for c in chunks if c['toTranslate']]
+
+    start = time.perf_counter()
+    for _ in range(args.stages):
+        scanned = scan_indices(chunks, translatable)
+    scan_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = ChunkTable.from_chunks(chunks) # Built once by chunk_document
+    for _ in range(args.stages):
+        mapped = table_indices(table)
+    table_seconds = time.perf_counter() - start
+
+    print(f"{args.chunks} chunks ({len(translatable)} translatable), {args.stages} stages:")
+    print(f"  chunks_with_metadata scan  {scan_seconds:9.3f} s  wrong indices: {sum(a != b for a, b in zip(scanned, expected))}")
+    print(f"  chunk table mapping        {table_seconds:9.3f} s  wrong indices: {sum(a != b for a, b in zip(mapped, expected))}")
+    print(f"  speedup {scan_seconds / table_seconds:.0f}x (table time includes building it)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Token and latency comparison of the two deep-mode review modes.
+
+Formats the real prompts from prompts.yaml for a synthetic chunk (default:
+4,000 characters of source, a translation of the same length and a typical
+critique) and reports, per chunk, the LLM calls, estimated prompt and output
+tokens and the predicted review latency of REVIEW_MODE=two_call (critique, then
+refinement) and REVIEW_MODE=fused_review (one call returning the critique and
+the revised text or NO_CHANGE). `--unchanged` is the share of chunks that need
+no revision: the fused review answers NO_CHANGE for them, the two-call path
+skips their refinement through the score gate.
+
+Latency per call is modeled as overhead + prompt tokens x prefill + output
+tokens x decode; the defaults are rough figures for a hosted model, pass the
+values of your provider (e.g. from metrics["review_cost"] of real jobs).
+
+Usage:
+    python unit_testing/benchmark_review_modes.py [--chunk-chars 4000] [--unchanged 0.3] [--chunks 3000] [--workers 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+import yaml
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.node_utils import estimate_tokens
+
+WORDS = "translation chapter model system worker queue glossary context memory the of and to in is".split()
+PROMPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts.yaml")
+
+
+def _text(rng: random.Random, chars: int) -> str:
+    words = []
+    while sum(len(w) + 1 for w in words) < chars:
+        words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def build_calls(chunk_chars: int, seed: int = 1) -> dict:
+    """(prompt, output) texts of every call of each mode for one chunk that gets revised."""
+    rng = random.Random(seed)
+    with open(PROMPTS) as f:
+        prompts = yaml.safe_load(f)["prompts"]
+    original, translation, revised = (_text(rng, chunk_chars) for _ in range(3))
+    critique = {"accuracyScore": 4, "accentAdherence": 4, "glossaryAdherence": ["worker"],
+                "suggestedImprovements": [_text(rng, 60) for _ in range(3)], "overallAssessment": _text(rng, 120)}
+    context = {"original_text": original, "translated_text": translation, "basic_translation": translation,
+               "filtered_glossary_guidance": "\n".join(f"- '{w}' -> '{w.upper()}'" for w in WORDS[:8]),
+               "target_accent_guidance": "using the professional accent/dialect", "target_language": "arabic",
+               "critique_feedback": json.dumps(critique, indent=2)}
+    critique_json = json.dumps(critique)
+    return {
+        "two_call": [(prompts["critique"]["user"].format(**context), critique_json),
+                     (prompts["final_translation"]["user"].format(**context), revised)],
+        "fused_review": [(prompts["fused_review"]["user"].format(**context),
+                          json.dumps(dict(critique, revisedText=revised)))],
+        "fused_review_unchanged": [(prompts["fused_review"]["user"].format(**context),
+                                    json.dumps(dict(critique, revisedText="NO_CHANGE")))],
+    }
+
+
+def call_latency(prompt_tokens: int, output_tokens: int, args) -> float:
+    return args.overhead + prompt_tokens * args.prefill + output_tokens * args.decode
+
+
+def summarize(calls: list, args) -> dict:
+    prompt = sum(estimate_tokens(p) for p, _ in calls)
+    output = sum(estimate_tokens(o) for _, o in calls)
+    seconds = sum(call_latency(estimate_tokens(p), estimate_tokens(o), args) for p, o in calls)
+    return {"calls": len(calls), "prompt": prompt, "output": output, "seconds": seconds}
+
+
+def blend(revised: dict, unchanged: dict, share: float) -> dict:
+    return {key: (1 - share) * revised[key] + share * unchanged[key] for key in revised}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-call vs fused review token/latency comparison")
+    parser.add_argument("--chunk-chars", type=int, default=4000, help="Source characters per chunk")
+    parser.add_argument("--unchanged", type=float, default=0.3, help="Share of chunks that need no revision")
+    parser.add_argument("--chunks", type=int, default=3000, help="Chunks in the job")
+    parser.add_argument("--workers", type=int, default=5, help="MAX_PARALLEL_WORKERS")
+    parser.add_argument("--overhead", type=float, default=0.4, help="Seconds per call before the first token")
+    parser.add_argument("--prefill", type=float, default=0.0002, help="Seconds per prompt token")
+    parser.add_argument("--decode", type=float, default=0.015, help="Seconds per output token")
+    args = parser.parse_args()
+
+    calls = build_calls(args.chunk_chars)
+    two_call = blend(summarize(calls["two_call"], args), summarize(calls["two_call"][:1], args), args.unchanged)
+    fused = blend(summarize(calls["fused_review"], args), summarize(calls["fused_review_unchanged"], args), args.unchanged)
+
+    print(f"{args.chunk_chars}-char chunks, {args.unchanged:.0%} unchanged, per chunk:")
+    for name, result in (("two_call", two_call), ("fused_review", fused)):
+        job_hours = result["seconds"] * args.chunks / args.workers / 3600
+        print(f"  {name:<13} {result['calls']:4.2f} calls  prompt ~{result['prompt']:7.0f} tokens  "
+              f"output ~{result['output']:6.0f} tokens  review {result['seconds']:6.2f} s  "
+              f"({args.chunks} chunks on {args.workers} workers: {job_hours:.2f} h)")
+    total = lambda r: r["prompt"] + r["output"]
+    print(f"  fused review: {1 - total(fused) / total(two_call):.0%} fewer tokens, "
+          f"{1 - fused['seconds'] / two_call['seconds']:.0%} less review time per chunk")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Throughput benchmark for SmartChunker.
+
+Generates a synthetic markdown book (default: 500 pages of ~3000 characters,
+mixing prose, headings, lists with inline code, links, images, fenced code and
+footnotes) and reports chunking throughput per mode, the peak memory of
+chunking into text copies vs. into spans over the source, the scaling of
+chunk_parallel() with the number of worker processes, and the parse and chunk
+throughput of markdown_ast mode against smart mode, and of the single-pass
+symbol splitter against the previous split-per-separator loop, the time to
+split one long paragraph-less text (an OCR dump) into max-size pieces, and the
+chunk size variance and parallel-stage makespan of greedy vs. balanced merging.
+
+Usage:
+    python unit_testing/benchmark_smartchunk.py [--pages 500] [--repeat 3] [--modes smart,line,symbol] [--workers 1,2,4,8]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.smartchunk import SmartChunker
+from src.source_buffer import SourceBuffer
+from src.node_utils import chunk_size_stats
+
+WORDS = (
+    "translation document chapter model system server worker queue glossary term "
+    "context language network memory process thread kernel storage request response "
+    "the of and to in is that for it as with was on be by this are from at or an"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+    return " ".join(words).capitalize() + rng.choice([".", ".", ".", "?", "!"])
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(_sentence(rng) for _ in range(rng.randint(2, 6)))
+
+
+def generate_page(rng: random.Random, page: int) -> str:
+    """Builds one page of mixed markdown content (~3000 characters)."""
+    parts = [f"## Section {page}", _paragraph(rng)]
+    while sum(len(p) for p in parts) < 3000:
+        kind = rng.random()
+        if kind < 0.45:
+            parts.append(_paragraph(rng))
+        elif kind < 0.6:
+            items = []
+            for _ in range(rng.randint(3, 8)):
+                items.append(f"- Use `{rng.choice(WORDS)}_{rng.randint(1, 99)}` for {_sentence(rng).lower()}")
+            parts.append("\n".join(items))
+        elif kind < 0.7:
+            parts.append(f"See [the {rng.choice(WORDS)} guide](https://example.com/{page}/{rng.randint(1, 999)}) "
+                         f"or visit https://docs.example.org/{rng.choice(WORDS)} for details.")
+        elif kind < 0.78:
+            parts.append(f"![Figure {page}](images/fig_{page}_{rng.randint(1, 9)}.png)")
+        elif kind < 0.9:
+            body = "\n".join(f"    value_{i} = compute({i})" for i in range(rng.randint(3, 12)))
+            parts.append(f"```python\ndef step_{page}():\n{body}\n```")
+        else:
+            parts.append(f"{_sentence(rng)}[^{page}]\n\n[^{page}]: {_sentence(rng)}")
+    return "\n\n".join(parts)
+
+
+def generate_corpus(pages: int, seed: int = 42) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(generate_page(rng, page) for page in range(1, pages + 1))
+
+
+def generate_list_heavy_corpus(items: int, seed: int = 7) -> str:
+    """A single document made almost entirely of bullet items with inline code and links."""
+    rng = random.Random(seed)
+    lines = []
+    for i in range(items):
+        kind = i % 4
+        if kind == 0:
+            lines.append(f"- `{rng.choice(WORDS)}_{i}` for {rng.choice(WORDS)}, and `{rng.choice(WORDS)}` to {rng.choice(WORDS)}")
+        elif kind == 1:
+            lines.append(f"- [{rng.choice(WORDS)} {i}](https://example.com/{i})")
+        elif kind == 2:
+            lines.append(f"* Call `init_{i}()` to {rng.choice(WORDS)} of the {rng.choice(WORDS)}")
+        else:
+            lines.append(f"- {_sentence(rng)}")
+    return "\n".join(lines)
+
+
+def generate_inline_chain_corpus(items: int) -> str:
+    """One long paragraph of list-like text with inline code; every code span is merged into its neighbours."""
+    return "Intro - options\n\n" + "".join(f"value, `opt_{i}` to use, " for i in range(items))
+
+
+def generate_ocr_dump(chars: int, seed: int = 3) -> str:
+    """One paragraph-less block of words with sparse punctuation and stray line breaks."""
+    rng = random.Random(seed)
+    pieces = []
+    size = 0
+    while size < chars:
+        mark = rng.random()
+        piece = rng.choice(WORDS) + ("." if mark < 0.05 else "," if mark < 0.1 else "") + (" " if rng.random() < 0.9 else "\n")
+        pieces.append(piece)
+        size += len(piece)
+    return "".join(pieces)
+
+
+def run_benchmark(text: str, mode: str, repeat: int, max_chunk_size: int = 2000, min_chunk_size: int = 100) -> dict:
+    chunker = SmartChunker(min_chunk_size=min_chunk_size, max_chunk_size=max_chunk_size, mode=mode)
+    timings = []
+    chunks = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks, _ = chunker.chunk(text)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "mode": mode,
+        "chars": len(text),
+        "chunks": len(chunks),
+        "best_seconds": best,
+        "mb_per_second": (len(text) / 1_000_000) / best if best > 0 else float("inf"),
+    }
+
+
+def measure_chunk_memory(text: str, max_chunk_size: int = 2000, min_chunk_size: int = 100) -> dict:
+    """Peak traced memory (bytes) of chunking into text copies vs. into spans over the source."""
+    chunker = SmartChunker(min_chunk_size=min_chunk_size, max_chunk_size=max_chunk_size)
+    results = {}
+    for name in ("text", "spans"):
+        tracemalloc.start()
+        if name == "text":
+            chunks, _ = chunker.chunk(text)
+            kept = (chunks, [c["chunkText"] for c in chunks if c["toTranslate"]])
+        else:
+            kept = chunker.chunk_spans(SourceBuffer(text))
+        results[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        del kept
+    return results
+
+
+def run_parallel_benchmark(text: str, workers: int, repeat: int, max_chunk_size: int = 2000, min_chunk_size: int = 100) -> dict:
+    """Best wall time of chunk_parallel() (process start-up included); workers=1 is the serial chunker."""
+    chunker = SmartChunker(min_chunk_size=min_chunk_size, max_chunk_size=max_chunk_size)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if workers > 1:
+            chunks, _ = chunker.chunk_parallel(text, workers=workers)
+        else:
+            chunks, _ = chunker.chunk(text)
+        timings.append(time.perf_counter() - start)
+    return {"workers": workers, "chunks": len(chunks), "best_seconds": min(timings)}
+
+
+def run_markdown_ast_benchmark(text: str, repeat: int, max_chunk_size: int = 2000, min_chunk_size: int = 100) -> dict:
+    """Best times of the markdown-it parse alone, of markdown_ast chunking (parse included) and of smart chunking."""
+    ast_chunker = SmartChunker(min_chunk_size=min_chunk_size, max_chunk_size=max_chunk_size, mode="markdown_ast")
+    parse_timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ast_chunker._markdown.parse(text)
+        parse_timings.append(time.perf_counter() - start)
+    ast = run_benchmark(text, "markdown_ast", repeat, max_chunk_size, min_chunk_size)
+    smart = run_benchmark(text, "smart", repeat, max_chunk_size, min_chunk_size)
+    parse = min(parse_timings)
+    return {"parse_seconds": parse, "parse_mb_per_second": (len(text) / 1_000_000) / parse if parse > 0 else float("inf"),
+            "markdown_ast": ast, "smart": smart}
+
+
+def split_per_separator(text: str, separators: list) -> list:
+    """The previous symbol mode chunker: re-splits every piece once per separator."""
+    pieces = [text]
+    for separator in separators:
+        pieces = [part for piece in pieces for part in piece.split(separator)]
+    chunks = []
+    for piece in pieces:
+        piece = piece.strip()
+        if piece:
+            chunks.append({'chunkText': piece, 'toTranslate': True, 'chunkType': 'text', 'index': len(chunks)})
+    return chunks
+
+
+def run_symbol_benchmark(text: str, separators: list, repeat: int) -> dict:
+    """Best times of symbol mode and of the split-per-separator loop it replaced."""
+    chunker = SmartChunker(mode="symbol", separators=separators)
+    timings = {"symbol": [], "split-per-separator": []}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks, _ = chunker.chunk(text)
+        timings["symbol"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        pieces = split_per_separator(text, separators)
+        timings["split-per-separator"].append(time.perf_counter() - start)
+    assert chunks == pieces
+    peaks = {}
+    for name, run in (("symbol", lambda: chunker.chunk(text)), ("split-per-separator", lambda: split_per_separator(text, separators))):
+        tracemalloc.start()
+        run()
+        peaks[name] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {name: min(values) for name, values in timings.items()} | {"chunks": len(chunks), "peak_bytes": peaks}
+
+
+def run_merge_strategy_benchmark(text: str, repeat: int, workers: int = 5, max_chunk_size: int = 2000,
+                                 min_chunk_size: int = 100) -> dict:
+    """Best chunking time and chunk_size_stats() of the translatable chunks, per merge strategy."""
+    results = {}
+    for strategy in ("greedy", "balanced"):
+        chunker = SmartChunker(min_chunk_size=min_chunk_size, max_chunk_size=max_chunk_size, merge_strategy=strategy)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            chunks, _ = chunker.chunk(text)
+            timings.append(time.perf_counter() - start)
+        sizes = [len(chunk["chunkText"]) for chunk in chunks if chunk["toTranslate"]]
+        results[strategy] = chunk_size_stats(sizes, workers) | {"best_seconds": min(timings)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SmartChunker throughput benchmark")
+    parser.add_argument("--pages", type=int, default=500, help="Number of ~3000 character pages to generate")
+    parser.add_argument("--list-items", type=int, default=20000, help="Bullet items in the list-heavy document")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per mode (best time is reported)")
+    parser.add_argument("--modes", default="smart,line,symbol", help="Comma separated chunking modes")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma separated process counts for chunk_parallel()")
+    args = parser.parse_args()
+
+    corpora = {
+        f"book ({args.pages} pages)": generate_corpus(args.pages),
+        f"list-heavy ({args.list_items} items)": generate_list_heavy_corpus(args.list_items),
+    }
+    for name, text in corpora.items():
+        print(f"{name}: {len(text):,} characters")
+        for mode in args.modes.split(","):
+            result = run_benchmark(text, mode.strip(), args.repeat)
+            print(f"  {result['mode']:<8} {result['chunks']:>7} chunks  {result['best_seconds']:.3f}s  {result['mb_per_second']:.2f} MB/s")
+
+    memory = measure_chunk_memory(corpora[f"book ({args.pages} pages)"])
+    print(f"peak memory (book): text chunks {memory['text'] / 1e6:.1f} MB, spans {memory['spans'] / 1e6:.1f} MB")
+
+    # Merge-pass scaling regression: 4x the items should take roughly 4x the time.
+    # Quadratic merge passes show up here as a ratio closer to 16.
+    print("smart mode scaling (list-heavy merge passes):")
+    for name, generator in (("list-heavy", generate_list_heavy_corpus), ("inline-chain", generate_inline_chain_corpus)):
+        small = run_benchmark(generator(args.list_items // 4), "smart", args.repeat, max_chunk_size=10**9)
+        large = run_benchmark(generator(args.list_items), "smart", args.repeat, max_chunk_size=10**9)
+        ratio = large["best_seconds"] / small["best_seconds"] if small["best_seconds"] > 0 else float("inf")
+        print(f"  {name:<13} {args.list_items // 4:>7} items {small['best_seconds']:.3f}s  {args.list_items:>7} items {large['best_seconds']:.3f}s  ratio {ratio:.1f}x")
+
+    # chunk_parallel() on a book 8x the size, so each worker gets a sizeable segment
+    big = generate_corpus(args.pages * 8)
+    print(f"smart mode chunk_parallel() ({len(big):,} characters, {os.cpu_count()} CPUs):")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        result = run_parallel_benchmark(big, workers, args.repeat)
+        baseline = baseline or result["best_seconds"]
+        print(f"  {workers:>2} workers {result['chunks']:>7} chunks  {result['best_seconds']:.3f}s  speedup {baseline / result['best_seconds']:.2f}x")
+
+    book = corpora[f"book ({args.pages} pages)"]
+    print(f"symbol mode ({len(book):,} characters):")
+    for separators in (["."], [".", "!", "?"], [".", "!", "?", ",", ";", ":", "\n\n", "\n"]):
+        result = run_symbol_benchmark(book, separators, args.repeat)
+        mb = len(book) / 1_000_000
+        peaks = result["peak_bytes"]
+        print(f"  {len(separators)} separators {result['chunks']:>7} chunks  single pass {mb / result['symbol']:.2f} MB/s "
+              f"(peak {peaks['symbol'] / 1e6:.1f} MB)  split per separator {mb / result['split-per-separator']:.2f} MB/s "
+              f"(peak {peaks['split-per-separator'] / 1e6:.1f} MB)")
+
+    ocr = generate_ocr_dump(1_000_000)
+    print(f"_split_large_text_chunk ({len(ocr):,} character OCR dump):")
+    for max_chunk_size in (200, 2000, 50000):
+        chunker = SmartChunker(min_chunk_size=100, max_chunk_size=max_chunk_size)
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            pieces = chunker._split_large_text_chunk(ocr)
+            timings.append(time.perf_counter() - start)
+        print(f"  max {max_chunk_size:>6} {len(pieces):>7} pieces  {min(timings) * 1000:.1f} ms")
+
+    print("merge strategies (translatable chunks, makespan of one stage at 5 workers):")
+    for name, text in ((f"book ({args.pages} pages)", book), ("OCR dump", ocr)):
+        result = run_merge_strategy_benchmark(text, args.repeat)
+        for strategy, stats in result.items():
+            print(f"  {name:<18} {strategy:<8} {stats['chunks']:>6} chunks  sd {stats['variance'] ** 0.5:6.0f}  "
+                  f"min {stats['min']:>5}  max {stats['max']:>5}  makespan {stats['makespan']:>9,} chars  {stats['best_seconds']:.3f}s")
+
+    result = run_markdown_ast_benchmark(book, args.repeat)
+    print("markdown_ast vs smart (book):")
+    print(f"  parse only   {result['parse_seconds']:.3f}s  {result['parse_mb_per_second']:.2f} MB/s")
+    for mode in ("markdown_ast", "smart"):
+        timing = result[mode]
+        print(f"  {mode:<12} {timing['best_seconds']:.3f}s  {timing['mb_per_second']:.2f} MB/s  {timing['chunks']:>7} chunks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+State size and copy-time benchmark for the chunk data of a translation job.
+
+Builds the chunk data of a finished job (default: 5,000 chunks, every
+translatable one translated, critiqued and refined) once as the per-stage
+lists TranslationState used to carry (chunks, chunks_with_metadata,
+non_translatable_chunks, translated_chunks, critiques, final_chunks,
+parallel_worker_results) and once as a ChunkTable, then reports the pickled
+size and the time of copy.deepcopy, which the worker runs on every graph
+callback.
+
+Usage:
+    python unit_testing/benchmark_state_copy.py [--chunks 5000] [--repeat 5]
+"""
+import argparse
+import copy
+import os
+import pickle
+import random
+import sys
+import time
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chunk_table import ChunkTable, TRANSLATION, CRITIQUE, FINAL
+
+WORDS = "translation chapter model system worker queue glossary context memory the of and to in is".split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_chunks(count: int, seed: int = 1) -> list:
+    """SmartChunker-style chunk dicts; about one in five is a non-translatable code block."""
+    rng = random.Random(seed)
+    chunks = []
+    for index in range(count):
+        if index % 5 == 4:
+            chunks.append({'chunkText': f"```\n{_text(rng, 20)}\n```", 'toTranslate': False, 'chunkType': 'code', 'index': index})
+        else:
+            chunks.append({'chunkText': _text(rng, 250), 'toTranslate': True, 'chunkType': 'text', 'index': index})
+    return chunks
+
+
+def _outputs(rng: random.Random, count: int) -> tuple:
+    translations = [_text(rng, 250) for _ in range(count)]
+    critiques = [{"score": rng.randint(1, 5), "issues": [_text(rng, 12)], "text": _text(rng, 40)} for _ in range(count)]
+    finals = [_text(rng, 250) for _ in range(count)]
+    return translations, critiques, finals
+
+
+def legacy_state(chunks: list, seed: int = 2) -> dict:
+    translatable = [c for c in chunks if c['toTranslate']]
+    translations, critiques, finals = _outputs(random.Random(seed), len(translatable))
+    return {
+        "chunks_with_metadata": chunks,
+        "chunks": [c['chunkText'] for c in translatable],
+        "non_translatable_chunks": [c for c in chunks if not c['toTranslate']],
+        "translated_chunks": translations,
+        "critiques": critiques,
+        "final_chunks": finals,
+        # The refinement node kept the raw worker result of every chunk
+        "parallel_worker_results": [{"index": i, "refined_text": t, "prompt_char_count": 4000, "filtered_term_count": 3}
+                                    for i, t in enumerate(finals)],
+    }
+
+
+def table_state(chunks: list, seed: int = 2) -> dict:
+    table = ChunkTable.from_chunks(chunks)
+    translations, critiques, finals = _outputs(random.Random(seed), table.translatable_count)
+    table.set_stage(TRANSLATION, translations)
+    table.set_stage(CRITIQUE, critiques)
+    table.set_stage(FINAL, finals)
+    return {"chunk_table": table}
+
+
+def measure(state: dict, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        copy.deepcopy(state)
+        timings.append(time.perf_counter() - start)
+    return {"pickle_bytes": len(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)), "deepcopy_seconds": min(timings)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunk state size / deepcopy benchmark")
+    parser.add_argument("--chunks", type=int, default=5000, help="Number of chunks in the job")
+    parser.add_argument("--repeat", type=int, default=5, help="deepcopy runs (best time is reported)")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.chunks)
+    legacy = measure(legacy_state(chunks), args.repeat)
+    table = measure(table_state(chunks), args.repeat)
+    print(f"{args.chunks} chunks:")
+    for name, result in (("per-stage lists", legacy), ("chunk table", table)):
+        print(f"  {name:<16} pickled {result['pickle_bytes'] / 1e6:6.2f} MB  deepcopy {result['deepcopy_seconds'] * 1000:8.2f} ms")
+    print(f"  deepcopy speedup {legacy['deepcopy_seconds'] / table['deepcopy_seconds']:.1f}x, "
+          f"size {table['pickle_bytes'] / legacy['pickle_bytes']:.0%} of the lists")
+
+
+if __name__ == "__main__":
+    main()
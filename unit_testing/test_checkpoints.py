@@ -0,0 +1,110 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import checkpoints
+from src.checkpoints import PickleSerializer, build_checkpointer, run_config, has_checkpoint, delete_checkpoints
+from src.chunk_table import ChunkTable, TRANSLATION, CRITIQUE
+from src.smartchunk import SmartChunker
+from src.source_buffer import SourceBuffer
+
+TEXT = "Alpha text here.\n\n```\ncode\n```\n\nBeta text here.\n\nGamma text here."
+
+
+def test_pickle_serializer_round_trips_state():
+    source = SourceBuffer(TEXT)
+    table = ChunkTable.from_spans(source, SmartChunker(min_chunk_size=5, max_chunk_size=20).chunk_spans(source))
+    table.set_stage(TRANSLATION, [f"T{i}" for i in range(table.translatable_count)])
+    table.stage(CRITIQUE)[0] = {"accuracyScore": 5}
+    state = {"job_id": "job", "chunk_table": table, "pending_chunks": {"critique_node": [1, 2]}, "llm_calls": [("translation", 10, 12, 0.5)]}
+
+    serde = PickleSerializer()
+    kind, data = serde.dumps_typed(state)
+    restored = serde.loads_typed((kind, data))
+    restored_table = restored["chunk_table"]
+    assert [restored_table.text(row) for row in range(len(restored_table))] == [table.text(row) for row in range(len(table))]
+    assert restored_table.stage_values(TRANSLATION) == table.stage_values(TRANSLATION)
+    assert restored_table.stage_values(CRITIQUE)[0] == {"accuracyScore": 5}
+    assert restored["pending_chunks"] == state["pending_chunks"]
+    assert serde.loads(serde.dumps(state["llm_calls"])) == state["llm_calls"]
+
+
+def test_run_config():
+    config = run_config("job-1")
+    assert config["configurable"] == {"thread_id": "job-1"}
+    assert config["recursion_limit"] == checkpoints.RECURSION_LIMIT
+    assert "callbacks" not in config
+    assert run_config("job-1", ["handler"])["callbacks"] == ["handler"]
+
+
+def test_checkpoints_disabled(monkeypatch):
+    monkeypatch.setenv("GRAPH_CHECKPOINTS", "false")
+    assert build_checkpointer() is None
+    assert not has_checkpoint(None, "job-1")
+    delete_checkpoints(None, "job-1")
+
+
+def test_sqlite_checkpointer(monkeypatch, tmp_path):
+    pytest.importorskip("langgraph.checkpoint.sqlite")
+    monkeypatch.delenv("GRAPH_CHECKPOINTS", raising=False)
+    monkeypatch.setenv("GRAPH_CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    checkpointer = build_checkpointer()
+    assert checkpointer is not None
+    assert not has_checkpoint(checkpointer, "job-1")
+    delete_checkpoints(checkpointer, "job-1")
+
+
+def _checkpointed_graph(checkpointer):
+    """One-node graph that builds a chunk table, compiled with the checkpointer."""
+    from typing import Any, TypedDict
+    from langgraph.graph import StateGraph, END
+
+    class State(TypedDict, total=False):
+        job_id: str
+        chunk_table: Any
+
+    def chunk(state):
+        source = SourceBuffer(TEXT)
+        table = ChunkTable.from_spans(source, SmartChunker(min_chunk_size=5, max_chunk_size=20).chunk_spans(source))
+        table.set_stage(TRANSLATION, [f"T{i}" for i in range(table.translatable_count)])
+        return {"chunk_table": table}
+
+    workflow = StateGraph(State)
+    workflow.add_node("chunk", chunk)
+    workflow.set_entry_point("chunk")
+    workflow.add_edge("chunk", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+class _LegacySaver:
+    """SqliteSaver without delete_thread (older langgraph-checkpoint-sqlite versions)."""
+
+    def __init__(self, saver):
+        self.lock, self.conn, self.get_tuple = saver.lock, saver.conn, saver.get_tuple
+
+
+@pytest.mark.parametrize("legacy", [False, True])
+def test_sqlite_checkpoint_round_trip(monkeypatch, tmp_path, legacy):
+    pytest.importorskip("langgraph.checkpoint.sqlite")
+    monkeypatch.delenv("GRAPH_CHECKPOINTS", raising=False)
+    monkeypatch.setenv("GRAPH_CHECKPOINT_DB", str(tmp_path / "checkpoints.db"))
+    checkpointer = build_checkpointer()
+    app = _checkpointed_graph(checkpointer)
+    result = app.invoke({"job_id": "job-1"}, config=run_config("job-1"))
+    app.invoke({"job_id": "job-2"}, config=run_config("job-2"))
+    assert has_checkpoint(checkpointer, "job-1")
+    # Only the latest checkpoint of each job is kept
+    rows = checkpointer.conn.execute("SELECT thread_id, COUNT(*) FROM checkpoints GROUP BY thread_id").fetchall()
+    assert sorted(rows) == [("job-1", 1), ("job-2", 1)]
+
+    # A new checkpointer on the same database reads the pickled state back
+    restored = _checkpointed_graph(build_checkpointer()).get_state(run_config("job-1")).values
+    assert restored["job_id"] == "job-1"
+    assert restored["chunk_table"].stage_values(TRANSLATION) == result["chunk_table"].stage_values(TRANSLATION)
+    assert restored["chunk_table"].source_texts() == result["chunk_table"].source_texts()
+
+    delete_checkpoints(_LegacySaver(checkpointer) if legacy else checkpointer, "job-1")
+    assert not has_checkpoint(checkpointer, "job-1")
+    assert has_checkpoint(checkpointer, "job-2")
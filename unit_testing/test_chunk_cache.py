@@ -0,0 +1,51 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chunk_cache import ChunkCache
+from src.smartchunk import SmartChunker
+
+TEXT = "\n\n".join(f"Paragraph {i} with `code_{i}` and a [link](http://e.com/{i})." for i in range(50))
+
+
+def test_cache_returns_chunk_results():
+    cache = ChunkCache()
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200)
+    expected = chunker.chunk(TEXT)
+    assert cache.chunk(chunker, TEXT) == expected
+    assert cache.chunk(chunker, TEXT) == expected
+    assert (cache.hits, cache.misses, len(cache)) == (1, 1, 1)
+
+
+def test_cache_key_covers_settings():
+    cache = ChunkCache()
+    cache.chunk(SmartChunker(min_chunk_size=20, max_chunk_size=200), TEXT)
+    # Equal settings on another instance hit; any other setting or content misses
+    cache.chunk(SmartChunker(min_chunk_size=20, max_chunk_size=200), TEXT)
+    cache.chunk(SmartChunker(min_chunk_size=20, max_chunk_size=300), TEXT)
+    cache.chunk(SmartChunker(min_chunk_size=20, max_chunk_size=200, mode="line"), TEXT)
+    cache.chunk(SmartChunker(min_chunk_size=20, max_chunk_size=200, mode="symbol", separators=["!"]), TEXT)
+    cache.chunk(SmartChunker(min_chunk_size=20, max_chunk_size=200), TEXT + " ")
+    assert (cache.hits, cache.misses) == (1, 5)
+
+
+def test_cached_chunks_are_copies():
+    cache = ChunkCache()
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200)
+    chunks, report = cache.chunk(chunker, TEXT)
+    chunks[0]['chunkText'] = "changed"
+    report['total_chunks'] = -1
+    assert cache.chunk(chunker, TEXT) == chunker.chunk(TEXT)
+
+
+@pytest.mark.parametrize("max_entries", [0, 2])
+def test_cache_evicts_least_recently_used(max_entries):
+    cache = ChunkCache(max_entries)
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200)
+    for text in ("a text", "b text", "a text", "c text", "a text", "b text"):
+        cache.chunk(chunker, text)
+    assert len(cache) == max_entries
+    # With two entries "b" was evicted by "c" while "a" stayed in use
+    assert cache.hits == (2 if max_entries else 0)
@@ -0,0 +1,86 @@
+import pytest
+import sys
+import os
+import copy
+import pickle
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.chunk_table import ChunkTable, TRANSLATION, CRITIQUE, FINAL
+from src.smartchunk import SmartChunker
+from src.source_buffer import SourceBuffer
+
+TEXT = "Alpha text here.\n\n```\ncode\n```\n\nBeta text here.\n\n![img](a.png)\n\nGamma text here."
+
+
+@pytest.fixture
+def chunks():
+    return SmartChunker(min_chunk_size=5, max_chunk_size=20).chunk(TEXT)[0]
+
+
+def test_table_from_chunks(chunks):
+    table = ChunkTable.from_chunks(chunks)
+    assert len(table) == len(chunks) == 5
+    assert list(table.iter_metadata()) == chunks
+    assert list(table.translatable) == [0, 2, 4]
+    assert table.source_texts() == ["Alpha text here.", "Beta text here.", "Gamma text here."]
+    assert table.type_counts(translatable=False) == {'code': 1, 'image': 1}
+    assert table.span(0) is None
+
+
+def test_translatable_rows_of_repeated_paragraphs():
+    # Identical texts (scene breaks) keep their own rows instead of the first copy's
+    chunks = [{'chunkText': text, 'toTranslate': translate, 'chunkType': 'text', 'index': i}
+              for i, (text, translate) in enumerate([("* * *", True), ("Alpha.", True), ("code", False), ("* * *", True)])]
+    table = ChunkTable.from_chunks(chunks)
+    assert list(table.translatable) == [0, 1, 3]
+    assert table.source_text(2) == table.source_text(0)
+
+
+def test_table_from_spans_matches_chunks(chunks):
+    source = SourceBuffer(TEXT)
+    table = ChunkTable.from_spans(source, SmartChunker(min_chunk_size=5, max_chunk_size=20).chunk_spans(source))
+    assert list(table.iter_metadata()) == chunks
+    assert table.span(1).text(TEXT) == "```\ncode\n```"
+
+
+def test_stage_columns(chunks):
+    table = ChunkTable.from_chunks(chunks)
+    assert table.stage_values(TRANSLATION) == [None, None, None] and not table.has_stage(TRANSLATION)
+    translations = table.stage(TRANSLATION)
+    translations[0], translations[2] = "Alpha'", "Gamma'"
+    assert table.output(0) == "Alpha'" and table.output(1) is None
+    table.set_stage(FINAL, ["Alpha''", None, None])
+    assert [table.output(k) for k in range(3)] == ["Alpha''", None, "Gamma'"]
+    with pytest.raises(ValueError):
+        table.set_stage(CRITIQUE, [None])
+    legacy = table.legacy_lists()
+    assert legacy["translated_chunks"] == ["Alpha'", None, "Gamma'"]
+    assert legacy["chunks_with_metadata"] == chunks
+
+
+def test_deepcopy_shares_structure_and_isolates_stages(chunks):
+    table = ChunkTable.from_chunks(chunks)
+    table.stage(TRANSLATION)[0] = "Alpha'"
+    table.stage(CRITIQUE)[0] = {"score": 3}
+    clone = copy.deepcopy(table)
+    assert clone._texts is table._texts and clone.translatable is table.translatable
+    clone.stage(TRANSLATION)[0] = "changed"
+    clone.stage(CRITIQUE)[0]["score"] = 5
+    assert table.stage_values(TRANSLATION)[0] == "Alpha'"
+    assert table.stage_values(CRITIQUE)[0] == {"score": 3}
+
+
+def test_pickle_round_trip(chunks):
+    table = ChunkTable.from_chunks(chunks)
+    table.stage(CRITIQUE)[1] = {"score": 4}
+    restored = pickle.loads(pickle.dumps(table))
+    assert list(restored.iter_metadata()) == chunks
+    assert restored.stage_values(CRITIQUE) == [None, {"score": 4}, None]
+
+
+def test_invalid_tables():
+    with pytest.raises(ValueError):
+        ChunkTable(types=["text"], translate=[True])
+    with pytest.raises(ValueError):
+        ChunkTable(types=["text", "code"], translate=[True], texts=["a", "b"])
@@ -0,0 +1,97 @@
+import pytest
+import sys
+import os
+import threading
+import time
+import concurrent.futures
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.llm_scheduler import LLMScheduler, LLMPool, parse_limits, record_llm_waits
+
+
+class Tracker:
+    """Callable that records the peak number of concurrent calls, overall and per key."""
+
+    def __init__(self, seconds=0.02):
+        self.seconds = seconds
+        self.lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.order = []
+
+    def __call__(self, *keys):
+        with self.lock:
+            self.order.append(keys[-1])
+            for key in ("all",) + keys[:-1]:
+                self.running[key] = self.running.get(key, 0) + 1
+                self.peak[key] = max(self.peak.get(key, 0), self.running[key])
+        time.sleep(self.seconds)
+        with self.lock:
+            for key in ("all",) + keys[:-1]:
+                self.running[key] -= 1
+        return keys[-1]
+
+
+def test_parse_limits():
+    assert parse_limits("translation=8, Critique=4,bad,final=0,x=y") == {"translation": 8, "critique": 4}
+    assert parse_limits(None) == {}
+
+
+def test_global_limit():
+    scheduler = LLMScheduler(max_concurrency=3)
+    track = Tracker()
+    futures = [scheduler.submit(track, i, stage="translation") for i in range(12)]
+    assert [f.result() for f in futures] == list(range(12))
+    assert track.peak["all"] == 3
+    stats = scheduler.stats()
+    assert (stats["active"], stats["queued"], stats["submitted"], stats["completed"]) == (0, 0, 12, 12)
+    assert stats["max_queued"] >= 8 and stats["max_wait_seconds"] > 0
+
+
+def test_stage_and_provider_limits():
+    scheduler = LLMScheduler(max_concurrency=6, stage_limits={"critique": 1}, provider_limits={"ollama": 2})
+    track = Tracker()
+    futures = [scheduler.submit(track, "critique", "openai", i, stage="critique", provider="openai") for i in range(4)]
+    futures += [scheduler.submit(track, "translation", "ollama", i, stage="translation", provider="ollama") for i in range(6)]
+    concurrent.futures.wait(futures)
+    assert track.peak["critique"] == 1
+    assert track.peak["ollama"] == 2
+    assert track.peak["all"] == 3
+    assert scheduler.stats()["stages"]["critique"]["limit"] == 1
+
+
+def test_blocked_stage_does_not_hold_up_others():
+    scheduler = LLMScheduler(max_concurrency=2, stage_limits={"critique": 1})
+    track = Tracker()
+    futures = [scheduler.submit(track, f"c{i}", stage="critique") for i in range(3)]
+    futures.append(scheduler.submit(track, "t0", stage="translation"))
+    concurrent.futures.wait(futures)
+    # The translation queued after the critiques starts while they wait for their stage slot
+    assert track.order.index("t0") < track.order.index("c1")
+
+
+def test_pool_limit_waits_and_exceptions():
+    scheduler = LLMScheduler(max_concurrency=8)
+    track = Tracker()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with LLMPool(scheduler, {"provider": "openai"}, max_workers=2) as pool:
+        futures = [pool.submit("translation", track, i) for i in range(6)]
+        failed = pool.submit("critique", fail)
+    assert all(f.done() for f in futures)
+    assert track.peak["all"] == 2
+    with pytest.raises(RuntimeError):
+        failed.result()
+    waits = pool.waits
+    assert waits["translation"]["calls"] == 6 and waits["critique"]["calls"] == 1
+    assert waits["translation"]["max_wait_seconds"] > 0
+
+    state = {"metrics": {}}
+    record_llm_waits(state, pool)
+    record_llm_waits(state, pool)
+    report = state["metrics"]["llm_scheduler"]
+    assert report["waits"]["translation"]["calls"] == 12
+    assert report["max_concurrency"] == 8
@@ -0,0 +1,344 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.node_utils import (get_setting, stratified_order, build_terminology_regions, terminology_sampling,
+                            record_sampled_region, sampling_should_stop, terminology_sampling_report, fit_latency_model,
+                            predict_makespan, choose_chunk_size, chunk_size_stats, record_llm_call,
+                            estimate_tokens, critique_passes, review_mode, next_batch, has_pending_batch,
+                            seed_stored_chunks, unseed_changed_neighbors, wilson_bounds, sampling_strata, next_critique_sample,
+                            critique_sample_report)
+from src.chunk_table import ChunkTable, TRANSLATION, CRITIQUE, FINAL
+
+# --- get_setting ---
+
+def test_get_setting_priority(monkeypatch):
+    monkeypatch.delenv("TEST_TURJUMAN_SETTING", raising=False)
+    config = {"test_setting": "7"}
+    assert get_setting({}, "TEST_TURJUMAN_SETTING", "test_setting", 3, int) == 3
+    assert get_setting(config, "TEST_TURJUMAN_SETTING", "test_setting", 3, int) == 7
+    monkeypatch.setenv("TEST_TURJUMAN_SETTING", "11")
+    assert get_setting(config, "TEST_TURJUMAN_SETTING", "test_setting", 3, int) == 11
+
+def test_get_setting_invalid_values_fall_through(monkeypatch):
+    monkeypatch.setenv("TEST_TURJUMAN_SETTING", "not-a-number")
+    assert get_setting({"test_setting": 5}, "TEST_TURJUMAN_SETTING", "test_setting", 3, int) == 5
+    assert get_setting({}, "TEST_TURJUMAN_SETTING", "test_setting", 3, int) == 3
+
+def test_get_setting_bool(monkeypatch):
+    monkeypatch.setenv("TEST_TURJUMAN_SETTING", "off")
+    assert get_setting({}, "TEST_TURJUMAN_SETTING", None, True, bool) is False
+    monkeypatch.setenv("TEST_TURJUMAN_SETTING", "Yes")
+    assert get_setting({}, "TEST_TURJUMAN_SETTING", None, False, bool) is True
+
+# --- stratified_order ---
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 7, 8, 13, 100, 257])
+def test_stratified_order_is_permutation(count):
+    assert sorted(stratified_order(count)) == list(range(count))
+
+def test_stratified_order_prefix_spans_document():
+    order = stratified_order(100)
+    assert order[:4] == [0, 50, 25, 75]
+    # A prefix of 8 regions is spread evenly: no gap larger than an eighth of the document
+    prefix = sorted(order[:8]) + [100]
+    assert max(b - a for a, b in zip(prefix, prefix[1:])) <= 13
+
+# --- build_terminology_regions ---
+
+def test_build_terminology_regions_covers_every_chunk_once():
+    chunks = ["a" * 40, "b" * 40, "c" * 40, "d" * 200, "e" * 10]
+    regions = build_terminology_regions(chunks, 100)
+    covered = [i for region in regions for i in region["chunk_indices"]]
+    assert covered == list(range(len(chunks)))
+    assert [r["chunk_indices"] for r in regions] == [[0, 1], [2], [3], [4]]
+    assert regions[0]["text"] == chunks[0] + "\n\n" + chunks[1]
+
+def test_build_terminology_regions_empty():
+    assert build_terminology_regions([], 100) == []
+
+# --- Terminology sampling ---
+
+def test_terminology_sampling_settings():
+    config = {"terminology_adaptive_sampling": True, "terminology_sampling_min_regions": 4}
+    assert terminology_sampling({}, "llm", 100, 5) is None # Opt-in
+    assert terminology_sampling(config, "candidates", 100, 5) is None
+    assert terminology_sampling(config, "llm", 3, 5) is None
+    assert terminology_sampling(config, "llm", 4, 5)["wave_size"] == 5
+
+def test_terminology_sampling_stops_when_discovery_flattens():
+    config = {"terminology_adaptive_sampling": True, "terminology_sampling_min_regions": 4, "terminology_sampling_wave_size": 2,
+              "terminology_sampling_min_fraction": 0.5, "terminology_sampling_patience": 2}
+    sampling = terminology_sampling(config, "llm", 10, 4)
+    rates = [record_sampled_region(sampling, [{"sourceTerm": term}], False) for term in ("a", "b", "B", "a")]
+    assert rates == [None, 1.0, None, 0.0] # "B" is "b" again
+    assert not sampling_should_stop(sampling) # 4 of 10 regions processed
+    assert record_sampled_region(sampling, [], True) == 0.0 # The last region closes its wave
+    assert sampling_should_stop(sampling)
+    report = terminology_sampling_report(sampling)
+    assert report["regions_processed"] == 5 and report["discovery_curve"] == [1.0, 0.0, 0.0]
+    assert report["unique_terms"] == 2
+
+
+# --- Chunk size auto-tuning ---
+
+def test_fit_latency_model_recovers_line():
+    samples = [(size, 2.0 + 0.001 * size) for size in range(500, 5000, 250)]
+    intercept, per_char = fit_latency_model(samples, min_samples=5)
+    assert intercept == pytest.approx(2.0)
+    assert per_char == pytest.approx(0.001)
+
+def test_fit_latency_model_needs_samples_and_spread():
+    assert fit_latency_model([(1000, 3.0)] * 4, min_samples=5) is None
+    assert fit_latency_model([(1000, 3.0)] * 30, min_samples=5) is None
+    # Latency falling with size is not extrapolated: flat model at the mean
+    assert fit_latency_model([(1000, 4.0), (2000, 2.0)] * 5, min_samples=5) == (3.0, 0.0)
+    # A negative intercept is replaced by a fit through the origin
+    intercept, per_char = fit_latency_model([(1000, 0.5), (2000, 2.0)] * 5, min_samples=5)
+    assert intercept == 0.0 and per_char > 0
+
+def test_predict_makespan_counts_waves():
+    # 10 chunks of 1000 chars on 4 workers: 3 waves of (1 + 1) seconds
+    assert predict_makespan(10000, 1000, 4, [(1.0, 0.001)]) == pytest.approx(6.0)
+    # Stages add up
+    assert predict_makespan(10000, 1000, 4, [(1.0, 0.001), (0.5, 0.0)]) == pytest.approx(7.5)
+
+def test_choose_chunk_size_fills_the_last_wave():
+    # Fixed overhead per call: one wave of chunks as large as possible is best
+    size, predicted = choose_chunk_size(40000, 8, [(2.0, 0.001)], 500, 8000)
+    assert size == 5000
+    assert predicted == pytest.approx(7.0)
+    assert predicted <= min(predict_makespan(40000, s, 8, [(2.0, 0.001)]) for s in range(500, 8001, 50))
+
+def test_choose_chunk_size_respects_bounds():
+    # One wave would need 20000-character chunks; the upper bound wins
+    size, _ = choose_chunk_size(100000, 5, [(1.0, 0.001)], 500, 4000)
+    assert 500 <= size <= 4000
+    best = min(predict_makespan(100000, s, 5, [(1.0, 0.001)]) for s in range(500, 4001))
+    assert predict_makespan(100000, size, 5, [(1.0, 0.001)]) == pytest.approx(best)
+
+def test_record_llm_call():
+    state = {}
+    record_llm_call(state, "translation", 1200, {"translated_text": "x"})
+    assert "llm_calls" not in state
+    record_llm_call(state, "translation", 1200, {"llm_seconds": 3.14159, "output_chars": 1500})
+    assert state["llm_calls"] == [("translation", 1200, 1500, 3.142)]
+
+def test_chunk_size_stats():
+    stats = chunk_size_stats([100, 300, 200, 400], 2)
+    assert stats["chunks"] == 4 and stats["mean"] == 250.0 and stats["variance"] == 12500.0
+    assert (stats["min"], stats["max"]) == (100, 400)
+    # In order to the first free worker: 100 | 300, then 200 -> worker 1 (300), 400 -> worker 2 (700)
+    assert stats["makespan"] == 700
+    assert chunk_size_stats([], 4)["chunks"] == 0
+
+
+# --- Refinement gate ---
+
+def test_estimate_tokens():
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+
+
+PERFECT = {"accuracyScore": 5, "accentAdherence": 5, "glossaryAdherence": [], "suggestedImprovements": [],
+           "overallAssessment": "Good."}
+STRICT = {"min_accuracy": 5, "min_accent": 5, "max_glossary_issues": 0, "max_suggestions": 0}
+
+
+def test_critique_passes_perfect_critique():
+    assert critique_passes(PERFECT, **STRICT)
+    assert critique_passes(dict(PERFECT, accuracyScore="5"), **STRICT)
+    assert critique_passes(dict(PERFECT, suggestedImprovements=[""]), **STRICT)
+
+
+@pytest.mark.parametrize("changes", [
+    {"accuracyScore": 4},
+    {"accentAdherence": 4},
+    {"glossaryAdherence": ["term"]},
+    {"suggestedImprovements": "Use a shorter sentence."},
+    {"accuracyScore": "n/a"},
+    {"error": "Critique skipped due to failed translation"},
+])
+def test_critique_passes_rejects(changes):
+    assert not critique_passes(dict(PERFECT, **changes), **STRICT)
+
+
+def test_critique_passes_missing_or_invalid():
+    assert not critique_passes(None, **STRICT)
+    assert not critique_passes({k: v for k, v in PERFECT.items() if k != "accentAdherence"}, **STRICT)
+
+
+def test_critique_passes_relaxed_thresholds():
+    critique = dict(PERFECT, accuracyScore=4, suggestedImprovements=["a", "b"])
+    assert critique_passes(critique, min_accuracy=4, min_accent=5, max_glossary_issues=0, max_suggestions=2)
+    assert not critique_passes(critique, min_accuracy=4, min_accent=5, max_glossary_issues=0, max_suggestions=1)
+
+
+def test_review_mode(monkeypatch):
+    monkeypatch.delenv("REVIEW_MODE", raising=False)
+    assert review_mode({}) == "two_call"
+    assert review_mode({"review_mode": "fused_review"}) == "fused_review"
+    assert review_mode({"review_mode": "three_call"}) == "two_call"
+    monkeypatch.setenv("REVIEW_MODE", "fused_review")
+    assert review_mode({"review_mode": "two_call"}) == "fused_review"
+
+
+# --- Checkpoint batches ---
+
+def test_next_batch_without_batching(monkeypatch):
+    monkeypatch.delenv("CHECKPOINT_BATCH_CHUNKS", raising=False)
+    state = {"config": {}}
+    assert next_batch(state, "node", [3, 4, 5]) == ([3, 4, 5], 0)
+    assert not has_pending_batch(state, "node")
+
+
+def test_next_batch_splits_work(monkeypatch):
+    monkeypatch.delenv("CHECKPOINT_BATCH_CHUNKS", raising=False)
+    state = {"config": {"checkpoint_batch_chunks": 2}, "pending_chunks": {"other": [9]}}
+    batches = []
+    while True:
+        batch, remaining = next_batch(state, "node", [1, 3, 5, 7, 8])
+        batches.append((batch, remaining))
+        if not has_pending_batch(state, "node"):
+            break
+    assert batches == [([1, 3], 3), ([5, 7], 1), ([8], 0)]
+    assert state["pending_chunks"] == {"other": [9]}
+
+
+# --- Stored chunk outputs ---
+
+def _table(*texts):
+    return ChunkTable.from_chunks([{"chunkText": text, "toTranslate": True, "chunkType": "text", "index": i} for i, text in enumerate(texts)])
+
+
+def test_seed_stored_chunks():
+    table = _table("a", "b", "c", "d")
+    records = [
+        {"index": 0, "source": "a", "translation": "A", "critique": {"accuracyScore": 4}, "final": "A'"},
+        {"index": 1, "source": "b", "translation": "B", "critique": {"error": "timeout"}, "final": "B"},
+        {"index": 2, "source": "c", "translation": "C", "critique": None, "final": None},
+        {"index": 3, "source": "d", "translation": None, "critique": None, "final": None},
+    ]
+    counts = seed_stored_chunks(table, records)
+    assert counts == {TRANSLATION: 3, CRITIQUE: 1, FINAL: 1}
+    assert table.stage_values(TRANSLATION) == ["A", "B", "C", None]
+    assert table.stage_values(CRITIQUE) == [{"accuracyScore": 4}, None, None, None]
+    assert table.stage_values(FINAL) == ["A'", None, None, None]
+
+
+def test_seed_stored_chunks_matches_source_text():
+    # Chunking shifted: "b" moved from index 1 to 2; the duplicate "x" keeps its own index
+    table = _table("x", "new", "b", "x")
+    records = [{"index": 0, "source": "x", "translation": "X0"}, {"index": 1, "source": "b", "translation": "B"},
+               {"index": 3, "source": "x", "translation": "X3"}, {"index": 4, "source": "gone", "translation": "G"}]
+    assert seed_stored_chunks(table, records)[TRANSLATION] == 3
+    assert table.stage_values(TRANSLATION) == ["X0", None, "B", "X3"]
+    assert not table.has_stage(CRITIQUE) and not table.has_stage(FINAL)
+
+
+def test_seed_stored_chunks_nothing_to_seed():
+    table = _table("a")
+    assert seed_stored_chunks(table, []) == {TRANSLATION: 0, CRITIQUE: 0, FINAL: 0}
+    assert not table.has_stage(TRANSLATION)
+
+
+def test_unseed_changed_neighbors():
+    # Base job chunks a..g; "c" and "f" were edited
+    table = _table("a", "b", "c2", "d", "e", "f2", "g")
+    records = [{"index": i, "source": text, "translation": text.upper(), "critique": {"accuracyScore": 5}, "final": text.upper() + "'"}
+               for i, text in enumerate("abcdefg")]
+    records[6]["translation"] = None # "g" was never translated: unchanged, but not reused
+    seed_stored_chunks(table, records)
+    assert unseed_changed_neighbors(table, records, 0) == {"changed": 2, "neighbors": 0}
+    assert table.stage_values(TRANSLATION) == ["A", "B", None, "D", "E", None, None]
+
+    assert unseed_changed_neighbors(table, records, 1) == {"changed": 2, "neighbors": 3}
+    assert table.stage_values(TRANSLATION) == ["A", None, None, None, None, None, None]
+    assert table.stage_values(CRITIQUE)[1] is None and table.stage_values(FINAL) == ["A'", None, None, None, None, None, None]
+
+
+def test_unseed_changed_neighbors_clears_empty_stages():
+    table = _table("a", "new")
+    records = [{"index": 0, "source": "a", "translation": "A"}]
+    seed_stored_chunks(table, records)
+    assert unseed_changed_neighbors(table, records, 2) == {"changed": 1, "neighbors": 1}
+    assert not table.has_stage(TRANSLATION)
+    assert unseed_changed_neighbors(table, [], 1) == {"changed": 2, "neighbors": 0}
+
+
+def test_unseed_changed_neighbors_keeps_own_rows():
+    # Retry of an incremental job: "b" was stored by its first run, "d" comes from the base job
+    table = _table("a", "b", "c2", "d")
+    base = [{"index": i, "source": text, "translation": text.upper(), "base": True} for i, text in enumerate("abcd")]
+    base[1]["translation"] = None # Superseded by the job's own row
+    own = [{"index": 1, "source": "b", "translation": "B (own)"}]
+    seed_stored_chunks(table, own + base)
+    assert table.stage_values(TRANSLATION) == ["A", "B (own)", None, "D"]
+    assert unseed_changed_neighbors(table, base, 1, {"b", "c2"}) == {"changed": 1, "neighbors": 1}
+    assert table.stage_values(TRANSLATION) == ["A", "B (own)", None, None]
+
+
+# --- Critique sampling ---
+
+SAMPLE = {"strata": 4, "fraction": 0.1, "min_per_stratum": 3, "max_failure_rate": 0.1, "z": 1.96, "neighbors": 1, "seed": "job"}
+
+
+def _run_sampling(count, failing):
+    outcomes, waves = {}, 0
+    while True:
+        wave = next_critique_sample(list(range(count)), outcomes, SAMPLE)
+        if not wave:
+            return outcomes, waves
+        assert not set(wave) & set(outcomes)
+        outcomes.update((i, i in failing) for i in wave)
+        waves += 1
+
+
+def test_wilson_bounds():
+    assert wilson_bounds(0, 0) == (0.0, 1.0)
+    low, high = wilson_bounds(0, 35)
+    assert low == 0.0 and 0.09 < high < 0.1
+    low, high = wilson_bounds(5, 10)
+    assert low < 0.5 < high and high - 0.5 == pytest.approx(0.5 - low)
+
+
+def test_sampling_strata():
+    assert sampling_strata([1, 2, 4, 5, 7], 2) == [[1, 2], [4, 5, 7]]
+    assert sampling_strata([3], 10) == [[3]]
+    assert sampling_strata([], 3) == []
+
+
+def test_next_critique_sample_first_wave_covers_every_stratum():
+    wave = next_critique_sample(list(range(400)), {}, SAMPLE)
+    assert [sum(1 for i in wave if h * 100 <= i < (h + 1) * 100) for h in range(4)] == [10, 10, 10, 10]
+    assert wave == next_critique_sample(list(range(400)), {}, SAMPLE) # Seeded
+
+
+def test_next_critique_sample_stops_on_clean_strata():
+    outcomes, _ = _run_sampling(2000, set())
+    report = critique_sample_report(list(range(2000)), outcomes, SAMPLE)
+    assert report["coverage"] < 0.2
+    assert report["failures"] == 0 and report["estimated_failure_rate"] == 0.0
+    assert 0 < report["failure_rate_upper"] <= 0.1
+
+
+def test_next_critique_sample_escalates_where_failures_cluster():
+    failing = set(range(1200, 1260))
+    outcomes, _ = _run_sampling(2000, failing)
+    assert failing <= set(outcomes) # The whole cluster is found
+    report = critique_sample_report(list(range(2000)), outcomes, SAMPLE)
+    assert report["failures"] == 60
+    assert report["strata"][2]["critiqued"] == 500 # The stratum of the cluster is critiqued completely
+    assert report["strata"][0]["critiqued"] < 100
+    assert report["estimated_failure_rate"] == pytest.approx(0.03)
+
+
+def test_critique_sample_report_ignores_critique_errors():
+    outcomes = {0: None, 1: False, 2: True}
+    report = critique_sample_report([0, 1, 2, 3], outcomes, dict(SAMPLE, strata=1))
+    assert (report["critiqued"], report["failures"]) == (3, 1)
+    assert report["estimated_failure_rate"] == pytest.approx((1 + 0.5 * 1) / 4)
@@ -1,6 +1,8 @@
 import pytest
 import sys
 import os
+import io
+import re
 
 # Add the parent directory to the path so we can import the module
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -1208,6 +1210,22 @@ def test_symbol_mode_separator_order():
     assert "Paragraph 2" in [c['chunkText'] for c in chunks2]
     assert "Line in paragraph 2" in [c['chunkText'] for c in chunks2]
 
+def test_symbol_mode_keep_separators_and_longest_match():
+    """Longer separators win at the same position; keep_separators keeps them on the closing chunk."""
+    text = "One... Two. Three?! Four"
+    chunks, _ = SmartChunker(mode="symbol", separators=[".", "...", "?!"]).chunk(text)
+    assert [c['chunkText'] for c in chunks] == ["One", "Two", "Three", "Four"]
+    assert [c['index'] for c in chunks] == [0, 1, 2, 3]
+    kept, report = SmartChunker(mode="symbol", separators=[".", "...", "?!"], keep_separators=True).chunk(text)
+    assert [c['chunkText'] for c in kept] == ["One...", "Two.", "Three?!", "Four"]
+    assert report['total_chunks'] == 4
+
+def test_symbol_mode_streaming_with_multi_character_separators():
+    chunker = SmartChunker(mode="symbol", separators=["...", ".", "\n\n"], keep_separators=True)
+    text = "".join(f"Sentence {i}{'...' if i % 3 else '.'}{' ' if i % 5 else chr(10) * 2}" for i in range(3000))
+    # Reads end inside "..." runs; cuts must not split a separator
+    assert list(chunker.chunk_iter(io.StringIO(text), read_size=7)) == chunker.chunk(text)[0]
+
 # --- Subtitle SRT Mode Tests ---
 
 def test_symbol_mode_default_separator():
@@ -1442,4 +1460,387 @@ Hello, world. This is a test."""
     
     # SRT mode should identify timing and content sections
     assert any(chunk['chunkType'] == 'timing' for chunk in srt_chunks)
-    assert any(chunk['chunkType'] == 'text' and chunk['toTranslate'] for chunk in srt_chunks)
\ No newline at end of file
+    assert any(chunk['chunkType'] == 'text' and chunk['toTranslate'] for chunk in srt_chunks)
+
+
+def test_combined_pattern_named_groups(default_chunker):
+    """Each combined-pattern match is classified by its named group, in agreement with the individual patterns."""
+    samples = {
+        "```python\nprint(1)\n```": 'fenced_code',
+        "~~~\nplain\n~~~": 'fenced_code',
+        "<pre>x</pre>": 'html_code',
+        "<CODE>y</CODE>": 'html_code',
+        "<img src='a.png'>": 'html_image',
+        "![alt](a.png)": 'markdown_image',
+        "[text](http://a.b)": 'markdown_link',
+        "`inline`": 'inline_code',
+        "https://example.com/path": 'standalone_url',
+        "WWW.EXAMPLE.COM": 'standalone_url',
+        "[^1]: note": 'footnote_ref',
+    }
+    for sample, expected in samples.items():
+        match = default_chunker.combined_pattern.search("Intro text\n" + sample + "\n")
+        assert match is not None, sample
+        assert match.lastgroup == expected, sample
+        assert sample.startswith(match.group().strip())
+        assert default_chunker.pattern_dict[expected].match(match.group())
+
+def test_long_inline_code_chain_merges_in_order():
+    """A long list-like paragraph with many inline code spans is merged into one chunk, keeping order."""
+    chunker = SmartChunker(min_chunk_size=10, max_chunk_size=10**6)
+    items = 2000
+    text = "Intro - options\n\n" + "".join(f"value, `opt_{i}` to use, " for i in range(items))
+    chunks, report = chunker.chunk(text)
+    merged = [c for c in chunks if "`opt_0`" in c['chunkText']]
+    assert len(merged) == 1
+    merged_text = merged[0]['chunkText']
+    assert merged[0]['toTranslate']
+    positions = [merged_text.index(f"`opt_{i}`") for i in range(items)]
+    assert positions == sorted(positions)
+    assert report['code_chunks'] == 0
+
+# --- chunk_iter (streaming) ---
+
+STREAM_DOC = "\n\n".join(
+    f"## Part {i}\n\nSome prose about part {i}, with a [link](http://example.com/{i}) and `code_{i}`.\n\n"
+    f"- Use `opt_{i}` for tuning, and `alt_{i}` to compare\n- Plain item {i}\n\n"
+    f"```python\nprint({i})\n```\n\nSentence {i}.[^{i}]\n\n[^{i}]: Note {i}."
+    for i in range(300)
+)
+
+@pytest.mark.parametrize("mode", ["smart", "line", "symbol"])
+@pytest.mark.parametrize("read_size", [1, 97, 1 << 16])
+def test_chunk_iter_matches_chunk(mode, read_size):
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200, mode=mode)
+    expected, _ = chunker.chunk(STREAM_DOC)
+    streamed = list(chunker.chunk_iter(io.StringIO(STREAM_DOC), read_size=read_size))
+    assert streamed == expected
+    assert [c['index'] for c in streamed] == list(range(len(streamed)))
+
+SRT_DOC = "\n\n".join(f"{i}\n00:00:{i % 60:02d},000 --> 00:00:{i % 60:02d},500\nLine {i}" for i in range(1, 500))
+
+@pytest.mark.parametrize("srt", [
+    SRT_DOC,
+    SRT_DOC.replace("\n\n", "\r\n \r\n\n"),
+    # Valid entries only after many malformed ones
+    "\n\n".join(f"Not an entry {i}\nstill not" for i in range(300)) + "\n\n" + SRT_DOC,
+    # No valid entries: the whole input is one text chunk
+    "\n\n".join(f"{i}\nno timestamp here\nLine {i}" for i in range(500)),
+    "",
+])
+@pytest.mark.parametrize("read_size", [1, 50, 1 << 16])
+def test_chunk_iter_subtitle_srt_matches_chunk(srt, read_size):
+    chunker = SmartChunker(max_chunk_size=100, mode="subtitle_srt")
+    assert list(chunker.chunk_iter(io.StringIO(srt), read_size=read_size)) == chunker.chunk(srt)[0]
+
+def test_chunk_iter_bytes_and_str_input():
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200)
+    text = "Ünïcödé prose — ☃ with `code` and more.\n\n" * 200
+    expected, _ = chunker.chunk(text)
+    # Tiny reads split multi-byte characters across blocks
+    assert list(chunker.chunk_iter(io.BytesIO(text.encode("utf-8")), read_size=3)) == expected
+    assert list(chunker.chunk_iter(text)) == expected
+    assert list(chunker.chunk_iter("")) == []
+
+def test_chunk_iter_keeps_long_code_block_whole():
+    chunker = SmartChunker(min_chunk_size=10, max_chunk_size=100)
+    body = "\n".join(f"x_{i} = {i}" for i in range(5000))
+    text = f"Before the code.\n\n```python\n{body}\n```\n\nAfter the code."
+    streamed = list(chunker.chunk_iter(io.StringIO(text), read_size=64))
+    code = [c for c in streamed if c['chunkType'] == 'code']
+    assert len(code) == 1 and code[0]['chunkText'].endswith("x_4999 = 4999\n```")
+    assert streamed == chunker.chunk(text)[0]
+
+def test_chunk_iter_is_lazy():
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200)
+    reads = []
+
+    class Stream(io.StringIO):
+        def read(self, size=-1):
+            reads.append(size)
+            return super().read(size)
+
+    first = next(chunker.chunk_iter(Stream(STREAM_DOC * 5), read_size=1024))
+    assert first['index'] == 0
+    assert len(reads) * 1024 < len(STREAM_DOC * 5)
+
+# --- chunk_parallel ---
+
+def test_chunk_parallel_matches_chunk():
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200)
+    chunker.PARALLEL_MIN_SEGMENT = 2000
+    text = STREAM_DOC * 10
+    assert len(chunker._parallel_split_points(text, 4)) == 4
+    assert chunker.chunk_parallel(text, workers=4) == chunker.chunk(text)
+
+def test_chunk_parallel_split_inside_code_block():
+    # The fenced block contains blank lines, so split points fall inside it
+    chunker = SmartChunker(min_chunk_size=10, max_chunk_size=100)
+    chunker.PARALLEL_MIN_SEGMENT = 500
+    body = "\n\n".join(f"x_{i} = `{i}`" for i in range(400))
+    text = f"Before the code.\n\n```python\n{body}\n```\n\nAfter - `the` code.\n\n" * 3
+    # Without overlap the scans never meet and the tail is scanned serially
+    for lookahead in (chunker._stream_lookahead, 0):
+        chunker._stream_lookahead = lookahead
+        assert chunker.chunk_parallel(text, workers=3) == chunker.chunk(text)
+
+def test_chunk_parallel_serial_fallback():
+    chunker = SmartChunker(min_chunk_size=20, max_chunk_size=200, mode="line")
+    assert chunker.chunk_parallel(STREAM_DOC, workers=4) == chunker.chunk(STREAM_DOC)
+    with pytest.raises(TypeError):
+        chunker.chunk_parallel(b"bytes")
+
+# --- markdown_ast mode ---
+
+MARKDOWN_AST_DOC = """# Title
+
+Intro with `inline code` and [a link](https://example.com/a).
+
+![Figure](images/fig.png)
+
+[Docs](https://docs.example.com)
+
+~~~markdown
+```python
+x = 1
+
+y = 2
+```
+~~~
+
+- item one
+- item two
+
+<pre>
+raw
+</pre>
+
+[ref]: https://example.com/ref
+
+Closing paragraph.
+"""
+
+def test_markdown_ast_block_types():
+    pytest.importorskip("markdown_it")
+    chunker = SmartChunker(min_chunk_size=10, max_chunk_size=500, mode="markdown_ast")
+    chunks, report = chunker.chunk(MARKDOWN_AST_DOC)
+    assert [(c['chunkType'], c['toTranslate']) for c in chunks] == [
+        ('text', True), ('image', False), ('url', False), ('code', False),
+        ('text', True), ('code', False), ('url', False), ('text', True)]
+    # Consecutive text blocks stay one run with their paragraph break
+    assert chunks[0]['chunkText'] == "# Title\n\nIntro with `inline code` and [a link](https://example.com/a)."
+    # A fence containing another fence and blank lines is one code chunk
+    assert chunks[3]['chunkText'].startswith("~~~markdown") and chunks[3]['chunkText'].endswith("```\n~~~")
+    assert chunks[6]['chunkText'] == "[ref]: https://example.com/ref"
+    assert report['code_chunks'] == 2 and report['translatable_chunks'] == 3
+
+def test_markdown_ast_size_contract_and_coverage():
+    pytest.importorskip("markdown_it")
+    chunker = SmartChunker(min_chunk_size=50, max_chunk_size=300, mode="markdown_ast")
+    text = STREAM_DOC * 20
+    chunks, _ = chunker.chunk(text)
+    assert all(len(c['chunkText']) <= 300 * 1.2 for c in chunks if c['toTranslate'])
+    assert "".join("".join(c['chunkText'] for c in chunks).split()) == "".join(text.split())
+    assert list(chunker.chunk_iter(io.StringIO(text), read_size=100)) == chunks
+
+def test_markdown_ast_spans():
+    pytest.importorskip("markdown_it")
+    chunker = SmartChunker(min_chunk_size=10, max_chunk_size=500, mode="markdown_ast")
+    chunks, _ = chunker.chunk(MARKDOWN_AST_DOC)
+    spans = chunker.chunk_spans(MARKDOWN_AST_DOC)
+    assert [(s.type, s.translate) for s in spans] == [(c['chunkType'], c['toTranslate']) for c in chunks]
+    assert [s.text(MARKDOWN_AST_DOC) for s in spans] == [c['chunkText'] for c in chunks]
+
+# --- _split_large_text_chunk ---
+
+def _reference_split_large_text_chunk(self, text: str) -> list[str]:
+    """The window-by-window _split_large_text_chunk the boundary index replaced."""
+    if len(text) <= self.max_chunk_size:
+        stripped_text = text.strip()
+        return [stripped_text] if stripped_text else []
+
+    chunks = []
+    current_pos = 0
+    while current_pos < len(text) and text[current_pos].isspace():
+        current_pos += 1
+
+    while current_pos < len(text):
+        end_pos = min(current_pos + self.max_chunk_size, len(text))
+
+        if end_pos == len(text):
+            chunk = text[current_pos:]
+            if chunk.strip(): chunks.append(chunk.strip())
+            current_pos = end_pos
+            continue
+
+        split_pos = -1
+        para_break = text.rfind('\n\n', current_pos, end_pos)
+        if para_break > current_pos and para_break + 2 <= end_pos:
+            split_pos = para_break + 2
+        else:
+            sentence_break = -1
+            for match in re.finditer(r'[.!?](?=\s|\n|$)', text[current_pos:end_pos]):
+                 potential_break = current_pos + match.end()
+                 if potential_break > current_pos : sentence_break = max(sentence_break, potential_break)
+
+            if sentence_break > current_pos:
+                split_pos = sentence_break
+            else:
+                space_break = text.rfind(' ', current_pos, end_pos)
+                newline_break = text.rfind('\n', current_pos, end_pos)
+                word_break = max(space_break, newline_break)
+                if word_break > current_pos and word_break + 1 <= end_pos :
+                    split_pos = word_break + 1
+
+                if split_pos == -1: split_pos = end_pos
+
+        if split_pos == -1: split_pos = end_pos
+
+        chunk = text[current_pos:split_pos].strip()
+        if chunk: chunks.append(chunk)
+
+        current_pos = split_pos
+        while current_pos < len(text) and text[current_pos].isspace():
+            current_pos += 1
+
+    return [c for c in chunks if c]
+
+@pytest.mark.parametrize("max_size", [5, 17, 64, 300])
+def test_split_large_text_chunk_matches_reference(max_size):
+    import random
+    rng = random.Random(max_size)
+    chunker = SmartChunker(min_chunk_size=1, max_chunk_size=max_size)
+    alphabet = ["word", "a", ".", "!", "?", " ", " ", "\n", "\n\n", "\t", "x" * 40, "\u3000"]
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 120)))
+        assert chunker._split_large_text_chunk(text) == _reference_split_large_text_chunk(chunker, text)
+
+# --- Regex engines and pathological input ---
+
+ADVERSARIAL_INPUTS = {
+    "unclosed pre": "<pre>" * 20000,
+    "pre without >": "<pre " * 20000,
+    "unclosed code": "<code>x " * 12500,
+    "fence openers": "```a\n" * 20000,
+    "image openers": "![a" * 33000,
+    "image without target": "![a]" * 25000,
+    "link openers": "[" * 100000,
+    "link without )": "[a](" * 25000,
+    "blank lines": "a\n" + "\n" * 100000 + "b",
+    "whitespace lines": " \n" * 50000,
+}
+
+def _fuzz_documents(count, seed=0):
+    import random
+    rng = random.Random(seed)
+    pieces = ["- ", "`x`", "[l](u)", "![i](p.png)", "http://e.com/a", "www.x.org", "\n", "\n\n", "```py\nprint(1)\n```",
+              "~~~\nz\n~~~", "<pre>a</pre>", "<code>b</code>", "<img src=x>", "[^1]: note", "\n \n [^2]: x", "word ",
+              "[", "![", "<pre", "```a\n", "`", "](", ")", "   \n"]
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 80))) for _ in range(count)]
+
+def test_guarded_scan_matches_combined_pattern():
+    chunker = SmartChunker()
+    for text in _fuzz_documents(1500):
+        expected = [(m.span(), m.lastgroup) for m in chunker.combined_pattern.finditer(text)]
+        assert [(m.span(), m.lastgroup) for m in chunker._scan(text)] == expected
+        assert [(m.span(), m.lastgroup) for m in chunker._scan(text, 7)] == \
+            [(m.span(), m.lastgroup) for m in chunker.combined_pattern.finditer(text, 7)]
+
+def test_re2_source_matches_combined_pattern():
+    # The RE2 translation is plain regex syntax, so the standard library can check it
+    chunker = SmartChunker()
+    translated = re.compile(chunker._re2_source())
+    for text in _fuzz_documents(1500, seed=1) + [STREAM_DOC]:
+        assert [(m.span(), m.lastgroup) for m in translated.finditer(text)] == \
+            [(m.span(), m.lastgroup) for m in chunker.combined_pattern.finditer(text)]
+
+@pytest.mark.parametrize("name", sorted(ADVERSARIAL_INPUTS))
+def test_pathological_input_time_bound(name):
+    import time
+    chunker = SmartChunker(min_chunk_size=100, max_chunk_size=2000)
+    start = time.perf_counter()
+    chunker.chunk(ADVERSARIAL_INPUTS[name])
+    # Quadratic scans of these inputs take minutes
+    assert time.perf_counter() - start < 5
+
+def test_regex_engine_validation(monkeypatch):
+    import src.smartchunk as smartchunk
+    with pytest.raises(ValueError, match="regex_engine must be one of"):
+        SmartChunker(regex_engine="pcre")
+    monkeypatch.setattr(smartchunk, "re2", None)
+    with pytest.raises(ImportError, match="google-re2"):
+        SmartChunker(regex_engine="re2")
+    assert SmartChunker(regex_engine="auto").regex_engine == "re"
+
+def test_re2_engine_matches_re_engine():
+    pytest.importorskip("re2")
+    import time
+    default, linear = SmartChunker(20, 200), SmartChunker(20, 200, regex_engine="re2")
+    for text in _fuzz_documents(300, seed=2) + [STREAM_DOC * 5]:
+        assert linear.chunk(text) == default.chunk(text)
+    # Link openers that all fail at the same "]": not covered by the closer guards
+    start = time.perf_counter()
+    linear.chunk("[" * 50000 + "]x[a](b)")
+    assert time.perf_counter() - start < 5
+
+# --- Balanced merge strategy ---
+
+BALANCED_DOC = "\n\n".join(
+    " ".join(f"Sentence {i}.{j} of the section has a few more words." for j in range(i % 9 + 1))
+    + ("\n\n```python\nprint(%d)\n```" % i if i % 6 == 5 else "")
+    for i in range(120)
+)
+
+def _partitions(sizes):
+    """Every way to cut `sizes` into consecutive groups."""
+    if not sizes:
+        yield []
+        return
+    for cut in range(1, len(sizes) + 1):
+        for rest in _partitions(sizes[cut:]):
+            yield [sizes[:cut]] + rest
+
+def test_balance_run_is_optimal():
+    import random
+    rng = random.Random(5)
+    chunker = SmartChunker(min_chunk_size=5, max_chunk_size=60, merge_strategy="balanced")
+    for _ in range(200):
+        sizes = [rng.randint(1, 45) for _ in range(rng.randint(1, 9))]
+        run = [{'text': "x" * size, 'type': 'text', 'translate': True, 'joiner': None} for size in sizes]
+        result = [len(c['chunkText']) for c in chunker._balance_run(run)]
+        assert sum(result) == sum(sizes) + len(sizes) - len(result)
+        # Brute force: fewest chunks within max_chunk_size, then smallest sum of squares
+        best = min((len(p), sum((sum(g) + len(g) - 1) ** 2 for g in p))
+                   for p in _partitions(sizes) if all(sum(g) + len(g) - 1 <= 60 or len(g) == 1 for g in p))
+        assert (len(result), sum(size * size for size in result)) == best
+
+def test_balanced_merge_evens_out_runs():
+    greedy = SmartChunker(min_chunk_size=50, max_chunk_size=400)
+    balanced = SmartChunker(min_chunk_size=50, max_chunk_size=400, merge_strategy="balanced")
+    greedy_chunks, _ = greedy.chunk(BALANCED_DOC)
+    balanced_chunks, report = balanced.chunk(BALANCED_DOC)
+    # Same non-translatable chunks and the same translatable text
+    assert [c['chunkText'] for c in balanced_chunks if not c['toTranslate']] == \
+           [c['chunkText'] for c in greedy_chunks if not c['toTranslate']]
+    def words(chunks):
+        return " ".join(c['chunkText'] for c in chunks if c['toTranslate']).split()
+    assert words(balanced_chunks) == words(greedy_chunks)
+    sizes = [len(c['chunkText']) for c in balanced_chunks if c['toTranslate']]
+    greedy_sizes = [len(c['chunkText']) for c in greedy_chunks if c['toTranslate']]
+    assert max(sizes) <= 400
+    assert len(sizes) <= len(greedy_sizes)
+    assert min(sizes) > min(greedy_sizes)
+    assert report['translatable_chunks'] == len(sizes)
+    # Paragraph breaks inside a chunk are kept
+    assert any("\n\n" in c['chunkText'] for c in balanced_chunks if c['toTranslate'])
+
+def test_balanced_merge_iter_and_spans():
+    chunker = SmartChunker(min_chunk_size=50, max_chunk_size=400, merge_strategy="balanced")
+    chunks, _ = chunker.chunk(BALANCED_DOC)
+    assert list(chunker.chunk_iter(io.StringIO(BALANCED_DOC), read_size=97)) == chunks
+    spans = chunker.chunk_spans(BALANCED_DOC)
+    assert [s.text(BALANCED_DOC) for s in spans] == [c['chunkText'] for c in chunks]
+
+def test_merge_strategy_validation():
+    with pytest.raises(ValueError, match="merge_strategy must be one of"):
+        SmartChunker(merge_strategy="optimal")
@@ -0,0 +1,149 @@
+import pytest
+import sys
+import os
+import copy
+import pickle
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.source_buffer import ChunkSpan, SourceBuffer
+from src.smartchunk import SmartChunker
+
+# --- Fixtures ---
+@pytest.fixture(scope="module")
+def multibyte_text():
+    """Markdown with 1-4 byte UTF-8 characters, long enough to span many checkpoints."""
+    paragraphs = []
+    for i in range(400):
+        paragraphs.append(f"Ünïcödé paragraph {i} — ☃ with `code_{i}` and 𝔪𝔞𝔱𝔥 [link](http://e.com/{i}).")
+        if i % 25 == 0:
+            paragraphs.append(f"```python\nprint('{i} ✓')\n```")
+    return "\n\n".join(paragraphs)
+
+@pytest.fixture
+def mapped(tmp_path, multibyte_text):
+    path = tmp_path / "book.md"
+    path.write_text(multibyte_text, encoding="utf-8")
+    buffer = SourceBuffer.from_file(str(path))
+    yield buffer
+    buffer.close()
+
+# --- SourceBuffer ---
+
+def test_mapped_buffer_slices_match_text(mapped, multibyte_text):
+    assert mapped.is_mapped
+    assert len(mapped) == len(multibyte_text)
+    step = SourceBuffer.CHECKPOINT // 3
+    for start in range(0, len(multibyte_text), step):
+        for length in (0, 1, 17, SourceBuffer.CHECKPOINT + 5):
+            assert mapped[start:start + length] == multibyte_text[start:start + length]
+    assert mapped.text() == multibyte_text
+    assert "".join(mapped.iter_blocks(1000)) == multibyte_text
+
+def test_str_buffer():
+    buffer = SourceBuffer("hello world")
+    assert not buffer.is_mapped
+    assert buffer[6:11] == "world"
+    assert "".join(buffer.iter_blocks(4)) == "hello world"
+    with pytest.raises(TypeError):
+        buffer[0]
+    with pytest.raises(TypeError):
+        SourceBuffer(b"bytes")
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    assert len(SourceBuffer.from_file(str(path))) == 0
+
+def test_buffer_copy_and_pickle(mapped, multibyte_text):
+    assert copy.deepcopy(mapped) is mapped
+    data = pickle.dumps(mapped)
+    # Only the path and the checkpoints are stored; the file is mapped on the first read
+    assert len(data) < len(multibyte_text) // 10
+    restored = pickle.loads(data)
+    assert not restored.is_mapped and len(restored) == len(multibyte_text)
+    assert restored[5000:5100] == multibyte_text[5000:5100]
+    assert restored.is_mapped and restored.text() == multibyte_text
+    restored.close()
+    str_buffer = pickle.loads(pickle.dumps(SourceBuffer("hello")))
+    assert str_buffer.text() == "hello"
+
+def test_changed_file_is_not_remapped(tmp_path, multibyte_text):
+    path = tmp_path / "book.md"
+    path.write_text(multibyte_text, encoding="utf-8")
+    with SourceBuffer.from_file(str(path)) as buffer:
+        restored = pickle.loads(pickle.dumps(buffer))
+    path.write_text(multibyte_text[:100], encoding="utf-8")
+    with pytest.raises(ValueError):
+        restored[0:10]
+
+def test_close_keeps_text(mapped, multibyte_text):
+    mapped.close()
+    assert not mapped.is_mapped
+    assert mapped[10:40] == multibyte_text[10:40]
+
+def test_context_manager_closes_file(tmp_path, multibyte_text):
+    path = tmp_path / "book.md"
+    path.write_text(multibyte_text, encoding="utf-8")
+    with SourceBuffer.from_file(str(path)) as buffer:
+        assert buffer.is_mapped and buffer[0:7] == multibyte_text[0:7]
+        handle = buffer._file
+    assert not buffer.is_mapped and handle.closed
+    assert len(buffer) == 0
+
+# --- chunk_spans ---
+
+@pytest.mark.parametrize("mode", ["smart", "line", "symbol"])
+def test_chunk_spans_cover_chunk_output(mode, multibyte_text):
+    chunker = SmartChunker(min_chunk_size=50, max_chunk_size=300, mode=mode)
+    chunks, _ = chunker.chunk(multibyte_text)
+    spans = chunker.chunk_spans(multibyte_text)
+    assert len(spans) == len(chunks)
+    for chunk, span in zip(chunks, spans):
+        assert (span.type, span.translate) == (chunk['chunkType'], chunk['toTranslate'])
+        # Merged parts are joined with a space by chunk(); spans keep the source whitespace
+        assert " ".join(span.text(multibyte_text).split()) == " ".join(chunk['chunkText'].split())
+    assert all(a.end <= b.start for a, b in zip(spans, spans[1:]))
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REAL_FILES = ["README.md", "prompts.yaml", os.path.join("docs", "API.md"), os.path.join("src", "smartchunk.py")]
+
+@pytest.mark.parametrize("mode", ["smart", "line", "symbol", "markdown_ast", "subtitle_srt"])
+@pytest.mark.parametrize("merge_strategy", ["greedy", "balanced"])
+@pytest.mark.parametrize("max_chunk_size", [200, 2000])
+def test_chunk_spans_match_chunk_on_repo_files(mode, merge_strategy, max_chunk_size):
+    if mode == "markdown_ast":
+        pytest.importorskip("markdown_it")
+    chunker = SmartChunker(min_chunk_size=100, max_chunk_size=max_chunk_size, mode=mode, merge_strategy=merge_strategy)
+    for name in REAL_FILES:
+        with open(os.path.join(REPO_ROOT, name), encoding="utf-8") as f:
+            text = f.read()
+        chunks, _ = chunker.chunk(text)
+        spans = chunker.chunk_spans(SourceBuffer(text))
+        assert len(spans) == len(chunks), name
+        for chunk, span in zip(chunks, spans):
+            assert (span.type, span.translate) == (chunk['chunkType'], chunk['toTranslate']), name
+            # Merged parts are joined with a space by chunk(); spans keep the source whitespace (possibly none)
+            assert "".join(span.text(text).split()) == "".join(chunk['chunkText'].split()), name
+
+def test_chunk_spans_keep_paragraph_breaks():
+    # Longer than max_chunk_size: split at the paragraph break, then merged back
+    chunker = SmartChunker(min_chunk_size=30, max_chunk_size=30)
+    text = "Aaaaa bbbbbbb.\n\nCccccc ddddddd."
+    chunks, _ = chunker.chunk(text)
+    spans = chunker.chunk_spans(text)
+    assert chunks[0]['chunkText'] == "Aaaaa bbbbbbb. Cccccc ddddddd."
+    assert spans == [ChunkSpan(0, len(text), 'text', True)]
+    assert spans[0].text(text) == text
+
+def test_chunk_spans_mapped_equals_str(mapped, multibyte_text):
+    chunker = SmartChunker(min_chunk_size=50, max_chunk_size=300)
+    assert chunker.chunk_spans(mapped) == chunker.chunk_spans(multibyte_text)
+
+def test_chunk_spans_subtitle_timings():
+    srt = "1\r\n00:00:01,000 --> 00:00:02,000\r\nHello\r\n\r\n2\r\n00:00:03,000 --> 00:00:04,000\r\nWorld\r\n"
+    chunker = SmartChunker(mode="subtitle_srt")
+    spans = chunker.chunk_spans(srt)
+    assert [s.type for s in spans] == ['timing', 'text', 'timing', 'text']
+    assert spans[0].text(srt) == "1\r\n00:00:01,000 --> 00:00:02,000"
+    assert spans[3].text(srt) == "World"
@@ -0,0 +1,118 @@
+import pytest
+import sys
+import os
+import threading
+import time
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("langchain_core")
+from src import nodes_translation
+from src.chunk_table import ChunkTable, TRANSLATION, CRITIQUE, FINAL, ERROR
+
+
+@pytest.fixture
+def fake_workers(monkeypatch):
+    """Replaces the LLM workers: chunk 3 translates slowly and chunk 5 fails to translate."""
+    events = []
+    lock = threading.Lock()
+
+    def record(event):
+        with lock:
+            events.append(event)
+
+    def translate(worker_input):
+        index = worker_input["index"]
+        time.sleep(0.3 if index == 3 else 0.01)
+        record(("translate", index))
+        if index == 5:
+            return {"index": index, "error": "boom"}
+        return {"index": index, "translated_text": f"T{index}", "llm_seconds": 0.01}
+
+    def critique(worker_input):
+        index = worker_input["index"]
+        time.sleep(0.01)
+        record(("critique", index))
+        score = 5 if index == 7 else 4  # Chunk 8 passes the refinement gate
+        critique = {"accuracyScore": score, "accentAdherence": score, "glossaryAdherence": [],
+                    "suggestedImprovements": [], "overallAssessment": ""}
+        return {"index": index, "critique": critique, "logs": [], "llm_seconds": 0.01}
+
+    def finalize(worker_input):
+        index = worker_input["index"]
+        time.sleep(0.01)
+        record(("refine", index))
+        return {"index": index, "refined_text": f"F{index}", "llm_seconds": 0.01}
+
+    def fused_review(worker_input):
+        index = worker_input["index"]
+        time.sleep(0.01)
+        record(("review", index))
+        unchanged = index == 7
+        return {"index": index, "critique": {"accuracyScore": 4}, "refined_text": worker_input["translated_chunk"] if unchanged else f"R{index}",
+                "unchanged": unchanged, "logs": [], "llm_seconds": 0.01, "prompt_char_count": 400, "output_chars": 40}
+
+    monkeypatch.setattr(nodes_translation, "translate_chunk_worker", translate)
+    monkeypatch.setattr(nodes_translation, "_fused_review_chunk_worker", fused_review)
+    monkeypatch.setattr(nodes_translation, "_critique_chunk_worker", critique)
+    monkeypatch.setattr(nodes_translation, "_finalize_chunk_worker", finalize)
+    return events
+
+
+def _state(count):
+    chunks = [{'chunkText': f"text {i}", 'toTranslate': True, 'chunkType': 'text', 'index': i} for i in range(count)]
+    return {"config": {"max_parallel_workers": 3}, "chunk_table": ChunkTable.from_chunks(chunks), "logs": []}
+
+
+def test_streaming_pipeline_fills_stage_columns(fake_workers):
+    state = nodes_translation.streaming_deep_translation(_state(12))
+    table = state["chunk_table"]
+    assert table.stage_values(TRANSLATION) == [None if i == 5 else f"T{i}" for i in range(12)]
+    assert table.stage_values(FINAL) == [None if i == 5 else "T7" if i == 7 else f"F{i}" for i in range(12)]
+    assert table.stage_values(CRITIQUE)[5] == {"error": "Critique skipped due to failed translation"}
+    assert table.stage_values(ERROR)[5] == "boom"
+    assert ("critique", 5) not in fake_workers
+    assert "Failed to translate chunks: [6]" in state["error_info"]
+    assert ("refine", 7) not in fake_workers
+    assert len(state["llm_calls"]) == 11 * 3 - 1
+
+
+def test_streaming_pipeline_gate_can_be_disabled(fake_workers, monkeypatch):
+    monkeypatch.setenv("REFINE_SCORE_GATE", "false")
+    state = nodes_translation.streaming_deep_translation(_state(12))
+    assert state["chunk_table"].stage_values(FINAL)[7] == "F7"
+
+
+def test_streaming_pipeline_does_not_wait_for_slow_chunk(fake_workers):
+    nodes_translation.streaming_deep_translation(_state(12))
+    # Other chunks are refined while the slow translation of chunk 3 is still running
+    slow = fake_workers.index(("translate", 3))
+    assert sum(1 for stage, _ in fake_workers[:slow] if stage == "refine") >= 7
+
+
+def test_streaming_pipeline_fused_review(fake_workers, monkeypatch):
+    monkeypatch.setenv("REVIEW_MODE", "fused_review")
+    state = _state(12)
+    state["metrics"] = {}
+    state = nodes_translation.streaming_deep_translation(state)
+    table = state["chunk_table"]
+    assert table.stage_values(FINAL) == [None if i == 5 else "T7" if i == 7 else f"R{i}" for i in range(12)]
+    assert table.stage_values(CRITIQUE)[0] == {"accuracyScore": 4}
+    assert not any(stage in ("critique", "refine") for stage, _ in fake_workers)
+    assert [call[0] for call in state["llm_calls"]].count("review") == 11
+    cost = state["metrics"]["review_cost"]["review"]
+    assert (cost["calls"], cost["unchanged"], cost["prompt_tokens_estimate"]) == (11, 1, 1100)
+
+
+def test_streaming_pipeline_reuses_stored_outputs(fake_workers):
+    state = _state(4)
+    table = state["chunk_table"]
+    table.set_stage(TRANSLATION, ["S0", "S1", "S2", None])
+    table.stage(CRITIQUE)[0] = {"accuracyScore": 4}
+    table.stage(FINAL)[0] = "SF0"
+    table.stage(CRITIQUE)[1] = {"accuracyScore": 4}
+    state = nodes_translation.streaming_deep_translation(state)
+    table = state["chunk_table"]
+    assert sorted(fake_workers) == [("critique", 2), ("critique", 3), ("refine", 1), ("refine", 2), ("refine", 3), ("translate", 3)]
+    assert table.stage_values(TRANSLATION) == ["S0", "S1", "S2", "T3"]
+    assert table.stage_values(FINAL) == ["SF0", "F1", "F2", "F3"]
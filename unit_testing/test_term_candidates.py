@@ -0,0 +1,99 @@
+import pytest
+import sys
+import os
+
+# Add the parent directory to the path so we can import the module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.term_candidates import TermCandidateMiner, mine_term_candidates, batch_candidates, load_background_corpus
+
+# --- Fixtures ---
+@pytest.fixture(scope="module")
+def sample_regions():
+    """Provides a few regions of technical prose sharing terminology."""
+    return [
+        "A virtual machine runs on the host. Each virtual machine has its own kernel. "
+        "The REST API exposes every virtual machine over HTTP.",
+        "Kubernetes schedules containers. Call init_db() before the job queue starts. "
+        "The job queue retries failed jobs through the REST API.",
+        "Kubernetes and the job queue talk over HTTP. Use the SmartChunker class to split text.\n\n"
+        "```python\nignored_identifier_in_code = 1\n```",
+    ]
+
+def terms_of(candidates):
+    return [c["term"] for c in candidates]
+
+# --- Test Cases ---
+
+def test_empty_regions():
+    assert mine_term_candidates([]) == []
+    assert mine_term_candidates(["", ""]) == []
+
+def test_multiword_terms_found(sample_regions):
+    terms = [t.lower() for t in terms_of(mine_term_candidates(sample_regions))]
+    assert "virtual machine" in terms
+    assert "job queue" in terms
+
+def test_acronyms_code_and_proper_names(sample_regions):
+    candidates = mine_term_candidates(sample_regions)
+    by_term = {c["term"]: c for c in candidates}
+    assert "HTTP" in by_term and "acronym" in by_term["HTTP"]["kinds"]
+    assert "init_db()" in by_term and "code" in by_term["init_db()"]["kinds"]
+    assert "SmartChunker" in by_term
+    assert "Kubernetes" in by_term
+
+def test_abbreviations_and_hosts_are_not_code():
+    regions = ["Some tools, e.g. Docker, run anywhere, i.e. on every host. See example.com for the "
+               "setup, and set self.max_chunk_size or call os.path.join() first."] * 2
+    terms = terms_of(mine_term_candidates(regions))
+    for prose in ("e.g", "e.g.", "i.e", "i.e.", "example.com"):
+        assert prose not in terms
+    assert "self.max_chunk_size" in terms
+    assert "os.path.join()" in terms
+
+def test_fenced_code_is_ignored(sample_regions):
+    assert "ignored_identifier_in_code" not in terms_of(mine_term_candidates(sample_regions))
+
+def test_background_words_are_not_candidates(sample_regions):
+    terms = [t.lower() for t in terms_of(mine_term_candidates(sample_regions))]
+    for stop in ("the", "each", "over", "every"):
+        assert stop not in terms
+
+def test_subsumed_ngrams_dropped(sample_regions):
+    terms = [t.lower() for t in terms_of(mine_term_candidates(sample_regions))]
+    # "machine" only ever appears inside "virtual machine"
+    assert "machine" not in terms
+
+def test_candidates_sorted_and_limited(sample_regions):
+    candidates = mine_term_candidates(sample_regions, max_candidates=3)
+    assert len(candidates) == 3
+    scores = [c["score"] for c in candidates]
+    assert scores == sorted(scores, reverse=True)
+    for c in candidates:
+        assert c["context"]
+        assert c["frequency"] >= 1
+        assert 1 <= c["regions"] <= len(sample_regions)
+
+def test_min_frequency_filters_plain_ngrams():
+    miner = TermCandidateMiner(min_frequency=2)
+    terms = [t.lower() for t in terms_of(miner.mine(["the quantum widget sparkles quietly."]))]
+    assert "quantum widget" not in terms
+
+def test_invalid_max_ngram():
+    with pytest.raises(ValueError):
+        TermCandidateMiner(max_ngram=0)
+
+def test_background_corpus(tmp_path):
+    corpus = tmp_path / "background.txt"
+    corpus.write_text("kernel\t500000\nrare stuff here\n", encoding="utf-8")
+    counts = load_background_corpus(str(corpus))
+    assert counts["kernel"] == 500000
+    assert counts["rare"] == 1
+    miner = TermCandidateMiner(min_frequency=1, background=counts)
+    terms = [t.lower() for t in terms_of(miner.mine(["The kernel boots. The kernel panics."]))]
+    assert "kernel" not in terms
+
+def test_batch_candidates():
+    items = [{"term": str(i)} for i in range(7)]
+    batches = batch_candidates(items, 3)
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert batch_candidates(items, 0)[0] == [items[0]]